@@ -0,0 +1,96 @@
+"""
+Write-behind audit trail of activations and heartbeats.
+
+Request handlers only append to an in-memory AuditEventQueue (a lock and a deque, never a database
+call); a flusher writes the queue to the append-only license_events table in large batches (COPY in
+Postgres, where the table is partitioned by month, see migrations/0010_license_events.up.sql).
+The queue is bounded: when the flusher falls behind (or the database is down) new events are
+dropped and counted rather than growing memory or slowing requests down, so the trail is
+best-effort, like last_seen.
+"""
+import time
+import threading
+from collections import deque
+
+EVENT_COLUMNS = ("occurred_at", "tenant_id", "device_id", "event")
+# /activate_license results that are recorded, and the event each becomes.
+ACTIVATION_EVENTS = {"activated": "activated", "reactivated": "reactivated", "no_seats": "denied"}
+HEARTBEAT = "heartbeat"
+# Events that count a device as active in its hour (a denied device never got a seat).
+ACTIVE_DEVICE_EVENTS = ("activated", "reactivated", HEARTBEAT)
+
+
+class AuditEventQueue:
+    """
+    Thread-safe bounded FIFO of (occurred_at, tenant_id, device_id, event) tuples. Heartbeats are
+    coalesced to at most one per device per heartbeat_interval (aligned to the epoch, so with the
+    default hour each active hour of a device gets one row), which keeps the table to a row per
+    device per hour however often agents call /check_license.
+    """
+
+    def __init__(self, max_events, batch_size, heartbeat_interval):
+        self.max_events = max_events
+        self.batch_size = batch_size
+        self.heartbeat_interval = heartbeat_interval
+        self._lock = threading.Lock()
+        self._events = deque()
+        self._heartbeat_buckets = {}
+        self._queued = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._written = 0
+
+    def put(self, tenant_id, device_id, event, occurred_at=None):
+        """Queues one event; returns True once a full batch is waiting (the caller should wake the flusher)."""
+        occurred_at = time.time() if occurred_at is None else occurred_at
+        with self._lock:
+            if self._full():
+                return True
+            return self._append((occurred_at, tenant_id, device_id, event))
+
+    def heartbeat(self, tenant_id, device_id, seen_at=None):
+        """Queues a heartbeat unless this device already has one in the current interval; returns like put()."""
+        seen_at = time.time() if seen_at is None else seen_at
+        key, bucket = (tenant_id, device_id), int(seen_at // self.heartbeat_interval)
+        with self._lock:
+            if self._heartbeat_buckets.get(key) == bucket:
+                self._coalesced += 1
+                return False
+            if self._full():
+                return True
+            if len(self._heartbeat_buckets) >= self.max_events:
+                self._heartbeat_buckets.clear()
+            self._heartbeat_buckets[key] = bucket
+            return self._append((seen_at, tenant_id, device_id, HEARTBEAT))
+
+    def _full(self):
+        if len(self._events) < self.max_events:
+            return False
+        self._dropped += 1
+        return True
+
+    def _append(self, event):
+        self._events.append(event)
+        self._queued += 1
+        return len(self._events) >= self.batch_size
+
+    def take(self, limit):
+        """Removes and returns up to `limit` of the oldest events."""
+        with self._lock:
+            return [self._events.popleft() for _ in range(min(limit, len(self._events)))]
+
+    def requeue(self, events):
+        """Puts a taken batch whose write failed back at the front, dropping what no longer fits."""
+        with self._lock:
+            room = max(self.max_events - len(self._events), 0)
+            self._dropped += max(len(events) - room, 0)
+            self._events.extendleft(reversed(events[:room]))
+
+    def mark_written(self, count):
+        with self._lock:
+            self._written += count
+
+    def stats(self):
+        with self._lock:
+            return {"pending": len(self._events), "max_events": self.max_events, "queued": self._queued,
+                    "coalesced": self._coalesced, "dropped": self._dropped, "written": self._written}
@@ -1,10 +1,39 @@
 import os
+import json
+import atexit
 import datetime
+import hashlib
+import functools
+import itertools
+import math
+import queue
+import threading
+import time
 import psycopg2
 import psycopg2.extras
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from Teal_Responses import FastJSONProvider, StaticJSON, etag_matches, join_json_lines
+from Teal_DB_Pool import ManagedConnectionPool
+from Teal_Cache import VersionedValueCache, LRUTTLCache, InvalidationListener, notify
+import Teal_Metrics as metrics
+from Teal_Events import EventBroadcaster, format_sse
+from Teal_Bulk_IO import (
+    IMPORT_COLUMNS, JSON_LINES_COPY_OPTIONS, ImportFormatError, NDJSONToCSV, read_csv_header, stream_copy_out,
+)
+from Teal_Rate_Limit import RateLimiter, load_backend, client_ip
+from Teal_Reclaim import LastSeenBuffer, BackgroundTask
+from Teal_Audit import AuditEventQueue, ACTIVATION_EVENTS
+from Teal_License_Tokens import (
+    LICENSE_TOKEN_TTL, REVOCATION_LIST_MAX_AGE, get_signer, issue_license_token, sign_revocation_list,
+)
+from Teal_Storage import (
+    STORAGE_BACKEND, SQLITE_PATH, DEFAULT_TENANT_ID, TENANT_ID_PATTERN, NOT_FOUND, UNCHANGED, NO_SEATS, EXISTS,
+    KEY_IN_USE, DEVICE_COLUMNS, PostgresLicenseRepository, SQLiteLicenseRepository, parse_device_query,
+    postgres_device_sql, postgres_view_status_sql, record_revocations, tenant_device_key,
+)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # --- Configuration ---
 # Environment variables are the source of truth now.
@@ -15,81 +44,544 @@ ADMIN_SECRET_KEY = os.environ.get("FLASK_ADMIN_KEY", "FallbackAdminKeyForLocalDe
 DEFAULT_DOWNLOAD_URL = "https://www.peakpointenterprise.com/download-timesheet"
 
 
+# --- Connection Pool Configuration ---
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.environ.get("DB_POOL_HEALTH_CHECK_AFTER", 30))
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800))
+
+# --- Cache Configuration ---
+# How long a worker trusts its cached latest-version record before re-reading it.
+APP_VERSION_CACHE_TTL = float(os.environ.get("APP_VERSION_CACHE_TTL", 300))
+# How long clients (and proxies) may reuse an /app_version response without revalidating.
+APP_VERSION_CLIENT_MAX_AGE = int(os.environ.get("APP_VERSION_CLIENT_MAX_AGE", 60))
+# Set to 0 to disable LISTEN/NOTIFY cache invalidation (caches then rely on their TTL alone).
+CACHE_LISTEN_ENABLED = os.environ.get("CACHE_LISTEN_ENABLED", "1") == "1"
+APP_VERSION_CHANNEL = "teal_app_version_changed"
+# Per-device license status cache used by /check_license heartbeats.
+LICENSE_CACHE_MAX_ENTRIES = int(os.environ.get("LICENSE_CACHE_MAX_ENTRIES", 100000))
+LICENSE_CACHE_TTL = float(os.environ.get("LICENSE_CACHE_TTL", 60))
+# Unknown devices are cached for less time so a fresh activation is picked up quickly.
+LICENSE_CACHE_NEGATIVE_TTL = float(os.environ.get("LICENSE_CACHE_NEGATIVE_TTL", 10))
+# Most device_ids accepted by one /check_licenses batch call.
+CHECK_LICENSE_BATCH_MAX = int(os.environ.get("CHECK_LICENSE_BATCH_MAX", 1000))
+# Payload is tenant_device_key(); also hard-coded in teal_activate_device() (migrations/).
+LICENSE_CHANNEL = "teal_license_changed"
+# How long a worker trusts its license key -> tenant map; key changes also NOTIFY TENANT_CHANNEL (migrations/).
+TENANT_KEY_CACHE_TTL = float(os.environ.get("TENANT_KEY_CACHE_TTL", 300))
+TENANT_CHANNEL = "teal_tenants_changed"
+REVOCATION_CACHE_MAX_TENANTS = 10000
+
+# --- Idle Device Reclamation ---
+# Heartbeats are buffered per worker and written to licenses.last_seen this often (seconds).
+LAST_SEEN_FLUSH_INTERVAL = float(os.environ.get("LAST_SEEN_FLUSH_INTERVAL", 30))
+# last_seen is only rewritten once it is this many seconds old: idle thresholds are in days.
+LAST_SEEN_RESOLUTION = float(os.environ.get("LAST_SEEN_RESOLUTION", 3600))
+LAST_SEEN_MAX_PENDING = int(os.environ.get("LAST_SEEN_MAX_PENDING", 100000))
+# Active devices not seen for this many days are deactivated, freeing their seat (0 disables).
+IDLE_DEACTIVATE_DAYS = float(os.environ.get("IDLE_DEACTIVATE_DAYS", 0))
+# Inactive devices not seen for this many days are moved to licenses_archive (0 disables).
+IDLE_ARCHIVE_DAYS = float(os.environ.get("IDLE_ARCHIVE_DAYS", 0))
+IDLE_SWEEP_INTERVAL = float(os.environ.get("IDLE_SWEEP_INTERVAL", 300))
+IDLE_SWEEP_BATCH_SIZE = int(os.environ.get("IDLE_SWEEP_BATCH_SIZE", 500))
+# Batches per sweep; the pause between them lets waiting seat changes take the tenant locks.
+IDLE_SWEEP_MAX_BATCHES = int(os.environ.get("IDLE_SWEEP_MAX_BATCHES", 20))
+IDLE_SWEEP_BATCH_PAUSE = 0.1
+
+# --- Audit Events ---
+AUDIT_EVENTS_ENABLED = os.environ.get("AUDIT_EVENTS_ENABLED", "1") == "1"
+# Each worker writes its queued events this often (seconds), or as soon as a full batch is waiting.
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 5))
+AUDIT_FLUSH_BATCH_SIZE = int(os.environ.get("AUDIT_FLUSH_BATCH_SIZE", 5000))
+# Events queued per worker before new ones are dropped (the database is down or can't keep up).
+AUDIT_MAX_PENDING = int(os.environ.get("AUDIT_MAX_PENDING", 100000))
+# At most one heartbeat event per device per this many seconds, per worker.
+AUDIT_HEARTBEAT_INTERVAL = float(os.environ.get("AUDIT_HEARTBEAT_INTERVAL", 3600))
+# Events older than this many days are deleted, checked hourly (0 keeps them forever).
+AUDIT_RETENTION_DAYS = float(os.environ.get("AUDIT_RETENTION_DAYS", 0))
+AUDIT_PRUNE_INTERVAL = 3600
+ACTIVITY_DEFAULT_DAYS = 30
+ACTIVITY_MAX_DAYS = 366
+ACTIVITY_DEFAULT_HOURS = 48
+ACTIVITY_MAX_HOURS = 24 * 31
+
+# --- Admin Limits ---
+BULK_UPDATE_MAX_DEVICES = int(os.environ.get("BULK_UPDATE_MAX_DEVICES", 5000))
+VIEW_STATUS_DEFAULT_PAGE_SIZE = 500
+VIEW_STATUS_MAX_PAGE_SIZE = 5000
+# Rows fetched per round trip by the server-side cursor behind NDJSON streaming.
+VIEW_STATUS_STREAM_BATCH = 2000
+LICENSE_CHANGES_DEFAULT_LIMIT = 1000
+LICENSE_CHANGES_MAX_LIMIT = 10000
+
+# --- Bulk Import ---
+IMPORT_ERROR_SAMPLE = 20  # invalid rows listed in a rejected import's response
+IMPORT_CONFLICT_MODES = ("skip", "update", "error")
+
+# --- Admin Event Stream ---
+ADMIN_EVENTS_CHANNEL = "teal_admin_events"  # also hard-coded in the notify triggers (migrations/)
+# Each open stream holds a worker thread, so this caps the threads one worker gives to it.
+ADMIN_EVENTS_MAX_CLIENTS = int(os.environ.get("ADMIN_EVENTS_MAX_CLIENTS", 20))
+ADMIN_EVENTS_KEEPALIVE = 15
+# Streams are closed after this long (clients reconnect) so worker threads are recycled.
+ADMIN_EVENTS_MAX_DURATION = int(os.environ.get("ADMIN_EVENTS_MAX_DURATION", 300))
+
+
+# --- Metrics ---
+
+http_request_seconds = metrics.REGISTRY.register(metrics.Histogram(
+    "teal_http_request_duration_seconds", "Request latency by route.", ("route", "method", "status")))
+request_db_queries = metrics.REGISTRY.register(metrics.Histogram(
+    "teal_request_db_queries", "Database statements executed per request.", ("route",), metrics.COUNT_BUCKETS))
+request_db_seconds = metrics.REGISTRY.register(metrics.Histogram(
+    "teal_request_db_duration_seconds", "Time per request spent executing database statements.", ("route",)))
+request_db_rows = metrics.REGISTRY.register(metrics.Histogram(
+    "teal_request_db_rows", "Rows returned or affected per request.", ("route",),
+    (0, 1, 10, 100, 1000, 10000, 100000)))
+request_acquire_seconds = metrics.REGISTRY.register(metrics.Histogram(
+    "teal_request_db_acquire_duration_seconds", "Time per request spent waiting for pooled connections.", ("route",)))
+db_acquire_seconds = metrics.REGISTRY.register(metrics.Histogram(
+    "teal_db_pool_acquire_duration_seconds", "Time to borrow a connection from the pool."))
+rate_limited_total = metrics.REGISTRY.register(metrics.Counter(
+    "teal_rate_limited_total", "Requests rejected with 429, by the bucket that ran out.", ("route", "scope")))
+last_seen_writes_total = metrics.REGISTRY.register(metrics.Counter(
+    "teal_last_seen_writes_total", "Devices whose last_seen was written by the heartbeat flusher."))
+idle_devices_total = metrics.REGISTRY.register(metrics.Counter(
+    "teal_idle_devices_total", "Devices reclaimed by the idle sweeper.", ("action",)))
+audit_events_written_total = metrics.REGISTRY.register(metrics.Counter(
+    "teal_audit_events_written_total", "Audit events written to license_events by this worker."))
+
+
+# --- Static Responses ---
+# Constant bodies, encoded once (see Teal_Responses). Call one to get a fresh Response.
+
+HEALTH_OK = StaticJSON({"status": "ok", "message": "Backend is running"})
+LICENSE_ACTIVE = StaticJSON({"success": True, "message": "License active"})
+LICENSE_DEACTIVATED = StaticJSON({"success": False, "message": "This device's license has been deactivated."}, 403)
+LICENSE_NOT_FOUND = StaticJSON({"success": False, "message": "License not found for this device."}, 403)
+INVALID_LICENSE_KEY = StaticJSON({"success": False, "message": "Invalid license key"}, 403)
+ALL_LICENSES_IN_USE = StaticJSON({"success": False, "message": "All licenses are currently in use."}, 403)
+MISSING_DATA = StaticJSON({"success": False, "message": "Missing data"}, 400)
+MISSING_DEVICE_ID = StaticJSON({"success": False, "message": "Missing device ID"}, 400)
+INVALID_TENANT = StaticJSON({"success": False, "message": "Invalid tenant_id"}, 400)
+UNAUTHORIZED = StaticJSON({"success": False, "message": "Unauthorized"}, 403)
+INTERNAL_ERROR = StaticJSON({"success": False, "message": "An internal server error occurred."}, 500)
+
+
 # --- Database Helper Functions ---
 
-def get_db_connection():
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool():
     """
-    Establishes a connection to the database.
+    Returns the process-wide connection pool, creating it (and opening DB_POOL_MIN_SIZE connections in the
+    background) on first use.
     Includes robust error handling for the DATABASE_URL environment variable.
     """
-    db_url = os.environ.get('DATABASE_URL')
-    if not db_url:
-        raise ValueError("FATAL ERROR: DATABASE_URL environment variable is not set.")
-    conn = psycopg2.connect(db_url)
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                db_url = os.environ.get('DATABASE_URL')
+                if not db_url:
+                    raise ValueError("FATAL ERROR: DATABASE_URL environment variable is not set.")
+                _db_pool = ManagedConnectionPool(
+                    db_url,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    connection_factory=metrics.InstrumentedConnection,
+                )
+                _db_pool.prefill_in_background()
+    return _db_pool
+
+
+def get_db_connection():
+    """Borrows a connection from the pool. Always hand it back with release_db_connection()."""
+    started = time.perf_counter()
+    conn = get_db_pool().getconn()
+    elapsed = time.perf_counter() - started
+    db_acquire_seconds.observe(elapsed)
+    metrics.record_acquire(elapsed)
     return conn
 
 
+def release_db_connection(conn):
+    """Returns a borrowed connection to the pool (any open transaction is rolled back)."""
+    get_db_pool().putconn(conn)
+
+
+# --- Storage ---
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_repository():
+    """Returns the process-wide LicenseRepository for STORAGE_BACKEND (see Teal_Storage), creating it on first use."""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                if STORAGE_BACKEND == "postgres":
+                    _repository = PostgresLicenseRepository(get_db_connection, release_db_connection, LICENSE_CHANNEL,
+                                                            APP_VERSION_CHANNEL, LICENSE_TOKEN_TTL)
+                elif STORAGE_BACKEND == "sqlite":
+                    _repository = SQLiteLicenseRepository(SQLITE_PATH, LICENSE_TOKEN_TTL)
+                else:
+                    raise ValueError(f"FATAL ERROR: Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'.")
+    return _repository
+
+
+def requires_postgres(view):
+    """For endpoints built on Postgres-only features (COPY, LISTEN, transaction ids): 501 on other backends."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not isinstance(get_repository(), PostgresLicenseRepository):
+            return jsonify({"success": False, "message": f"Not available with the {STORAGE_BACKEND} storage backend."}), 501
+        return view(*args, **kwargs)
+    return wrapper
+
+
 def setup_database():
-    """Creates the necessary tables if they don't exist and initializes settings."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # --- Licenses Table ---
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS licenses (
-            device_id TEXT PRIMARY KEY,
-            username TEXT NOT NULL,
-            hostname TEXT,
-            activated_at TIMESTAMPTZ DEFAULT NOW(),
-            status TEXT NOT NULL DEFAULT 'active'
-        );
-    ''')
-
-    # --- Settings Table ---
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS settings (
-            id INT PRIMARY KEY,
-            master_key TEXT NOT NULL,
-            total_licenses INT NOT NULL
-        );
-    ''')
-
-    # --- NEW: Versions Table ---
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS versions (
-            version_number TEXT PRIMARY KEY,
-            release_date TIMESTAMPTZ DEFAULT NOW(),
-            download_url TEXT NOT NULL,
-            is_latest BOOLEAN NOT NULL DEFAULT FALSE
-        );
-    ''')
-
-    # Initialize settings if the table is empty
-    cur.execute("SELECT id FROM settings WHERE id = 1;")
-    if cur.fetchone() is None:
-        cur.execute(
-            "INSERT INTO settings (id, master_key, total_licenses) VALUES (%s, %s, %s);",
-            (1, DEFAULT_MASTER_KEY, DEFAULT_TOTAL_LICENSES)
-        )
-        print("Initialized default settings.")
-
-    # Initialize versions if the table is empty
-    cur.execute("SELECT COUNT(*) FROM versions;")
-    if cur.fetchone()[0] == 0:
-        cur.execute(
-            "INSERT INTO versions (version_number, download_url, is_latest) VALUES (%s, %s, %s);",
-            ("3.0.1", DEFAULT_DOWNLOAD_URL, True)
-        )
+    """Applies pending schema migrations and initializes the default tenant and versions."""
+    tenant_created, version_created = get_repository().setup(
+        DEFAULT_MASTER_KEY, DEFAULT_TOTAL_LICENSES, "3.0.1", DEFAULT_DOWNLOAD_URL)
+    if tenant_created:
+        print(f"Initialized default tenant '{DEFAULT_TENANT_ID}'.")
+    if version_created:
         print("Initialized with default version 3.0.1.")
-
-    conn.commit()
-    cur.close()
-    conn.close()
     print("Database setup successful: Tables are ready.")
 
 
-# --- Run Database Setup on Startup ---
-setup_database()
+def reconcile_active_counts():
+    """Recomputes every tenant's active_count from the licenses table; returns [(tenant_id, old, new)]."""
+    return get_repository().reconcile_active_counts()
+
+
+@app.cli.command("reconcile-seats")
+def reconcile_seats_command():
+    """Recomputes each tenant's maintained active-seat counter from the licenses table."""
+    for tenant_id, old, new in reconcile_active_counts():
+        print(f"Active seat counter for '{tenant_id}' reconciled: {old} -> {new}.")
+
+
+# --- Caches ---
+
+app_version_cache = VersionedValueCache(APP_VERSION_CACHE_TTL)
+# Keyed by tenant_device_key().
+license_status_cache = LRUTTLCache(LICENSE_CACHE_MAX_ENTRIES, LICENSE_CACHE_TTL, LICENSE_CACHE_NEGATIVE_TTL)
+# Per tenant. Revocations only change on deactivation, which already notifies LICENSE_CHANNEL.
+revocation_list_cache = LRUTTLCache(REVOCATION_CACHE_MAX_TENANTS, 60)
+# {license_key: tenant_id} for every tenant, so activations resolve their key without a query.
+tenant_key_cache = VersionedValueCache(TENANT_KEY_CACHE_TTL)
+_cache_listener = None
+_cache_listener_lock = threading.Lock()
+
+
+def ensure_cache_listener():
+    """Starts this worker's LISTEN/NOTIFY thread so caches are invalidated by other workers' writes."""
+    global _cache_listener
+    if not CACHE_LISTEN_ENABLED:
+        return
+    if _cache_listener is None:
+        with _cache_listener_lock:
+            if _cache_listener is None:
+                listener = InvalidationListener(os.environ.get('DATABASE_URL'))
+                listener.subscribe(APP_VERSION_CHANNEL, lambda payload: app_version_cache.invalidate())
+                # Payload is the changed device's tenant_device_key(); None (after a reconnect) clears everything.
+                listener.subscribe(LICENSE_CHANNEL, lambda payload: license_status_cache.invalidate(payload))
+                listener.subscribe(LICENSE_CHANNEL, lambda payload: revocation_list_cache.invalidate(
+                    payload.split("/", 1)[0] if payload else None))
+                listener.subscribe(TENANT_CHANNEL, lambda payload: tenant_key_cache.invalidate())
+                _cache_listener = listener
+    _cache_listener.ensure_started()
+
+
+def load_latest_version():
+    """Reads the latest version record; returns (body, etag) or None if none is configured."""
+    latest_version = get_repository().latest_version()
+    if not latest_version:
+        return None
+    body = {
+        "latest_version": latest_version["version_number"],
+        "download_url": latest_version["download_url"]
+    }
+    etag = hashlib.sha1(f'{body["latest_version"]}\n{body["download_url"]}'.encode("utf-8")).hexdigest()
+    return body, etag
+
+
+def resolve_tenant(license_key):
+    """The tenant that owns license_key, or None. A dict lookup when reads are cached."""
+    if not isinstance(license_key, str):
+        return None
+    repository = get_repository()
+    if repository.cache_reads:
+        ensure_cache_listener()
+        return tenant_key_cache.get(repository.tenant_keys).get(license_key)
+    return repository.tenant_for_key(license_key)
+
+
+def requested_tenant(data):
+    """The tenant_id a request names (the default tenant when it names none), or None if it isn't a valid id."""
+    tenant_id = data.get('tenant_id') or DEFAULT_TENANT_ID
+    return tenant_id if isinstance(tenant_id, str) and TENANT_ID_PATTERN.match(tenant_id) else None
+
+
+def invalid_tenant():
+    return INVALID_TENANT()
+
+
+def tenant_not_found(tenant_id):
+    return jsonify({"success": False, "message": f"Tenant '{tenant_id}' not found."}), 404
+
+
+def batch_status_label(status):
+    """Maps a cached license status onto the per-device values returned by /check_licenses."""
+    if status == 'active':
+        return "active"
+    return "deactivated" if status is not None else "not_found"
+
+
+# --- Idle Device Reclamation ---
+
+last_seen_buffer = LastSeenBuffer(LAST_SEEN_MAX_PENDING)
+
+
+def flush_last_seen():
+    """Writes this worker's buffered heartbeats in one statement."""
+    entries = last_seen_buffer.drain()
+    if not entries:
+        return
+    try:
+        written = get_repository().touch_devices(entries, LAST_SEEN_RESOLUTION)
+    except Exception:
+        last_seen_buffer.restore(entries)
+        raise
+    last_seen_buffer.mark_flushed(len(entries))
+    last_seen_writes_total.inc(written)
+
+
+def sweep_idle_devices():
+    """One sweeper pass: deactivates, then archives, idle devices a bounded batch at a time. Returns (deactivated, archived)."""
+    repository = get_repository()
+    totals = []
+    for action, idle_days, step in (("deactivated", IDLE_DEACTIVATE_DAYS, repository.deactivate_idle),
+                                    ("archived", IDLE_ARCHIVE_DAYS, repository.archive_idle)):
+        count = 0
+        for _ in range(IDLE_SWEEP_MAX_BATCHES if idle_days > 0 else 0):
+            devices = step(idle_days * 86400, IDLE_SWEEP_BATCH_SIZE)
+            if devices is None:
+                break  # another worker holds the sweep lock
+            for tenant_id, device_id in devices:
+                license_status_cache.invalidate(tenant_device_key(tenant_id, device_id))
+            for tenant_id in {tenant_id for tenant_id, device_id in devices}:
+                revocation_list_cache.invalidate(tenant_id)
+            count += len(devices)
+            if len(devices) < IDLE_SWEEP_BATCH_SIZE:
+                break
+            time.sleep(IDLE_SWEEP_BATCH_PAUSE)
+        if count:
+            idle_devices_total.inc(count, action=action)
+            print(f"Idle device sweep: {count} device(s) {action}.")
+        totals.append(count)
+    return tuple(totals)
+
+
+last_seen_flusher = BackgroundTask("last-seen-flusher", flush_last_seen, LAST_SEEN_FLUSH_INTERVAL)
+idle_sweeper = BackgroundTask("idle-device-sweeper", sweep_idle_devices, IDLE_SWEEP_INTERVAL)
+
+
+@atexit.register
+def flush_last_seen_on_exit():
+    # Gunicorn workers leave through sys.exit() on a graceful shutdown, so this writes what's still buffered.
+    try:
+        flush_last_seen()
+    except Exception as e:
+        print(f"Error flushing last_seen on exit: {e}")
+
+
+def record_heartbeats(tenant_id, device_ids):
+    """Buffers heartbeats for last_seen and the audit log (no database work) and keeps this worker's background tasks running."""
+    last_seen_flusher.ensure_started()
+    if IDLE_DEACTIVATE_DAYS > 0 or IDLE_ARCHIVE_DAYS > 0:
+        idle_sweeper.ensure_started()
+    full = False
+    for device_id in device_ids:
+        full = last_seen_buffer.record(tenant_id, device_id) or full
+    if full:
+        last_seen_flusher.wake()
+    if AUDIT_EVENTS_ENABLED:
+        audit_flusher.ensure_started()
+        batch_ready = False
+        for device_id in device_ids:
+            batch_ready = audit_queue.heartbeat(tenant_id, device_id) or batch_ready
+        if batch_ready:
+            audit_flusher.wake()
+
+
+# --- Audit Events ---
+# Write-behind: handlers only queue events (see Teal_Audit); each worker's flusher COPYs them to license_events.
+
+audit_queue = AuditEventQueue(AUDIT_MAX_PENDING, AUDIT_FLUSH_BATCH_SIZE, AUDIT_HEARTBEAT_INTERVAL)
+
+
+def flush_audit_events():
+    """Writes this worker's queued events, a batch per statement, until the queue is empty."""
+    repository = get_repository()
+    while True:
+        events = audit_queue.take(AUDIT_FLUSH_BATCH_SIZE)
+        if not events:
+            return
+        try:
+            repository.record_events(events)
+        except Exception:
+            audit_queue.requeue(events)
+            raise
+        audit_queue.mark_written(len(events))
+        audit_events_written_total.inc(len(events))
+        if len(events) < AUDIT_FLUSH_BATCH_SIZE:
+            return
+
+
+def prune_audit_events():
+    removed = get_repository().prune_events(time.time() - AUDIT_RETENTION_DAYS * 86400)
+    if removed:
+        print(f"Audit event retention: removed {removed} partition(s)/row(s) older than {AUDIT_RETENTION_DAYS:g} days.")
+
+
+audit_flusher = BackgroundTask("audit-event-flusher", flush_audit_events, AUDIT_FLUSH_INTERVAL)
+audit_pruner = BackgroundTask("audit-event-pruner", prune_audit_events, AUDIT_PRUNE_INTERVAL)
+
+
+@atexit.register
+def flush_audit_events_on_exit():
+    try:
+        flush_audit_events()
+    except Exception as e:
+        print(f"Error flushing audit events on exit: {e}")
+
+
+def record_audit_event(tenant_id, device_id, event):
+    if not AUDIT_EVENTS_ENABLED:
+        return
+    audit_flusher.ensure_started()
+    if AUDIT_RETENTION_DAYS > 0:
+        audit_pruner.ensure_started()
+    if audit_queue.put(tenant_id, device_id, event):
+        audit_flusher.wake()
+
+
+# --- App Factory & One-Shot Setup ---
+# Importing this module does no database work: schema setup runs once per deploy via
+# `flask --app Teal_Backend init-db` (or `python Teal_Migrations.py up`), and workers only
+# open connections when the first request borrows from the pool.
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Applies migrations and seeds the default tenant/versions. Run once per deploy, before starting workers."""
+    setup_database()
+
+
+@app.cli.command("sweep-idle")
+def sweep_idle_command():
+    """Runs one idle-device sweep now (the same pass workers run every IDLE_SWEEP_INTERVAL)."""
+    if IDLE_DEACTIVATE_DAYS <= 0 and IDLE_ARCHIVE_DAYS <= 0:
+        print("Idle device reclamation is disabled: set IDLE_DEACTIVATE_DAYS and/or IDLE_ARCHIVE_DAYS.")
+        return
+    deactivated, archived = sweep_idle_devices()
+    print(f"Deactivated {deactivated} and archived {archived} idle device(s).")
+
+
+def create_app():
+    """WSGI entry point for Gunicorn (`gunicorn 'Teal_Backend:create_app()'`); boots without touching the database."""
+    return app
+
+
+# --- Request Instrumentation ---
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.begin_request()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    db_stats = metrics.end_request()
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_request_seconds.observe(time.perf_counter() - started,
+                                     route=route, method=request.method, status=response.status_code)
+        if db_stats is not None:
+            request_db_queries.observe(db_stats["queries"], route=route)
+            request_db_seconds.observe(db_stats["query_time"], route=route)
+            request_db_rows.observe(db_stats["rows"], route=route)
+            request_acquire_seconds.observe(db_stats["acquire_time"], route=route)
+    return response
+
+
+def _pool_samples():
+    if _db_pool is None:
+        return {}
+    return {(key,): value for key, value in _db_pool.stats().items()}
+
+
+def _cache_samples():
+    samples = {}
+    for name, cache in (("app_version", app_version_cache), ("license_status", license_status_cache)):
+        for key, value in cache.stats().items():
+            samples[(name, key)] = value
+    return samples
+
+
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "teal_db_pool", "Connection pool statistics (see /admin/pool_stats).", ("stat",), _pool_samples))
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "teal_cache", "Cache statistics, including hit_rate.", ("cache", "stat"), _cache_samples))
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "teal_audit_queue", "Write-behind audit event queue statistics, including dropped events.", ("stat",),
+    lambda: {(key,): value for key, value in audit_queue.stats().items()}))
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text-format metrics for this worker process."""
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+# --- Rate Limiting ---
+# Checked before any database work, so a client stuck in a retry loop costs a dict lookup, not a connection.
+# Device buckets are per tenant, so /activate_license charges the IP bucket before looking up which tenant its
+# key belongs to (a query on SQLite) and the device bucket after.
+
+rate_limiter = RateLimiter(load_backend())
+
+
+def rate_limited(tenant_id=None, device_id=None, charge_ip=True):
+    """
+    Returns a 429 response if this client (IP, and device when given) is over its limit, else None.
+    charge_ip=False checks only the device bucket, for a request whose IP was already charged.
+    """
+    ip = client_ip(request.remote_addr, request.headers.get('X-Forwarded-For')) if charge_ip else None
+    limited = rate_limiter.check(ip, tenant_id, device_id if isinstance(device_id, str) else None)
+    if limited is None:
+        return None
+    scope, retry_after = limited
+    rate_limited_total.inc(route=request.path, scope=scope)
+    response = jsonify({"success": False, "message": "Too many requests. Please retry later."})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
 
 
 # --- Public API Endpoints ---
@@ -97,30 +589,33 @@ setup_database()
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint."""
-    return jsonify({"status": "ok", "message": "Backend is running"}), 200
+    return HEALTH_OK()
 
 
 @app.route('/app_version', methods=['GET'])
 def get_app_version():
-    """Provides the latest version info for the client from the database."""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    """Provides the latest version info for the client, served from the per-worker cache."""
     try:
-        cur.execute("SELECT version_number, download_url FROM versions WHERE is_latest = TRUE LIMIT 1;")
-        latest_version = cur.fetchone()
-        if latest_version:
-            return jsonify({
-                "latest_version": latest_version["version_number"],
-                "download_url": latest_version["download_url"]
-            }), 200
+        if get_repository().cache_reads:
+            ensure_cache_listener()
+            latest_version = app_version_cache.get(load_latest_version)
         else:
+            latest_version = load_latest_version()
+        if not latest_version:
             return jsonify({"success": False, "message": "No latest version configured."}), 404
+
+        body, etag = latest_version
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(body)
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = APP_VERSION_CLIENT_MAX_AGE
+        return response
     except Exception as e:
         print(f"Error in get_app_version: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred."}), 500
-    finally:
-        cur.close()
-        conn.close()
+        return INTERNAL_ERROR()
 
 
 @app.route('/activate_license', methods=['POST'])
@@ -132,138 +627,328 @@ def activate_license():
     hostname = data.get('hostname')
 
     if not all([license_key, device_id, username, hostname]):
-        return jsonify({"success": False, "message": "Missing data"}), 400
-
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        return MISSING_DATA()
+    throttled = rate_limited()
+    if throttled is not None:
+        return throttled
 
     try:
-        cur.execute("SELECT master_key, total_licenses FROM settings WHERE id = 1;")
-        settings = cur.fetchone()
-        if not settings:
-            return jsonify({"success": False, "message": "Server settings not initialized."}), 500
-
-        if license_key != settings["master_key"]:
-            return jsonify({"success": False, "message": "Invalid license key"}), 403
-
-        cur.execute("SELECT * FROM licenses WHERE device_id = %s;", (device_id,))
-        existing_device = cur.fetchone()
-
-        cur.execute("SELECT COUNT(*) FROM licenses WHERE status = 'active';")
-        active_count = cur.fetchone()['count']
-
-        if existing_device:
-            if existing_device['status'] == 'active':
-                return jsonify({"success": True, "message": "License already active on this device"}), 200
-            else:
-                if active_count >= settings["total_licenses"]:
-                    return jsonify({"success": False, "message": "All licenses are currently in use."}), 403
-                cur.execute(
-                    "UPDATE licenses SET status = 'active', activated_at = NOW(), username = %s, hostname = %s WHERE device_id = %s;",
-                    (username, hostname, device_id))
-                message = "License reactivated successfully!"
-                active_count += 1
-        else:
-            if active_count >= settings["total_licenses"]:
-                return jsonify({"success": False, "message": "All licenses are currently in use."}), 403
-            cur.execute("INSERT INTO licenses (device_id, username, hostname, status) VALUES (%s, %s, %s, 'active');",
-                        (device_id, username, hostname))
-            message = "License activated successfully!"
-            active_count += 1
-
-        conn.commit()
+        # The key picks the tenant (license pool) the device joins, and so the device's rate limit bucket.
+        tenant_id = resolve_tenant(license_key)
+        throttled = rate_limited(tenant_id, device_id, charge_ip=False)
+        if throttled is not None:
+            return throttled
+        if tenant_id is None:
+            return INVALID_LICENSE_KEY()
+        result, licenses_remaining = get_repository().activate(tenant_id, device_id, username, hostname)
+        if result in ACTIVATION_EVENTS:
+            record_audit_event(tenant_id, device_id, ACTIVATION_EVENTS[result])
+
+        if result == 'unknown_tenant':
+            # Deleted since the key map was loaded.
+            return INVALID_LICENSE_KEY()
+        if result == 'already_active':
+            return jsonify({"success": True, "message": "License already active on this device", "tenant_id": tenant_id,
+                            **issue_license_token(device_id, tenant_id=tenant_id)}), 200
+        if result == 'no_seats':
+            return ALL_LICENSES_IN_USE()
+
+        license_status_cache.invalidate(tenant_device_key(tenant_id, device_id))
+        message = "License activated successfully!" if result == 'activated' else "License reactivated successfully!"
         return jsonify({
-            "success": True, "message": message,
-            "licenses_remaining": settings["total_licenses"] - active_count
+            "success": True, "message": message, "tenant_id": tenant_id,
+            "licenses_remaining": licenses_remaining,
+            **issue_license_token(device_id, tenant_id=tenant_id)
         }), 200
     except Exception as e:
         print(f"Error in activate_license: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred."}), 500
-    finally:
-        cur.close()
-        conn.close()
+        return INTERNAL_ERROR()
 
 
 @app.route('/check_license', methods=['POST'])
 def check_license():
+    """Body: {"device_id", "tenant_id"}; tenant_id (as returned by /activate_license) defaults to the default tenant."""
     data = request.get_json()
     device_id = data.get('device_id')
     if not device_id:
-        return jsonify({"success": False, "message": "Missing device ID"}), 400
+        return MISSING_DEVICE_ID()
+    tenant_id = requested_tenant(data)
+    if tenant_id is None:
+        return invalid_tenant()
+    throttled = rate_limited(tenant_id, device_id)
+    if throttled is not None:
+        return throttled
 
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     try:
-        cur.execute("SELECT status FROM licenses WHERE device_id = %s;", (device_id,))
-        device = cur.fetchone()
-
-        if device and device['status'] == 'active':
-            return jsonify({"success": True, "message": "License active"}), 200
-        elif device:
-            return jsonify({"success": False, "message": "This device's license has been deactivated."}), 403
+        repository = get_repository()
+        if repository.cache_reads:
+            ensure_cache_listener()
+            # Concurrent misses for the same device share one query (see LRUTTLCache).
+            status = license_status_cache.get(tenant_device_key(tenant_id, device_id),
+                                              lambda: repository.license_status(tenant_id, device_id))
+        else:
+            status = repository.license_status(tenant_id, device_id)
+        if status is not None:
+            record_heartbeats(tenant_id, [device_id])
+
+        if status == 'active':
+            token = issue_license_token(device_id, tenant_id=tenant_id)
+            if not token:
+                return LICENSE_ACTIVE()
+            return jsonify({"success": True, "message": "License active", **token}), 200
+        elif status is not None:
+            return LICENSE_DEACTIVATED()
         else:
-            return jsonify({"success": False, "message": "License not found for this device."}), 403
+            return LICENSE_NOT_FOUND()
     except Exception as e:
         print(f"Error in check_license: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred."}), 500
-    finally:
-        cur.close()
-        conn.close()
+        return INTERNAL_ERROR()
+
+
+@app.route('/check_licenses', methods=['POST'])
+def check_licenses():
+    """
+    Batch form of /check_license for fleet agents: {"device_ids": [...], "tenant_id"} ->
+    {"statuses": {device_id: "active" | "deactivated" | "not_found"}}.
+    """
+    data = request.get_json()
+    device_ids = data.get('device_ids')
+    if not isinstance(device_ids, list) or not device_ids or not all(isinstance(d, str) and d for d in device_ids):
+        return jsonify({"success": False, "message": "device_ids must be a non-empty list of device IDs"}), 400
+    if len(device_ids) > CHECK_LICENSE_BATCH_MAX:
+        return jsonify({"success": False, "message": f"At most {CHECK_LICENSE_BATCH_MAX} devices per request"}), 400
+    tenant_id = requested_tenant(data)
+    if tenant_id is None:
+        return invalid_tenant()
+    throttled = rate_limited()
+    if throttled is not None:
+        return throttled
+
+    try:
+        repository = get_repository()
+        device_ids = list(dict.fromkeys(device_ids))
+        if repository.cache_reads:
+            ensure_cache_listener()
+            prefix = len(tenant_device_key(tenant_id, ""))
+
+            def load(keys):
+                known = repository.license_statuses(tenant_id, [key[prefix:] for key in keys])
+                return {tenant_device_key(tenant_id, device_id): status for device_id, status in known.items()}
+
+            cached = license_status_cache.get_many([tenant_device_key(tenant_id, d) for d in device_ids], load)
+            statuses = {key[prefix:]: status for key, status in cached.items()}
+        else:
+            known = repository.license_statuses(tenant_id, device_ids)
+            statuses = {device_id: known.get(device_id) for device_id in device_ids}
+        record_heartbeats(tenant_id, [device_id for device_id, status in statuses.items() if status is not None])
+        return jsonify({
+            "success": True,
+            "statuses": {device_id: batch_status_label(status) for device_id, status in statuses.items()}
+        }), 200
+    except Exception as e:
+        print(f"Error in check_licenses: {e}")
+        return INTERNAL_ERROR()
+
+
+@app.route('/license_token_public_key', methods=['GET'])
+def license_token_public_key():
+    """Public key clients use to verify offline license tokens locally."""
+    signer = get_signer()
+    if signer is None:
+        return jsonify({"success": False, "message": "License tokens are not enabled."}), 404
+    response = jsonify({"success": True, "algorithm": "EdDSA", "key_id": signer.key_id,
+                        "public_key": signer.public_key_pem()})
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response
+
+
+def load_revocation_list(tenant_id):
+    revoked = [{"device_id": device_id, "revoked_at": round(revoked_at, 3)}
+               for device_id, revoked_at in get_repository().revocations(tenant_id)]
+    return {"success": True, "revoked": revoked, "revocation_token": sign_revocation_list(revoked, tenant_id=tenant_id),
+            "refresh_after": REVOCATION_LIST_MAX_AGE}
+
+
+@app.route('/revoked_licenses', methods=['GET'])
+def revoked_licenses():
+    """
+    Devices deactivated within the token lifetime. A client holding a token for one of these
+    devices issued (iat) before revoked_at must treat it as invalid. Clients refresh every refresh_after seconds.
+    Per tenant: ?tenant_id= (default tenant when omitted).
+    """
+    tenant_id = requested_tenant(request.args)
+    if tenant_id is None:
+        return invalid_tenant()
+    try:
+        if get_repository().cache_reads:
+            ensure_cache_listener()
+            response = jsonify(revocation_list_cache.get(tenant_id, lambda: load_revocation_list(tenant_id)))
+        else:
+            response = jsonify(load_revocation_list(tenant_id))
+        response.cache_control.public = True
+        response.cache_control.max_age = 60
+        return response
+    except Exception as e:
+        print(f"Error in revoked_licenses: {e}")
+        return INTERNAL_ERROR()
 
 
 # --- Admin API Endpoints ---
 
-def update_device_status(device_id, new_status, admin_key):
-    if admin_key != ADMIN_SECRET_KEY:
-        return jsonify({"success": False, "message": "Unauthorized"}), 403
+def update_device_status(data, new_status):
+    if data.get('admin_key') != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    device_id = data.get('device_id')
     if not device_id:
-        return jsonify({"success": False, "message": "Missing device ID"}), 400
+        return MISSING_DEVICE_ID()
+    tenant_id = requested_tenant(data)
+    if tenant_id is None:
+        return invalid_tenant()
 
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     try:
-        cur.execute("SELECT status FROM licenses WHERE device_id = %s;", (device_id,))
-        device = cur.fetchone()
-        if not device:
+        outcome = get_repository().set_device_status(tenant_id, device_id, new_status)
+        if outcome == NOT_FOUND:
             return jsonify({"success": False, "message": "Device not found."}), 404
-        if device['status'] == new_status:
+        if outcome == UNCHANGED:
             return jsonify({"success": True, "message": f"Device is already {new_status}."}), 200
-
-        if new_status == 'active':
-            cur.execute("SELECT COUNT(*) as count FROM licenses WHERE status = 'active';")
-            active_count = cur.fetchone()['count']
-            cur.execute("SELECT total_licenses FROM settings WHERE id = 1;")
-            total_licenses = cur.fetchone()['total_licenses']
-            if active_count >= total_licenses:
-                return jsonify({"success": False, "message": "Cannot activate: All licenses are in use."}), 403
-
-        cur.execute("UPDATE licenses SET status = %s WHERE device_id = %s;", (new_status, device_id))
-        conn.commit()
+        if outcome == NO_SEATS:
+            return jsonify({"success": False, "message": "Cannot activate: All licenses are in use."}), 403
+        license_status_cache.invalidate(tenant_device_key(tenant_id, device_id))
+        revocation_list_cache.invalidate(tenant_id)
         return jsonify({"success": True, "message": f"Device '{device_id}' status set to {new_status}."}), 200
     except Exception as e:
         print(f"Error in update_device_status: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred."}), 500
+        return INTERNAL_ERROR()
+
+
+@app.route('/admin/bulk_update_devices', methods=['POST'])
+def bulk_update_devices():
+    """
+    Activates or deactivates many devices in one transaction with a single seat check.
+    Body: {"admin_key", "action": "activate"|"deactivate", "device_ids": [...], "tenant_id"}.
+    When there are fewer free seats than devices to activate, devices are activated in the given order until seats run out.
+    """
+    data = request.get_json()
+    if data.get('admin_key') != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+
+    action = data.get('action')
+    device_ids = data.get('device_ids')
+    if action not in ('activate', 'deactivate'):
+        return jsonify({"success": False, "message": "action must be 'activate' or 'deactivate'"}), 400
+    if not isinstance(device_ids, list) or not device_ids or not all(isinstance(d, str) and d for d in device_ids):
+        return jsonify({"success": False, "message": "device_ids must be a non-empty list of device IDs"}), 400
+    if len(device_ids) > BULK_UPDATE_MAX_DEVICES:
+        return jsonify({"success": False, "message": f"At most {BULK_UPDATE_MAX_DEVICES} devices per request"}), 400
+
+    tenant_id = requested_tenant(data)
+    if tenant_id is None:
+        return invalid_tenant()
+
+    new_status = 'active' if action == 'activate' else 'inactive'
+    device_ids = list(dict.fromkeys(device_ids))
+
+    try:
+        changed = get_repository().set_devices_status(tenant_id, device_ids, new_status)
+        if changed is None:
+            return tenant_not_found(tenant_id)
+        outcomes, licenses_remaining = changed
+
+        messages = {
+            NOT_FOUND: (False, "Device not found."),
+            UNCHANGED: (True, f"Device is already {new_status}."),
+            NO_SEATS: (False, "Cannot activate: All licenses are in use."),
+        }
+        results, updated = {}, 0
+        for device_id, outcome in outcomes.items():
+            if outcome in messages:
+                success, message = messages[outcome]
+            else:
+                success, message = True, f"Device '{device_id}' status set to {new_status}."
+                updated += 1
+                license_status_cache.invalidate(tenant_device_key(tenant_id, device_id))
+            results[device_id] = {"success": success, "message": message}
+        if updated:
+            revocation_list_cache.invalidate(tenant_id)
+
+        failed = sum(1 for r in results.values() if not r["success"])
+        return jsonify({
+            "success": failed == 0,
+            "message": f"{updated} device(s) set to {new_status}, {failed} failed.",
+            "licenses_remaining": licenses_remaining,
+            "results": results
+        }), 200
+    except Exception as e:
+        print(f"Error in bulk_update_devices: {e}")
+        return INTERNAL_ERROR()
+
+
+# --- Device Listing Helpers ---
+
+# The orderings, filters and cursors themselves live in Teal_Storage (parse_device_query).
+VIEW_STATUS_PAGING_ARGS = ("limit", "cursor", "order", "direction", "format", "status", "username", "hostname")
+
+
+def stream_devices_ndjson(sql, params):
+    """Yields one JSON line per device from a named (server-side) cursor, so neither side buffers the full set."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor(name="view_status_stream", cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.itersize = VIEW_STATUS_STREAM_BATCH
+            cur.execute(sql, params)
+            for row in cur:
+                row.pop('_sort_key', None)
+                yield json.dumps(row) + "\n"
+        conn.rollback()
     finally:
-        cur.close()
-        conn.close()
+        release_db_connection(conn)
+
+
+def stream_copy(copy_sql, params):
+    """COPY TO STDOUT bytes as they arrive (see Teal_Bulk_IO.stream_copy_out); nothing is decoded or re-encoded here."""
+    return stream_copy_out(get_db_connection, release_db_connection, copy_sql, params)
 
 
 @app.route('/admin/view_status', methods=['GET'])
 def view_status():
+    """
+    Lists devices. With no paging arguments this returns the full legacy payload; otherwise it returns one
+    keyset page ({"devices", "next_cursor"}) or, with format=ndjson, streams every matching device.
+    On Postgres the legacy payload is JSON built by the database and streamed through.
+    Filters: status (exact), username/hostname (prefix).
+    Ordering: order=device_id|activated_at|username|hostname|status, direction=asc|desc.
+    All of it is scoped to ?tenant_id= (default tenant if omitted).
+    """
     admin_key = request.args.get('admin_key')
     if admin_key != ADMIN_SECRET_KEY:
-        return jsonify({"success": False, "message": "Unauthorized"}), 403
+        return UNAUTHORIZED()
+    tenant_id = requested_tenant(request.args)
+    if tenant_id is None:
+        return invalid_tenant()
 
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    try:
-        cur.execute("SELECT total_licenses FROM settings WHERE id = 1;")
-        settings = cur.fetchone()
-        total_licenses = settings['total_licenses'] if settings else 0
+    if any(arg in request.args for arg in VIEW_STATUS_PAGING_ARGS):
+        return view_status_page(tenant_id)
 
-        cur.execute(
-            "SELECT device_id, username, hostname, status, to_char(activated_at, 'YYYY-MM-DD HH24:MI:SS TZ') as activated_at FROM licenses;")
-        all_devices = cur.fetchall()
+    try:
+        repository = get_repository()
+        if isinstance(repository, PostgresLicenseRepository):
+            # Postgres writes the whole payload as JSON; it is streamed through without becoming Python objects.
+            if repository.seat_summary(tenant_id) is None:
+                return tenant_not_found(tenant_id)
+            sql, params = postgres_view_status_sql(tenant_id)
+            chunks = stream_copy(f"COPY ({sql}) TO STDOUT WITH ({JSON_LINES_COPY_OPTIONS})", params)
+            # Pulled before answering, so a failure to get a connection or run the COPY (raised here) is still a
+            # 500. The first row always exists (the counts); none means the tenant vanished in between.
+            first = next(chunks, None)
+            if first is None:
+                return INTERNAL_ERROR()
+            return Response(join_json_lines(itertools.chain([first], chunks)), mimetype="application/json")
+
+        listing = repository.all_devices(tenant_id)
+        if listing is None:
+            return tenant_not_found(tenant_id)
+        total_licenses, all_devices = listing
 
         activated_devices_dict = {d['device_id']: d for d in all_devices}
         active_count = sum(1 for d in all_devices if d['status'] == 'active')
@@ -276,10 +961,443 @@ def view_status():
         }), 200
     except Exception as e:
         print(f"Error in view_status: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred."}), 500
+        return INTERNAL_ERROR()
+
+
+def view_status_page(tenant_id):
+    try:
+        query = parse_device_query(request.args)
+        limit = int(request.args.get('limit', VIEW_STATUS_DEFAULT_PAGE_SIZE))
+        if not 1 <= limit <= VIEW_STATUS_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {VIEW_STATUS_MAX_PAGE_SIZE}")
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    repository = get_repository()
+    if request.args.get('format') == 'ndjson':
+        if not isinstance(repository, PostgresLicenseRepository):
+            return jsonify({"success": False,
+                            "message": f"Not available with the {STORAGE_BACKEND} storage backend."}), 501
+        sql, params = postgres_device_sql(tenant_id, query)
+        return Response(stream_with_context(stream_devices_ndjson(sql, params)), mimetype="application/x-ndjson")
+
+    try:
+        devices, next_cursor = repository.device_page(tenant_id, query, limit)
+        return jsonify({"success": True, "devices": devices, "next_cursor": next_cursor}), 200
+    except Exception as e:
+        print(f"Error in view_status: {e}")
+        return INTERNAL_ERROR()
+
+
+@app.route('/admin/license_summary', methods=['GET'])
+def license_summary():
+    """Seat totals without touching the device rows (reads the tenant's maintained counter)."""
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    tenant_id = requested_tenant(request.args)
+    if tenant_id is None:
+        return invalid_tenant()
+
+    try:
+        seats = get_repository().seat_summary(tenant_id)
+        if not seats:
+            return tenant_not_found(tenant_id)
+        total_licenses, active_count = seats
+        return jsonify({
+            "success": True,
+            "total_licenses": total_licenses,
+            "activated_count": active_count,
+            "licenses_remaining": total_licenses - active_count
+        }), 200
+    except Exception as e:
+        print(f"Error in license_summary: {e}")
+        return INTERNAL_ERROR()
+
+
+@app.route('/admin/activity', methods=['GET'])
+def license_activity():
+    """
+    Aggregated audit trail for ?tenant_id=: activations, reactivations and denials (no seats) per day
+    for the last ?days= days, and distinct active devices per hour for the last ?hours= hours, both
+    UTC and oldest first, with empty buckets included. Events reach the table a few seconds late
+    (AUDIT_FLUSH_INTERVAL).
+    """
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    tenant_id = requested_tenant(request.args)
+    if tenant_id is None:
+        return invalid_tenant()
+    try:
+        days = int(request.args.get('days', ACTIVITY_DEFAULT_DAYS))
+        hours = int(request.args.get('hours', ACTIVITY_DEFAULT_HOURS))
+        if not 1 <= days <= ACTIVITY_MAX_DAYS or not 1 <= hours <= ACTIVITY_MAX_HOURS:
+            raise ValueError
+    except ValueError:
+        return jsonify({"success": False, "message": f"days must be 1-{ACTIVITY_MAX_DAYS} and hours 1-{ACTIVITY_MAX_HOURS}"}), 400
+
+    now = time.time()
+    first_day = now - now % 86400 - (days - 1) * 86400
+    first_hour = now - now % 3600 - (hours - 1) * 3600
+    try:
+        activity = get_repository().activity(tenant_id, first_day, first_hour)
+        if activity is None:
+            return tenant_not_found(tenant_id)
+        daily, hourly = activity
+        counts = {(day, event): count for day, event, count in daily}
+        devices = dict(hourly)
+        per_day = []
+        for i in range(days):
+            day = time.strftime("%Y-%m-%d", time.gmtime(first_day + i * 86400))
+            per_day.append({"day": day, **{event: counts.get((day, event), 0) for event in ACTIVATION_EVENTS.values()}})
+        per_hour = []
+        for i in range(hours):
+            hour = time.strftime("%Y-%m-%d %H:00", time.gmtime(first_hour + i * 3600))
+            per_hour.append({"hour": hour, "active_devices": devices.get(hour, 0)})
+        return jsonify({"success": True, "tenant_id": tenant_id, "activations_per_day": per_day,
+                        "active_devices_per_hour": per_hour}), 200
+    except Exception as e:
+        print(f"Error in license_activity: {e}")
+        return INTERNAL_ERROR()
+
+
+def parse_change_cursor(since):
+    """Parses a /admin/license_changes cursor ("<revision>" or "<revision>:<device_id>") into (revision, device_id)."""
+    revision, _, device_id = (since or "0").partition(":")
+    if not revision.isdigit():
+        raise ValueError("Invalid since cursor")
+    return int(revision), device_id
+
+
+@app.route('/admin/license_changes', methods=['GET'])
+@requires_postgres
+def license_changes():
+    """
+    Delta sync: devices inserted or changed after the `since` cursor, oldest change first.
+    Start with since=0 for a full (paged) sync, or since=now to only follow changes from here on,
+    then keep passing back next_since. A device changed several times is returned once, with its
+    current state; has_more means another page is ready immediately. Scoped to ?tenant_id=.
+    Devices the idle sweeper moved to licenses_archive are returned with status "archived".
+    """
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    tenant_id = requested_tenant(request.args)
+    if tenant_id is None:
+        return invalid_tenant()
+
+    since = request.args.get('since', '0')
+    try:
+        after = None if since == 'now' else parse_change_cursor(since)
+        limit = int(request.args.get('limit', LICENSE_CHANGES_DEFAULT_LIMIT))
+        if not 1 <= limit <= LICENSE_CHANGES_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {LICENSE_CHANGES_MAX_LIMIT}")
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        # Transactions older than the snapshot's xmin have all finished, so every revision below it is final.
+        cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS horizon;")
+        horizon = cur.fetchone()['horizon']
+        if after is None:
+            return jsonify({"success": True, "changes": [], "next_since": str(horizon), "has_more": False}), 200
+
+        cur.execute(
+            f"""(SELECT {DEVICE_COLUMNS}, revision, to_char(updated_at, 'YYYY-MM-DD HH24:MI:SS TZ') AS updated_at
+                 FROM licenses WHERE tenant_id = %(tenant)s AND (revision, device_id) > (%(revision)s, %(device)s)
+                   AND revision < %(horizon)s ORDER BY revision, device_id LIMIT %(limit)s)
+                UNION ALL
+                (SELECT {DEVICE_COLUMNS}, revision, to_char(archived_at, 'YYYY-MM-DD HH24:MI:SS TZ')
+                 FROM licenses_archive WHERE tenant_id = %(tenant)s AND (revision, device_id) > (%(revision)s, %(device)s)
+                   AND revision < %(horizon)s ORDER BY revision, device_id LIMIT %(limit)s)
+                ORDER BY revision, device_id LIMIT %(limit)s;""",
+            {"tenant": tenant_id, "revision": after[0], "device": after[1], "horizon": horizon, "limit": limit + 1})
+        changes = cur.fetchall()
+        has_more = len(changes) > limit
+        if has_more:
+            changes = changes[:limit]
+            next_since = f"{changes[-1]['revision']}:{changes[-1]['device_id']}"
+        else:
+            next_since = str(max(horizon, after[0]))
+        return jsonify({"success": True, "changes": changes, "next_since": next_since, "has_more": has_more}), 200
+    except Exception as e:
+        print(f"Error in license_changes: {e}")
+        return INTERNAL_ERROR()
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
+
+
+# --- Bulk Import / Export ---
+
+@app.route('/admin/export_devices', methods=['GET'])
+@requires_postgres
+def export_devices():
+    """
+    Streams devices as CSV (with a header) or NDJSON via COPY TO STDOUT. Accepts the same status/username/
+    hostname filters, order/direction and tenant_id as /admin/view_status.
+    """
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    tenant_id = requested_tenant(request.args)
+    if tenant_id is None:
+        return invalid_tenant()
+    export_format = request.args.get('format', 'csv')
+    try:
+        if export_format not in ('csv', 'ndjson'):
+            raise ValueError("format must be csv or ndjson")
+        args = {k: v for k, v in request.args.items() if k != 'cursor'}
+        sql, params = postgres_device_sql(tenant_id, parse_device_query(args))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    if export_format == 'csv':
+        copy_sql = (f"COPY (SELECT device_id, username, hostname, status, activated_at FROM ({sql}) d) "
+                    f"TO STDOUT WITH (FORMAT csv, HEADER true)")
+        mimetype, extension = "text/csv", "csv"
+    else:
+        copy_sql = (f"COPY (SELECT json_build_object('device_id', device_id, 'username', username, "
+                    f"'hostname', hostname, 'status', status, 'activated_at', activated_at)::text "
+                    f"FROM ({sql}) d) TO STDOUT WITH ({JSON_LINES_COPY_OPTIONS})")
+        mimetype, extension = "application/x-ndjson", "ndjson"
+    response = Response(stream_copy(copy_sql, params), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="devices.{extension}"'
+    return response
+
+
+def copy_import_into_staging(cur, import_format):
+    """Streams the request body into the device_import temp table. Raises ImportFormatError for bad input."""
+    cur.execute("""
+        CREATE TEMP TABLE device_import (
+            line BIGSERIAL, device_id TEXT, username TEXT, hostname TEXT, status TEXT
+        ) ON COMMIT DROP;
+    """)
+    if import_format == 'csv':
+        columns = read_csv_header(request.stream)
+        # The sequence numbers rows from 1; the header is line 1 of the file.
+        cur.execute("SELECT setval(pg_get_serial_sequence('device_import', 'line'), 1);")
+        cur.copy_expert(f"COPY device_import ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", request.stream)
+    else:
+        rows = NDJSONToCSV(request.stream)
+        try:
+            cur.copy_expert(f"COPY device_import (line, {', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                            rows)
+        except psycopg2.Error:
+            if rows.error:
+                raise ImportFormatError(rows.error)
+            raise
+    cur.execute("UPDATE device_import SET status = COALESCE(NULLIF(status, ''), 'active');")
+
+
+@app.route('/admin/import_devices', methods=['POST'])
+@requires_postgres
+def import_devices():
+    """
+    Bulk-registers devices from a CSV (header: device_id,username[,hostname][,status]) or NDJSON request body,
+    streamed through COPY into a staging table. admin_key, tenant_id, format=csv|ndjson and
+    on_conflict=skip|update|error go in the query string. All-or-nothing: invalid rows, or more active devices
+    than the tenant's total_licenses, reject the whole file.
+    """
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    tenant_id = requested_tenant(request.args)
+    if tenant_id is None:
+        return invalid_tenant()
+    import_format = request.args.get('format', 'csv')
+    on_conflict = request.args.get('on_conflict', 'skip')
+    if import_format not in ('csv', 'ndjson'):
+        return jsonify({"success": False, "message": "format must be csv or ndjson"}), 400
+    if on_conflict not in IMPORT_CONFLICT_MODES:
+        return jsonify({"success": False, "message": f"on_conflict must be one of: {', '.join(IMPORT_CONFLICT_MODES)}"}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        try:
+            copy_import_into_staging(cur, import_format)
+        except (ImportFormatError, psycopg2.DataError) as e:
+            conn.rollback()
+            return jsonify({"success": False, "message": f"Could not read import file: {e}"}), 400
+
+        cur.execute("""
+            SELECT line, device_id, CASE
+                WHEN device_id IS NULL OR device_id = '' THEN 'device_id is required'
+                WHEN username IS NULL OR username = '' THEN 'username is required'
+                WHEN status NOT IN ('active', 'inactive') THEN 'status must be active or inactive'
+                WHEN count(*) OVER (PARTITION BY device_id) > 1 THEN 'device_id appears more than once'
+            END AS error
+            FROM device_import ORDER BY line;
+        """)
+        errors = [row for row in cur.fetchall() if row['error']]
+        if errors:
+            conn.rollback()
+            return jsonify({"success": False, "message": f"{len(errors)} invalid row(s); nothing was imported.",
+                            "errors": errors[:IMPORT_ERROR_SAMPLE]}), 400
+
+        # Tenant first, then licenses rows: the same lock order as every other seat change.
+        cur.execute("SELECT total_licenses, active_count FROM tenants WHERE tenant_id = %s FOR UPDATE;",
+                    (tenant_id,))
+        tenant = cur.fetchone()
+        if not tenant:
+            conn.rollback()
+            return tenant_not_found(tenant_id)
+        cur.execute("""SELECT device_id FROM licenses
+                       WHERE tenant_id = %s AND device_id IN (SELECT device_id FROM device_import)
+                       ORDER BY device_id FOR UPDATE;""", (tenant_id,))
+        cur.execute("""
+            SELECT count(*) FILTER (WHERE l.device_id IS NULL) AS new_rows,
+                   count(*) FILTER (WHERE l.device_id IS NULL AND i.status = 'active') AS new_active,
+                   count(*) FILTER (WHERE l.status <> 'active' AND i.status = 'active') AS reactivated,
+                   count(*) FILTER (WHERE l.status = 'active' AND i.status <> 'active') AS deactivated,
+                   count(l.device_id) AS existing
+            FROM device_import i LEFT JOIN licenses l ON l.tenant_id = %s AND l.device_id = i.device_id;
+        """, (tenant_id,))
+        counts = cur.fetchone()
+        if on_conflict == 'error' and counts['existing']:
+            conn.rollback()
+            return jsonify({"success": False,
+                            "message": f"{counts['existing']} device(s) already exist; nothing was imported."}), 409
+
+        delta = counts['new_active']
+        if on_conflict == 'update':
+            delta += counts['reactivated'] - counts['deactivated']
+        if delta > 0 and tenant['active_count'] + delta > tenant['total_licenses']:
+            conn.rollback()
+            return jsonify({"success": False, "message": (
+                f"Import needs {delta} more seat(s) but only "
+                f"{max(tenant['total_licenses'] - tenant['active_count'], 0)} are free; nothing was imported.")}), 409
+
+        if on_conflict == 'update':
+            cur.execute("""
+                SELECT i.device_id FROM device_import i JOIN licenses l ON l.tenant_id = %s AND l.device_id = i.device_id
+                WHERE l.status = 'active' AND i.status <> 'active';
+            """, (tenant_id,))
+            revoked = [row['device_id'] for row in cur.fetchall()]
+            if revoked:
+                record_revocations(cur, tenant_id, revoked, LICENSE_TOKEN_TTL)
+            conflict_clause = """DO UPDATE SET username = EXCLUDED.username, hostname = EXCLUDED.hostname,
+                status = EXCLUDED.status,
+                activated_at = CASE WHEN licenses.status <> 'active' AND EXCLUDED.status = 'active'
+                                    THEN NOW() ELSE licenses.activated_at END"""
+        else:
+            conflict_clause = "DO NOTHING"
+        cur.execute(f"""
+            INSERT INTO licenses (tenant_id, device_id, username, hostname, status)
+            SELECT %s, device_id, username, hostname, status FROM device_import ORDER BY line
+            ON CONFLICT (tenant_id, device_id) {conflict_clause};
+        """, (tenant_id,))
+        written = cur.rowcount
+        cur.execute("UPDATE tenants SET active_count = GREATEST(active_count + %s, 0) WHERE tenant_id = %s;",
+                    (delta, tenant_id))
+        # One payload-less notification clears every worker's status cache, rather than one per device.
+        notify(cur, LICENSE_CHANNEL)
+        conn.commit()
+        license_status_cache.invalidate()
+        revocation_list_cache.invalidate(tenant_id)
+
+        updated = counts['existing'] if on_conflict == 'update' else 0
+        total = counts['new_rows'] + counts['existing']
+        return jsonify({
+            "success": True,
+            "message": f"Imported {total} row(s): {counts['new_rows']} added, {updated} updated, "
+                       f"{total - written} skipped.",
+            "added": counts['new_rows'], "updated": updated, "skipped": total - written,
+            "licenses_remaining": tenant['total_licenses'] - tenant['active_count'] - delta
+        }), 200
+    except Exception as e:
+        conn.rollback()
+        print(f"Error in import_devices: {e}")
+        return INTERNAL_ERROR()
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+
+admin_events = EventBroadcaster(ADMIN_EVENTS_MAX_CLIENTS)
+_event_listener = None
+_event_listener_lock = threading.Lock()
+
+
+def _publish_admin_event(payload):
+    # None: the listener reconnected and may have missed notifications.
+    admin_events.publish(json.loads(payload) if payload else {"type": "resync"})
+
+
+def ensure_event_listener():
+    """Starts this worker's LISTEN thread for admin change events (only once a client subscribes)."""
+    global _event_listener
+    if _event_listener is None:
+        with _event_listener_lock:
+            if _event_listener is None:
+                listener = InvalidationListener(os.environ.get('DATABASE_URL'))
+                listener.subscribe(ADMIN_EVENTS_CHANNEL, _publish_admin_event)
+                _event_listener = listener
+    _event_listener.ensure_started()
+
+
+def stream_admin_events(client, tenant_id, summary):
+    try:
+        yield "retry: 5000\n\n"
+        yield format_sse("seats", summary)
+        deadline = time.monotonic() + ADMIN_EVENTS_MAX_DURATION
+        while time.monotonic() < deadline:
+            try:
+                event = client.get(timeout=ADMIN_EVENTS_KEEPALIVE)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                # Dropped for falling behind.
+                yield format_sse("resync", {})
+                return
+            if event.get("tenant_id", tenant_id) != tenant_id:
+                continue
+            # The event dict is shared by every client's queue: read it, don't change it.
+            yield format_sse(event["type"], {k: v for k, v in event.items() if k != "type"}, event.get("revision"))
+    finally:
+        admin_events.unsubscribe(client)
+
+
+@app.route('/admin/events', methods=['GET'])
+@requires_postgres
+def admin_event_stream():
+    """
+    Server-Sent Events: "seats" (totals, sent first and on every change), "device" (one device's
+    new state), "versions" (the version list changed) and "resync" (events may have been missed;
+    re-fetch everything). Device and seat events are limited to ?tenant_id=. Needs threaded workers
+    (gunicorn --threads) as each stream holds a thread.
+    """
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    tenant_id = requested_tenant(request.args)
+    if tenant_id is None:
+        return invalid_tenant()
+
+    ensure_event_listener()
+    client = admin_events.subscribe()
+    if client is None:
+        return jsonify({"success": False, "message": "Too many event stream clients."}), 503
+    try:
+        # Read after subscribing, so (once the listener is up) a change in between arrives as an event.
+        total_licenses, active_count = get_repository().seat_summary(tenant_id) or (0, 0)
+    except Exception as e:
+        admin_events.unsubscribe(client)
+        print(f"Error in admin_event_stream: {e}")
+        return INTERNAL_ERROR()
+
+    summary = {"total_licenses": total_licenses, "activated_count": active_count,
+               "licenses_remaining": total_licenses - active_count}
+    response = Response(stream_with_context(stream_admin_events(client, tenant_id, summary)),
+                        mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let a reverse proxy buffer the stream
+    return response
 
 
 @app.route('/admin/set_total_licenses', methods=['POST'])
@@ -289,34 +1407,130 @@ def set_total_licenses():
     admin_key = data.get('admin_key')
 
     if admin_key != ADMIN_SECRET_KEY:
-        return jsonify({"success": False, "message": "Unauthorized"}), 403
+        return UNAUTHORIZED()
     if not isinstance(new_total, int) or new_total < 0:
         return jsonify({"success": False, "message": "Invalid new_total_licenses"}), 400
+    tenant_id = requested_tenant(data)
+    if tenant_id is None:
+        return invalid_tenant()
 
-    conn = get_db_connection()
-    cur = conn.cursor()
     try:
-        cur.execute("UPDATE settings SET total_licenses = %s WHERE id = 1;", (new_total,))
-        conn.commit()
+        if not get_repository().set_total_licenses(tenant_id, new_total):
+            return tenant_not_found(tenant_id)
         return jsonify({"success": True, "message": f"Total licenses set to {new_total}"}), 200
     except Exception as e:
         print(f"Error in set_total_licenses: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred."}), 500
-    finally:
-        cur.close()
-        conn.close()
+        return INTERNAL_ERROR()
+
+
+# --- Tenant Admin Endpoints ---
+
+@app.route('/admin/tenants', methods=['GET'])
+def list_tenants():
+    """Every tenant with its seat totals; license keys are never returned."""
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+
+    try:
+        return jsonify({"success": True, "tenants": get_repository().tenants()}), 200
+    except Exception as e:
+        print(f"Error in list_tenants: {e}")
+        return INTERNAL_ERROR()
+
+
+@app.route('/admin/create_tenant', methods=['POST'])
+def create_tenant():
+    """Body: {"admin_key", "tenant_id", "name", "license_key", "total_licenses"}."""
+    data = request.get_json()
+    if data.get('admin_key') != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    tenant_id = data.get('tenant_id')
+    name = data.get('name') or tenant_id
+    license_key = data.get('license_key')
+    total_licenses = data.get('total_licenses', 0)
+    if not isinstance(tenant_id, str) or not TENANT_ID_PATTERN.match(tenant_id):
+        return invalid_tenant()
+    if not isinstance(name, str) or not isinstance(license_key, str) or not license_key:
+        return jsonify({"success": False, "message": "Missing name or license_key"}), 400
+    if not isinstance(total_licenses, int) or total_licenses < 0:
+        return jsonify({"success": False, "message": "Invalid total_licenses"}), 400
+
+    try:
+        outcome = get_repository().create_tenant(tenant_id, name, license_key, total_licenses)
+        if outcome == EXISTS:
+            return jsonify({"success": False, "message": f"Tenant '{tenant_id}' already exists."}), 409
+        if outcome == KEY_IN_USE:
+            return jsonify({"success": False, "message": "License key is already used by another tenant."}), 409
+        # Other workers hear about it through TENANT_CHANNEL; don't wait for our own notification.
+        tenant_key_cache.invalidate()
+        return jsonify({"success": True, "message": f"Tenant '{tenant_id}' created with {total_licenses} license(s)."}), 201
+    except Exception as e:
+        print(f"Error in create_tenant: {e}")
+        return INTERNAL_ERROR()
+
+
+@app.route('/admin/update_tenant', methods=['POST'])
+def update_tenant():
+    """Renames a tenant and/or rotates its license key. Body: {"admin_key", "tenant_id", "name"?, "license_key"?}."""
+    data = request.get_json()
+    if data.get('admin_key') != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    tenant_id = requested_tenant(data)
+    if tenant_id is None:
+        return invalid_tenant()
+    name, license_key = data.get('name'), data.get('license_key')
+    if name is None and license_key is None:
+        return jsonify({"success": False, "message": "Nothing to update"}), 400
+    if (name is not None and not isinstance(name, str)) or \
+            (license_key is not None and (not isinstance(license_key, str) or not license_key)):
+        return jsonify({"success": False, "message": "Invalid name or license_key"}), 400
+
+    try:
+        outcome = get_repository().update_tenant(tenant_id, name=name, license_key=license_key)
+        if outcome == NOT_FOUND:
+            return tenant_not_found(tenant_id)
+        if outcome == KEY_IN_USE:
+            return jsonify({"success": False, "message": "License key is already used by another tenant."}), 409
+        tenant_key_cache.invalidate()
+        return jsonify({"success": True, "message": f"Tenant '{tenant_id}' updated."}), 200
+    except Exception as e:
+        print(f"Error in update_tenant: {e}")
+        return INTERNAL_ERROR()
 
 
 @app.route('/admin/deactivate_device', methods=['POST'])
 def deactivate_device():
-    data = request.get_json()
-    return update_device_status(data.get('device_id'), 'inactive', data.get('admin_key'))
+    return update_device_status(request.get_json(), 'inactive')
 
 
 @app.route('/admin/activate_device', methods=['POST'])
 def activate_device_admin():
-    data = request.get_json()
-    return update_device_status(data.get('device_id'), 'active', data.get('admin_key'))
+    return update_device_status(request.get_json(), 'active')
+
+
+@app.route('/admin/pool_stats', methods=['GET'])
+@requires_postgres
+def pool_stats():
+    """Connection pool usage (checkouts, wait times, reconnects) for sizing DB_POOL_MAX_SIZE."""
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    return jsonify({"success": True, "pool": get_db_pool().stats()}), 200
+
+
+@app.route('/admin/cache_stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss/eviction counters for the license status and app version caches, the last_seen buffer and audit queue."""
+    admin_key = request.args.get('admin_key')
+    if admin_key != ADMIN_SECRET_KEY:
+        return UNAUTHORIZED()
+    body = {"success": True, "license_status_cache": license_status_cache.stats(),
+            "app_version_cache": app_version_cache.stats(), "last_seen_buffer": last_seen_buffer.stats(),
+            "audit_queue": audit_queue.stats()}
+    if hasattr(rate_limiter.backend, "stats"):
+        body["rate_limit"] = rate_limiter.backend.stats()
+    return jsonify(body), 200
 
 
 # --- NEW: Version Management Admin Endpoints ---
@@ -325,21 +1539,13 @@ def activate_device_admin():
 def get_versions():
     admin_key = request.args.get('admin_key')
     if admin_key != ADMIN_SECRET_KEY:
-        return jsonify({"success": False, "message": "Unauthorized"}), 403
+        return UNAUTHORIZED()
 
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     try:
-        cur.execute(
-            "SELECT version_number, to_char(release_date, 'YYYY-MM-DD HH24:MI:SS TZ') as release_date, download_url, is_latest FROM versions ORDER BY release_date DESC;")
-        versions = cur.fetchall()
-        return jsonify({"success": True, "versions": versions}), 200
+        return jsonify({"success": True, "versions": get_repository().versions()}), 200
     except Exception as e:
         print(f"Error in get_versions: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred."}), 500
-    finally:
-        cur.close()
-        conn.close()
+        return INTERNAL_ERROR()
 
 
 @app.route('/admin/set_latest_version', methods=['POST'])
@@ -350,41 +1556,24 @@ def set_latest_version():
     admin_key = data.get('admin_key')
 
     if admin_key != ADMIN_SECRET_KEY:
-        return jsonify({"success": False, "message": "Unauthorized"}), 403
+        return UNAUTHORIZED()
     if not new_version or not download_url:
         return jsonify({"success": False, "message": "Missing version_number or download_url"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
     try:
-        # Transaction: Set all other versions to not be the latest
-        cur.execute("UPDATE versions SET is_latest = FALSE;")
-
-        # Check if the new version already exists
-        cur.execute("SELECT version_number FROM versions WHERE version_number = %s;", (new_version,))
-        if cur.fetchone():
-            # If it exists, update it to be the latest
-            cur.execute(
-                "UPDATE versions SET is_latest = TRUE, download_url = %s, release_date = NOW() WHERE version_number = %s;",
-                (download_url, new_version))
-            message = f"Successfully set version {new_version} as the latest."
-        else:
-            # If it's a new version, insert it
-            cur.execute("INSERT INTO versions (version_number, download_url, is_latest) VALUES (%s, %s, TRUE);",
-                        (new_version, download_url))
+        if get_repository().set_latest_version(new_version, download_url):
             message = f"Successfully added and set new version {new_version} as the latest."
-
-        conn.commit()
+        else:
+            message = f"Successfully set version {new_version} as the latest."
+        app_version_cache.invalidate()
         return jsonify({"success": True, "message": message}), 200
     except Exception as e:
-        conn.rollback()
         print(f"Error in set_latest_version: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred."}), 500
-    finally:
-        cur.close()
-        conn.close()
+        return INTERNAL_ERROR()
 
 
 if __name__ == '__main__':
+    # Local development: there's no separate deploy step, so set up the schema here.
+    setup_database()
     port = int(os.environ.get("PORT", 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
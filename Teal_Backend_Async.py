@@ -0,0 +1,424 @@
+"""
+Async (ASGI) serving mode for the public client endpoints.
+
+Serves /health, /app_version, /activate_license, /check_license and /check_licenses with the same responses as
+Teal_Backend, but on asyncpg with its own pool, so one process can hold thousands of concurrent
+heartbeats while they wait on Postgres. Admin endpoints stay on the WSGI app.
+
+    uvicorn Teal_Backend_Async:app --host 0.0.0.0 --port 5000 --workers 4
+    # or: gunicorn -k uvicorn.workers.UvicornWorker -w 4 Teal_Backend_Async:app
+
+Schema setup is not done here; run `flask --app Teal_Backend init-db` once per deploy as usual. Postgres only: with
+STORAGE_BACKEND=sqlite, serve everything from Teal_Backend. Heartbeats are buffered into licenses.last_seen and
+the license_events audit log here too, but the idle sweeper and audit retention run in the Teal_Backend workers
+(or `flask --app Teal_Backend sweep-idle` from cron).
+"""
+import os
+import math
+import asyncio
+import hashlib
+import contextlib
+from datetime import datetime, timezone
+import asyncpg
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from Teal_Cache import VersionedValueCache, LRUTTLCache
+from Teal_License_Tokens import issue_license_token
+from Teal_Rate_Limit import RateLimiter, load_backend, client_ip
+from Teal_Reclaim import LastSeenBuffer
+from Teal_Audit import AuditEventQueue, ACTIVATION_EVENTS, EVENT_COLUMNS
+from Teal_Responses import JSON_MIMETYPE, dumps, etag_matches, loads
+from Teal_Backend import (
+    APP_VERSION_CACHE_TTL, APP_VERSION_CLIENT_MAX_AGE, APP_VERSION_CHANNEL, CACHE_LISTEN_ENABLED,
+    LICENSE_CACHE_MAX_ENTRIES, LICENSE_CACHE_TTL, LICENSE_CACHE_NEGATIVE_TTL, LICENSE_CHANNEL,
+    TENANT_KEY_CACHE_TTL, TENANT_CHANNEL, CHECK_LICENSE_BATCH_MAX, LAST_SEEN_FLUSH_INTERVAL, LAST_SEEN_RESOLUTION,
+    LAST_SEEN_MAX_PENDING, AUDIT_EVENTS_ENABLED, AUDIT_FLUSH_INTERVAL, AUDIT_FLUSH_BATCH_SIZE, AUDIT_MAX_PENDING,
+    AUDIT_HEARTBEAT_INTERVAL, HEALTH_OK, LICENSE_ACTIVE, LICENSE_DEACTIVATED, LICENSE_NOT_FOUND, INVALID_LICENSE_KEY,
+    ALL_LICENSES_IN_USE, MISSING_DATA, MISSING_DEVICE_ID, INVALID_TENANT, INTERNAL_ERROR, batch_status_label,
+    requested_tenant,
+)
+from Teal_Storage import tenant_device_key
+
+# --- Configuration ---
+ASYNC_DB_POOL_MIN_SIZE = int(os.environ.get("ASYNC_DB_POOL_MIN_SIZE", 2))
+ASYNC_DB_POOL_MAX_SIZE = int(os.environ.get("ASYNC_DB_POOL_MAX_SIZE", 20))
+ASYNC_DB_QUERY_TIMEOUT = float(os.environ.get("ASYNC_DB_QUERY_TIMEOUT", 10))
+LISTENER_RECONNECT_DELAY = 5.0
+
+app_version_cache = VersionedValueCache(APP_VERSION_CACHE_TTL)
+license_status_cache = LRUTTLCache(LICENSE_CACHE_MAX_ENTRIES, LICENSE_CACHE_TTL, LICENSE_CACHE_NEGATIVE_TTL)
+tenant_key_cache = VersionedValueCache(TENANT_KEY_CACHE_TTL)
+last_seen_buffer = LastSeenBuffer(LAST_SEEN_MAX_PENDING)
+audit_queue = AuditEventQueue(AUDIT_MAX_PENDING, AUDIT_FLUSH_BATCH_SIZE, AUDIT_HEARTBEAT_INTERVAL)
+_last_seen_full = None
+_audit_batch_ready = None
+# The in-memory backend only holds a lock for a dict update, so it's safe to call from the event loop.
+rate_limiter = RateLimiter(load_backend())
+_pool = None
+
+
+# --- Responses ---
+
+def json_response(body, status=200):
+    """Byte-for-byte the same JSON Teal_Backend's jsonify() produces (same encoder, see Teal_Responses)."""
+    return Response(dumps(body) + b"\n", status_code=status, media_type=JSON_MIMETYPE)
+
+
+def static_response(static):
+    """A Teal_Backend StaticJSON constant: its bytes were encoded once, at import."""
+    return Response(static.body, status_code=static.status, media_type=JSON_MIMETYPE)
+
+
+def invalid_tenant():
+    return static_response(INVALID_TENANT)
+
+
+def internal_error(where, e):
+    print(f"Error in {where}: {e}")
+    return static_response(INTERNAL_ERROR)
+
+
+async def read_json(request):
+    try:
+        data = loads(await request.body())
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def rate_limited(request, tenant_id=None, device_id=None, charge_ip=True):
+    """
+    Returns a 429 response if this client (IP, and device when given) is over its limit, else None.
+    charge_ip=False checks only the device bucket, for a request whose IP was already charged.
+    """
+    ip = client_ip(request.client.host if request.client else None,
+                   request.headers.get("x-forwarded-for")) if charge_ip else None
+    limited = rate_limiter.check(ip, tenant_id, device_id if isinstance(device_id, str) else None)
+    if limited is None:
+        return None
+    response = json_response({"success": False, "message": "Too many requests. Please retry later."}, 429)
+    response.headers["Retry-After"] = str(math.ceil(limited[1]))
+    return response
+
+
+# --- Database ---
+
+async def load_latest_version():
+    row = await _pool.fetchrow("SELECT version_number, download_url FROM versions WHERE is_latest = TRUE LIMIT 1;",
+                               timeout=ASYNC_DB_QUERY_TIMEOUT)
+    if not row:
+        return None
+    body = {"latest_version": row["version_number"], "download_url": row["download_url"]}
+    etag = hashlib.sha1(f'{body["latest_version"]}\n{body["download_url"]}'.encode("utf-8")).hexdigest()
+    return body, etag
+
+
+async def load_tenant_keys():
+    rows = await _pool.fetch("SELECT license_key, tenant_id FROM tenants;", timeout=ASYNC_DB_QUERY_TIMEOUT)
+    return {row['license_key']: row['tenant_id'] for row in rows}
+
+
+async def load_license_status(tenant_id, device_id):
+    return await _pool.fetchval("SELECT status FROM licenses WHERE tenant_id = $1 AND device_id = $2;",
+                                tenant_id, device_id, timeout=ASYNC_DB_QUERY_TIMEOUT)
+
+
+async def load_license_statuses(tenant_id, device_ids):
+    rows = await _pool.fetch(
+        "SELECT device_id, status FROM licenses WHERE tenant_id = $1 AND device_id = ANY($2::text[]);",
+        tenant_id, list(device_ids), timeout=ASYNC_DB_QUERY_TIMEOUT)
+    return {row['device_id']: row['status'] for row in rows}
+
+
+async def flush_last_seen():
+    """Same write as PostgresLicenseRepository.touch_devices: one statement for every buffered heartbeat."""
+    entries = last_seen_buffer.drain()
+    if not entries:
+        return
+    tenant_ids, device_ids, seen = (list(column) for column in zip(*entries))
+    try:
+        await _pool.execute(
+            """WITH seen AS (
+                   SELECT l.tenant_id, l.device_id, to_timestamp(s.seen_at) AS seen_at
+                   FROM unnest($1::text[], $2::text[], $3::float8[]) AS s (tenant_id, device_id, seen_at)
+                   JOIN licenses l ON l.tenant_id = s.tenant_id AND l.device_id = s.device_id
+                   WHERE l.last_seen IS NULL OR l.last_seen < to_timestamp(s.seen_at - $4)
+                   ORDER BY l.tenant_id, l.device_id
+                   FOR NO KEY UPDATE OF l SKIP LOCKED)
+               UPDATE licenses l SET last_seen = seen.seen_at FROM seen
+               WHERE l.tenant_id = seen.tenant_id AND l.device_id = seen.device_id;""",
+            tenant_ids, device_ids, seen, LAST_SEEN_RESOLUTION, timeout=ASYNC_DB_QUERY_TIMEOUT)
+    except Exception:
+        last_seen_buffer.restore(entries)
+        raise
+    last_seen_buffer.mark_flushed(len(entries))
+
+
+async def flush_audit_events():
+    """Same write as PostgresLicenseRepository.record_events, a batch per COPY until the queue is empty."""
+    while True:
+        events = audit_queue.take(AUDIT_FLUSH_BATCH_SIZE)
+        if not events:
+            return
+        times = [event[0] for event in events]
+        try:
+            async with _pool.acquire() as conn, conn.transaction():
+                await conn.execute("SELECT teal_ensure_license_event_partitions(to_timestamp($1), to_timestamp($2));",
+                                   min(times), max(times), timeout=ASYNC_DB_QUERY_TIMEOUT)
+                await conn.copy_records_to_table(
+                    "license_events", columns=EVENT_COLUMNS, timeout=ASYNC_DB_QUERY_TIMEOUT,
+                    records=[(datetime.fromtimestamp(occurred_at, timezone.utc), tenant_id, device_id, event)
+                             for occurred_at, tenant_id, device_id, event in events])
+        except Exception:
+            audit_queue.requeue(events)
+            raise
+        audit_queue.mark_written(len(events))
+        if len(events) < AUDIT_FLUSH_BATCH_SIZE:
+            return
+
+
+async def run_periodically(name, task, wake, interval):
+    """asyncio counterpart of Teal_Reclaim.BackgroundTask: awaits task() every interval seconds, or when `wake` is set."""
+    while True:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(wake.wait(), interval)
+        wake.clear()
+        try:
+            await task()
+        except Exception as e:
+            print(f"Error in {name}: {e}")
+
+
+def record_heartbeats(tenant_id, device_ids):
+    full = False
+    for device_id in device_ids:
+        full = last_seen_buffer.record(tenant_id, device_id) or full
+    if full:
+        _last_seen_full.set()
+    if AUDIT_EVENTS_ENABLED:
+        batch_ready = False
+        for device_id in device_ids:
+            batch_ready = audit_queue.heartbeat(tenant_id, device_id) or batch_ready
+        if batch_ready:
+            _audit_batch_ready.set()
+
+
+def record_audit_event(tenant_id, device_id, event):
+    if AUDIT_EVENTS_ENABLED and audit_queue.put(tenant_id, device_id, event):
+        _audit_batch_ready.set()
+
+
+async def listen_for_invalidations(db_url):
+    """asyncpg counterpart of Teal_Cache.InvalidationListener: drop cached entries when any worker commits a change."""
+    first_connect = True
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(db_url)
+            closed = asyncio.get_running_loop().create_future()
+            conn.add_termination_listener(lambda c: closed.done() or closed.set_result(None))
+            await conn.add_listener(APP_VERSION_CHANNEL, lambda *args: app_version_cache.invalidate())
+            await conn.add_listener(LICENSE_CHANNEL,
+                                    lambda c, pid, channel, payload: license_status_cache.invalidate(payload or None))
+            await conn.add_listener(TENANT_CHANNEL, lambda *args: tenant_key_cache.invalidate())
+            if not first_connect:
+                # Notifications sent while we were disconnected are lost.
+                app_version_cache.invalidate()
+                license_status_cache.invalidate()
+                tenant_key_cache.invalidate()
+            first_connect = False
+            await closed
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener disconnected: {e}")
+            first_connect = False
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        await asyncio.sleep(LISTENER_RECONNECT_DELAY)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global _pool, _last_seen_full, _audit_batch_ready
+    db_url = os.environ.get('DATABASE_URL')
+    if not db_url:
+        raise ValueError("FATAL ERROR: DATABASE_URL environment variable is not set.")
+    _pool = await asyncpg.create_pool(db_url, min_size=ASYNC_DB_POOL_MIN_SIZE, max_size=ASYNC_DB_POOL_MAX_SIZE)
+    listener = asyncio.create_task(listen_for_invalidations(db_url)) if CACHE_LISTEN_ENABLED else None
+    _last_seen_full, _audit_batch_ready = asyncio.Event(), asyncio.Event()
+    flushers = [
+        asyncio.create_task(run_periodically("last-seen-flusher", flush_last_seen, _last_seen_full,
+                                             LAST_SEEN_FLUSH_INTERVAL)),
+        asyncio.create_task(run_periodically("audit-event-flusher", flush_audit_events, _audit_batch_ready,
+                                             AUDIT_FLUSH_INTERVAL)),
+    ]
+    try:
+        yield
+    finally:
+        for task in [listener] + flushers:
+            if task is not None:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        for name, flush in (("last_seen", flush_last_seen), ("audit events", flush_audit_events)):
+            try:
+                await flush()
+            except Exception as e:
+                print(f"Error flushing {name} on shutdown: {e}")
+        await _pool.close()
+
+
+# --- Public API Endpoints ---
+
+async def health_check(request):
+    """Simple health check endpoint."""
+    return static_response(HEALTH_OK)
+
+
+async def get_app_version(request):
+    """Provides the latest version info for the client, served from the per-worker cache."""
+    try:
+        latest_version = await app_version_cache.aget(load_latest_version)
+        if not latest_version:
+            return json_response({"success": False, "message": "No latest version configured."}, 404)
+
+        body, etag = latest_version
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            response = Response(status_code=304)
+        else:
+            response = json_response(body)
+        response.headers["ETag"] = f'"{etag}"'
+        response.headers["Cache-Control"] = f"public, max-age={APP_VERSION_CLIENT_MAX_AGE}"
+        return response
+    except Exception as e:
+        return internal_error("get_app_version", e)
+
+
+async def activate_license(request):
+    data = await read_json(request)
+    if data is None:
+        return static_response(MISSING_DATA)
+    license_key = data.get('license_key')
+    device_id = data.get('device_id')
+    username = data.get('username')
+    hostname = data.get('hostname')
+
+    if not all([license_key, device_id, username, hostname]):
+        return static_response(MISSING_DATA)
+    # The IP bucket is charged before the key lookup below (a query when the key map isn't cached).
+    throttled = rate_limited(request)
+    if throttled is not None:
+        return throttled
+
+    try:
+        # The key picks the tenant (license pool) the device joins, and so the device's rate limit bucket.
+        tenant_id = (await tenant_key_cache.aget(load_tenant_keys)).get(license_key) \
+            if isinstance(license_key, str) else None
+        throttled = rate_limited(request, tenant_id, device_id, charge_ip=False)
+        if throttled is not None:
+            return throttled
+        if tenant_id is None:
+            return static_response(INVALID_LICENSE_KEY)
+        activation = await _pool.fetchrow(
+            "SELECT result, licenses_remaining FROM teal_activate_device($1, $2, $3, $4);",
+            tenant_id, device_id, username, hostname, timeout=ASYNC_DB_QUERY_TIMEOUT)
+        result = activation['result']
+        if result in ACTIVATION_EVENTS:
+            record_audit_event(tenant_id, device_id, ACTIVATION_EVENTS[result])
+
+        if result == 'unknown_tenant':
+            return static_response(INVALID_LICENSE_KEY)
+        if result == 'already_active':
+            return json_response({"success": True, "message": "License already active on this device",
+                                  "tenant_id": tenant_id, **issue_license_token(device_id, tenant_id=tenant_id)})
+        if result == 'no_seats':
+            return static_response(ALL_LICENSES_IN_USE)
+
+        license_status_cache.invalidate(tenant_device_key(tenant_id, device_id))
+        message = "License activated successfully!" if result == 'activated' else "License reactivated successfully!"
+        return json_response({
+            "success": True, "message": message, "tenant_id": tenant_id,
+            "licenses_remaining": activation['licenses_remaining'],
+            **issue_license_token(device_id, tenant_id=tenant_id)
+        })
+    except Exception as e:
+        return internal_error("activate_license", e)
+
+
+async def check_license(request):
+    data = await read_json(request)
+    device_id = data.get('device_id') if data else None
+    if not device_id:
+        return static_response(MISSING_DEVICE_ID)
+    tenant_id = requested_tenant(data)
+    if tenant_id is None:
+        return invalid_tenant()
+    throttled = rate_limited(request, tenant_id, device_id)
+    if throttled is not None:
+        return throttled
+
+    try:
+        status = await license_status_cache.aget(tenant_device_key(tenant_id, device_id),
+                                                 lambda: load_license_status(tenant_id, device_id))
+        if status is not None:
+            record_heartbeats(tenant_id, [device_id])
+
+        if status == 'active':
+            token = issue_license_token(device_id, tenant_id=tenant_id)
+            if not token:
+                return static_response(LICENSE_ACTIVE)
+            return json_response({"success": True, "message": "License active", **token})
+        elif status is not None:
+            return static_response(LICENSE_DEACTIVATED)
+        else:
+            return static_response(LICENSE_NOT_FOUND)
+    except Exception as e:
+        return internal_error("check_license", e)
+
+
+async def check_licenses(request):
+    data = await read_json(request)
+    device_ids = data.get('device_ids') if data else None
+    if not isinstance(device_ids, list) or not device_ids or not all(isinstance(d, str) and d for d in device_ids):
+        return json_response({"success": False, "message": "device_ids must be a non-empty list of device IDs"}, 400)
+    if len(device_ids) > CHECK_LICENSE_BATCH_MAX:
+        return json_response({"success": False, "message": f"At most {CHECK_LICENSE_BATCH_MAX} devices per request"}, 400)
+    tenant_id = requested_tenant(data)
+    if tenant_id is None:
+        return invalid_tenant()
+    throttled = rate_limited(request)
+    if throttled is not None:
+        return throttled
+
+    try:
+        prefix = len(tenant_device_key(tenant_id, ""))
+
+        async def load(keys):
+            known = await load_license_statuses(tenant_id, [key[prefix:] for key in keys])
+            return {tenant_device_key(tenant_id, device_id): status for device_id, status in known.items()}
+
+        cached = await license_status_cache.aget_many(
+            [tenant_device_key(tenant_id, d) for d in dict.fromkeys(device_ids)], load)
+        statuses = {key[prefix:]: status for key, status in cached.items()}
+        record_heartbeats(tenant_id, [device_id for device_id, status in statuses.items() if status is not None])
+        return json_response({
+            "success": True,
+            "statuses": {device_id: batch_status_label(status) for device_id, status in statuses.items()}
+        })
+    except Exception as e:
+        return internal_error("check_licenses", e)
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/app_version', get_app_version, methods=['GET']),
+        Route('/activate_license', activate_license, methods=['POST']),
+        Route('/check_license', check_license, methods=['POST']),
+        Route('/check_licenses', check_licenses, methods=['POST']),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,183 @@
+"""
+Streaming adapters between HTTP bodies and Postgres COPY, used by the admin import/export endpoints.
+
+Nothing here holds more than a chunk of the file in memory: imports hand COPY FROM STDIN a
+file-like object that reads the request body as COPY asks for it, and exports run COPY TO STDOUT
+on a helper thread that feeds a bounded queue the response generator drains.
+"""
+import io
+import csv
+import json
+import queue
+import threading
+
+IMPORT_COLUMNS = ("device_id", "username", "hostname", "status")
+REQUIRED_IMPORT_COLUMNS = ("device_id", "username")
+# COPY's CSV mode with quote/delimiter bytes that never occur in JSON text, so one JSON document per
+# line passes through untouched (COPY's text format would mangle backslashes).
+JSON_LINES_COPY_OPTIONS = "FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02'"
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def read_csv_header(stream):
+    """Reads and checks the header line of an uploaded CSV; returns its column names in order."""
+    line = stream.readline().decode("utf-8-sig").strip()
+    columns = [c.strip().lower() for c in next(csv.reader([line]), [])]
+    unknown = [c for c in columns if c not in IMPORT_COLUMNS]
+    if unknown:
+        raise ImportFormatError(f"Unknown column(s) in CSV header: {', '.join(unknown)}")
+    missing = [c for c in REQUIRED_IMPORT_COLUMNS if c not in columns]
+    if missing:
+        raise ImportFormatError(f"CSV header is missing: {', '.join(missing)}")
+    if len(set(columns)) != len(columns):
+        raise ImportFormatError("CSV header has duplicate columns")
+    return columns
+
+
+class NDJSONToCSV(io.RawIOBase):
+    """
+    Read-only file object that converts an NDJSON byte stream to CSV rows of
+    (line, device_id, username, hostname, status) as COPY reads it. A malformed line stops the
+    COPY; the reason is kept in `error` so the caller can report it instead of the COPY failure.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.error = None
+        self._line_no = 0
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def _next_rows(self):
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        while out.tell() < 65536:
+            raw = self.stream.readline()
+            if not raw:
+                break
+            self._line_no += 1
+            if not raw.strip():
+                continue
+            try:
+                doc = json.loads(raw)
+                if not isinstance(doc, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                self.error = f"Line {self._line_no}: invalid JSON ({e})"
+                raise ImportFormatError(self.error)
+            # Missing or null fields become empty CSV fields, i.e. NULL.
+            writer.writerow([self._line_no] + ["" if doc.get(c) is None else str(doc[c]) for c in IMPORT_COLUMNS])
+        return out.getvalue().encode("utf-8")
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = self._next_rows()
+            if not chunk:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class _QueueWriter:
+    """
+    File object for COPY TO: writes (one per row) are gathered into chunks of about chunk_size bytes,
+    each handed to the consumer through a bounded queue.
+    """
+
+    def __init__(self, chunks, cancelled, chunk_size=65536):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.chunk_size = chunk_size
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        data = b"".join(self._buffer)
+        self._buffer, self._buffered = [], 0
+        while True:
+            if self.cancelled.is_set():
+                raise IOError("export cancelled by client")
+            try:
+                self.chunks.put(data, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+
+def stream_copy_out(get_conn, release_conn, copy_sql, params=None, max_chunks=64, liveness_interval=5.0):
+    """
+    Generator of the bytes `COPY (...) TO STDOUT` produces. COPY runs on a helper thread with its own
+    pooled connection; the bounded queue (of ~64 KiB chunks) applies backpressure, so a slow client pauses the COPY instead
+    of buffering the table. Closing the generator (client went away) aborts the COPY.
+
+    Any failure (including borrowing the connection) is re-raised from the generator: before the first chunk
+    the caller can still answer with an error, later it cuts the response short.
+    """
+    chunks, cancelled = queue.Queue(max_chunks), threading.Event()
+    done = object()
+
+    def run():
+        # The last item queued is `done` or the exception that ended the COPY.
+        outcome, conn = RuntimeError("COPY export thread exited unexpectedly"), None
+        try:
+            conn = get_conn()
+            cur = conn.cursor()
+            sql = cur.mogrify(copy_sql, params).decode("utf-8") if params else copy_sql
+            writer = _QueueWriter(chunks, cancelled)
+            cur.copy_expert(sql, writer)
+            writer.flush()
+            cur.close()
+            conn.rollback()
+            outcome = done
+        except BaseException as e:
+            outcome = e
+        finally:
+            if conn is not None:
+                release_conn(conn)
+            while not cancelled.is_set():
+                try:
+                    chunks.put(outcome, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+
+    thread = threading.Thread(target=run, name="copy-export", daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                chunk = chunks.get(timeout=liveness_interval)
+            except queue.Empty:
+                # Backstop: never wait on a thread that can no longer queue anything.
+                if not thread.is_alive() and chunks.empty():
+                    raise RuntimeError("COPY export thread exited without finishing")
+                continue
+            if chunk is done:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+    finally:
+        cancelled.set()
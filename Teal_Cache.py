@@ -0,0 +1,364 @@
+import os
+import time
+import select
+import asyncio
+import threading
+from collections import OrderedDict
+import psycopg2
+import psycopg2.extensions
+
+
+class VersionedValueCache:
+    """
+    Caches a single loaded value for `ttl` seconds.
+
+    Every invalidation bumps a generation counter; a load that started before an
+    invalidation is returned to its caller but never stored, so a stale read can't
+    overwrite a newer invalidation.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._entry = None  # (value, expires_at)
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _lookup(self):
+        """Returns (hit, value, generation)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[1] > now:
+                self._stats["hits"] += 1
+                return True, entry[0], self._generation
+            self._stats["misses"] += 1
+            return False, None, self._generation
+
+    def _store(self, value, generation):
+        with self._lock:
+            if self._generation == generation:
+                self._entry = (value, time.monotonic() + self.ttl)
+
+    def get(self, loader):
+        hit, value, generation = self._lookup()
+        if not hit:
+            value = loader()
+            self._store(value, generation)
+        return value
+
+    async def aget(self, loader):
+        """Same as get() for an async loader (used by the ASGI app)."""
+        hit, value, generation = self._lookup()
+        if not hit:
+            value = await loader()
+            self._store(value, generation)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            self._entry = None
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = (snapshot["hits"] / lookups) if lookups else 0.0
+        return snapshot
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _interrupted(key, e):
+    return RuntimeError(f"Shared load for {key!r} was interrupted ({type(e).__name__})")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the function and every
+    caller that arrives while it's running waits for, and gets, the same result (or exception).
+    If the first caller is interrupted by something that isn't an Exception (KeyboardInterrupt,
+    a gevent Timeout), that belongs to its own thread; the others get a RuntimeError instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._async_flights = {}  # key -> asyncio.Future, for callers on the event loop
+        self._stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["calls"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fn()
+            return flight.value
+        except BaseException as e:
+            flight.error = e if isinstance(e, Exception) else _interrupted(key, e)
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def ado(self, key, fn):
+        """Same as do() for a coroutine function; callers must share one event loop."""
+        future = self._async_flights.get(key)
+        if future is not None:
+            with self._lock:
+                self._stats["coalesced"] += 1
+            # shield: one waiter being cancelled mustn't cancel the load for the others.
+            return await asyncio.shield(future)
+        future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._stats["calls"] += 1
+        try:
+            value = await fn()
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else _interrupted(key, e))
+            future.exception()  # mark retrieved so an unawaited failure isn't logged
+            raise
+        finally:
+            del self._async_flights[key]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+class LRUTTLCache:
+    """
+    A bounded, thread-safe LRU cache whose entries also expire after a TTL.
+
+    `None` is a legitimate cached value (e.g. "not found"), and may be given its own,
+    usually shorter, `negative_ttl`. As with VersionedValueCache, loads that race an
+    invalidation are not stored.
+
+    Concurrent misses on the same key share one load. Flights are keyed by generation too,
+    so a lookup that starts after an invalidation never joins a load that began before it.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_entries, ttl, negative_ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._generation = 0
+        self._flights = SingleFlight()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _lookup(self, key):
+        """Returns (hit, value, generation)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is not self._MISSING:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return True, entry[0], self._generation
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return False, None, self._generation
+
+    def _store(self, key, value, generation):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            if self._generation == generation:
+                self._entries[key] = (value, time.monotonic() + ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+
+    def get(self, key, loader):
+        hit, value, generation = self._lookup(key)
+        if hit:
+            return value
+
+        def load():
+            loaded = loader()
+            self._store(key, loaded, generation)
+            return loaded
+        return self._flights.do((key, generation), load)
+
+    async def aget(self, key, loader):
+        """Same as get() for an async loader (used by the ASGI app)."""
+        hit, value, generation = self._lookup(key)
+        if hit:
+            return value
+
+        async def load():
+            loaded = await loader()
+            self._store(key, loaded, generation)
+            return loaded
+        return await self._flights.ado((key, generation), load)
+
+    def _lookup_many(self, keys):
+        found, missing, generation = {}, [], None
+        for key in keys:
+            hit, value, generation = self._lookup(key)
+            if hit:
+                found[key] = value
+            else:
+                missing.append(key)
+        return found, missing, generation
+
+    def get_many(self, keys, loader):
+        """
+        Batch get: `loader(missing_keys)` is called once with every key not in the cache and
+        returns {key: value}; keys it leaves out are cached (and returned) as None.
+        """
+        found, missing, generation = self._lookup_many(keys)
+        if missing:
+            loaded = loader(missing)
+            for key in missing:
+                found[key] = loaded.get(key)
+                self._store(key, found[key], generation)
+        return found
+
+    async def aget_many(self, keys, loader):
+        """Same as get_many() for an async loader."""
+        found, missing, generation = self._lookup_many(keys)
+        if missing:
+            loaded = await loader(missing)
+            for key in missing:
+                found[key] = loaded.get(key)
+                self._store(key, found[key], generation)
+        return found
+
+    def invalidate(self, key=None):
+        """Drops one key, or everything when `key` is None."""
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+            snapshot["max_entries"] = self.max_entries
+        snapshot["coalesced_loads"] = self._flights.stats()["coalesced"]
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = (snapshot["hits"] / lookups) if lookups else 0.0
+        return snapshot
+
+
+class InvalidationListener:
+    """
+    Background LISTEN loop on a dedicated connection that dispatches Postgres
+    NOTIFY payloads to per-channel callbacks, so every worker process drops
+    its caches when another worker commits a change.
+
+    After a reconnect every callback is invoked with payload None, since
+    notifications sent while disconnected are lost.
+    """
+
+    def __init__(self, dsn, reconnect_delay=5.0, poll_interval=5.0):
+        self.dsn = dsn
+        self.reconnect_delay = reconnect_delay
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(callback)
+
+    def ensure_started(self):
+        """Starts the listener thread once per process (safe to call on every request)."""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="cache-invalidation-listener", daemon=True)
+            self._thread.start()
+
+    def _dispatch(self, channel, payload):
+        with self._lock:
+            callbacks = list(self._handlers.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"Error in cache invalidation handler for {channel}: {e}")
+
+    def _dispatch_all(self):
+        with self._lock:
+            channels = list(self._handlers)
+        for channel in channels:
+            self._dispatch(channel, None)
+
+    def _run(self):
+        first_connect = True
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cur = conn.cursor()
+                with self._lock:
+                    channels = list(self._handlers)
+                for channel in channels:
+                    cur.execute(f'LISTEN "{channel}";')
+                if not first_connect:
+                    self._dispatch_all()
+                first_connect = False
+
+                while True:
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._dispatch(notify.channel, notify.payload or None)
+            except Exception as e:
+                print(f"Cache invalidation listener disconnected: {e}")
+                first_connect = False
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            time.sleep(self.reconnect_delay)
+
+
+def notify(cur, channel, payload=""):
+    """Queues a NOTIFY on the caller's transaction; it is delivered only if the transaction commits."""
+    cur.execute("SELECT pg_notify(%s, %s);", (channel, payload))
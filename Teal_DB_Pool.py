@@ -0,0 +1,243 @@
+import os
+import time
+import threading
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be borrowed within the configured timeout."""
+
+
+class ManagedConnectionPool:
+    """
+    A blocking, thread-safe pool of psycopg2 connections.
+
+    - Keeps between `min_size` and `max_size` connections open.
+    - Callers wait (up to `timeout` seconds) when every connection is in use.
+    - Connections idle longer than `health_check_after` seconds are pinged on checkout,
+      and broken or over-aged connections are transparently replaced.
+    - The pool is reset in a forked child so Gunicorn workers never share sockets, and refilled to
+      `min_size` in the background (see prefill_in_background()).
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, timeout=10.0,
+                 health_check_after=30.0, max_lifetime=1800.0, connection_factory=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 0 <= min_size <= max_size and max_size >= 1.")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self.connection_factory = connection_factory
+
+        self._lock = threading.Condition(threading.Lock())
+        self._idle = []          # list of (conn, created_at, last_used_at)
+        self._in_use = {}        # id(conn) -> (conn, created_at)
+        self._orphaned = []      # connections inherited across fork()
+        self._pid = os.getpid()
+        self._reset_stats()
+
+    # --- Connection lifecycle ---
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=self.connection_factory)
+        self._count("connections_opened")
+        return conn
+
+    def _discard(self, conn):
+        self._count("connections_closed")
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, created_at, last_used_at, now):
+        if conn.closed:
+            return False
+        if now - created_at > self.max_lifetime:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if now - last_used_at > self.health_check_after:
+            self._count("health_checks")
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _count(self, stat):
+        """Bumps a counter in _stats (call without the lock held)."""
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _check_fork(self):
+        """
+        Drops connections inherited from a parent process (call with the lock held). Returns True if it
+        did, so the caller can refill the pool.
+        """
+        if os.getpid() == self._pid:
+            return False
+        # The sockets belong to the parent; closing them here (or letting them be garbage
+        # collected) would terminate the parent's sessions, so keep them referenced and unused.
+        self._orphaned.extend(conn for conn, _, _ in self._idle)
+        self._orphaned.extend(conn for conn, _ in self._in_use.values())
+        self._idle = []
+        self._in_use = {}
+        self._pid = os.getpid()
+        self._reset_stats()
+        return True
+
+    def _reset_stats(self):
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "health_checks": 0,
+            "reconnects": 0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+        }
+
+    # --- Public API ---
+
+    def getconn(self):
+        """Borrows a healthy connection, waiting for one to be returned if the pool is exhausted."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._lock:
+            forked = self._check_fork()
+            while not self._idle and len(self._in_use) >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection.")
+                waited = True
+                self._lock.wait(remaining)
+
+            entry = self._idle.pop() if self._idle else None
+            # Reserve the slot before releasing the lock so concurrent callers can't overshoot max_size.
+            placeholder = object()
+            self._in_use[id(placeholder)] = (placeholder, None)
+
+        try:
+            now = time.monotonic()
+            if entry is not None:
+                conn, created_at, last_used_at = entry
+                if not self._is_healthy(conn, created_at, last_used_at, now):
+                    self._discard(conn)
+                    self._count("reconnects")
+                    conn, created_at = self._connect(), time.monotonic()
+            else:
+                conn, created_at = self._connect(), now
+        except Exception:
+            with self._lock:
+                self._in_use.pop(id(placeholder), None)
+                self._lock.notify()
+            raise
+
+        wait_time = time.monotonic() - started
+        with self._lock:
+            self._in_use.pop(id(placeholder), None)
+            self._in_use[id(conn)] = (conn, created_at)
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["wait_time_total"] += wait_time
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+        if forked:
+            self.prefill_in_background()
+        return conn
+
+    def putconn(self, conn):
+        """Returns a borrowed connection, rolling back any open transaction first."""
+        with self._lock:
+            if os.getpid() != self._pid:
+                return
+            entry = self._in_use.pop(id(conn), None)
+
+        if entry is None:
+            # Not ours (e.g. borrowed before a fork); just drop it.
+            return
+
+        healthy = not conn.closed
+        if healthy and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                healthy = False
+        if healthy and conn.autocommit:
+            conn.autocommit = False
+
+        with self._lock:
+            if healthy and len(self._idle) + len(self._in_use) < self.max_size:
+                self._idle.append((conn, entry[1], time.monotonic()))
+                conn = None
+            self._lock.notify()
+        if conn is not None:
+            self._discard(conn)
+
+    def prefill(self):
+        """Opens connections up to `min_size` so the first requests don't pay the handshake."""
+        while True:
+            with self._lock:
+                self._check_fork()
+                if len(self._idle) + len(self._in_use) >= self.min_size:
+                    return
+                # Reserved like a checkout, so concurrent getconn() calls can't push the pool past its size.
+                placeholder = object()
+                self._in_use[id(placeholder)] = (placeholder, None)
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._in_use.pop(id(placeholder), None)
+                    self._lock.notify()
+                raise
+            with self._lock:
+                self._in_use.pop(id(placeholder), None)
+                now = time.monotonic()
+                self._idle.append((conn, now, now))
+                self._lock.notify()
+
+    def prefill_in_background(self):
+        """Runs prefill() on a daemon thread; a failure only means connections get opened on demand."""
+        if self.min_size == 0:
+            return
+
+        def run():
+            try:
+                self.prefill()
+            except Exception as e:
+                print(f"Could not prefill the database connection pool: {e}")
+
+        threading.Thread(target=run, name="db-pool-prefill", daemon=True).start()
+
+    def closeall(self):
+        """Closes every idle connection (e.g. on shutdown)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Returns a snapshot of pool usage for sizing and monitoring."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "wait_time_avg": (snapshot["wait_time_total"] / snapshot["checkouts"]) if snapshot["checkouts"] else 0.0,
+            })
+        return snapshot
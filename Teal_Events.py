@@ -0,0 +1,65 @@
+"""
+Fan-out of database change notifications to Server-Sent Event clients.
+
+Triggers on licenses, tenants and versions (migrations/0007_admin_event_triggers.up.sql, 0008_tenants)
+NOTIFY a JSON payload on one channel; each worker LISTENs once and an EventBroadcaster copies
+every payload to the queue of each connected /admin/events client, which keeps its own tenant's.
+"""
+import json
+import queue
+import threading
+
+
+class EventBroadcaster:
+    """
+    Thread-safe fan-out to bounded per-client queues. A client whose queue fills up (it stopped
+    reading) is sent a final "resync" and then dropped, so one slow consumer can't hold memory.
+    """
+
+    def __init__(self, max_clients, queue_size=1000):
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._clients = set()
+
+    def subscribe(self):
+        """Returns a new client queue, or None if max_clients are already connected."""
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            client = queue.Queue(self.queue_size)
+            self._clients.add(client)
+            return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def publish(self, event):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait(event)
+            except queue.Full:
+                self.unsubscribe(client)
+                # Make room for the resync so the client knows it missed events.
+                try:
+                    client.get_nowait()
+                except queue.Empty:
+                    pass
+                client.put_nowait(None)
+
+    def client_count(self):
+        with self._lock:
+            return len(self._clients)
+
+
+def format_sse(event, data, event_id=None):
+    """One text/event-stream message; `data` is JSON-encoded onto a single line."""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
@@ -1,12 +1,94 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import os
 import requests
 import json
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+log = logging.getLogger(__name__)
 
 # --- Configuration for the Admin GUI ---
 LICENSE_ADMIN_API_URL = "https://teal-timesheet-licensing-api.onrender.com"
 ADMIN_SECRET_KEY = "q/9^}H=W:HJ;%}t>$`YR$g1["  # <<-- IMPORTANT: Use your actual secret key
 DEFAULT_DOWNLOAD_URL = "https://www.peakpointenterprise.com/download-timesheet"
+# License pool this console manages; every device, seat and event call is scoped to it.
+ADMIN_TENANT_ID = "default"
+
+# --- Networking ---
+REQUEST_TIMEOUT = (5, 30)  # (connect, read) seconds
+NETWORK_WORKERS = 4
+# Bulk updates are sent in chunks so they can report progress and be cancelled between chunks.
+BULK_CHUNK_SIZE = 200
+BULK_FAILURES_SHOWN = 10  # per-device failures listed in the summary dialog; the rest are only logged
+RESULT_POLL_MS = 50
+# Imports and exports stream the file, so the read timeout only has to cover the server's slowest step.
+TRANSFER_TIMEOUT = (5, 300)
+
+# --- Device table ---
+# Rows are fetched a page at a time as the user scrolls; sorting and filtering are done by the server.
+DEVICE_PAGE_SIZE = 200
+SERVER_MAX_PAGE_SIZE = 5000  # VIEW_STATUS_MAX_PAGE_SIZE on the backend
+DEVICE_COLUMNS = ("device_id", "username", "hostname", "status", "activated_at")
+LOAD_MORE_THRESHOLD = 0.9  # fraction of the loaded rows scrolled past before the next page is requested
+# Live updates come from the /admin/events stream. While it's disconnected the console falls back to asking
+# /admin/license_changes this often whether anything changed (the table is only re-fetched if it did).
+CHANGE_POLL_MS = 15000
+CHANGE_POLL_MAX_BACKOFF_MS = 300000  # failed polls back off up to this; a backend without delta sync (501) stops them
+EVENT_STREAM_READ_TIMEOUT = 45  # the server sends a keepalive every 15s
+EVENT_STREAM_MAX_BACKOFF = 60
+DEVICE_REFRESH_DEBOUNCE_MS = 500
+
+
+def create_session():
+    """One keep-alive session for every call, retrying connection failures and transient 5xx/429 responses."""
+    session = requests.Session()
+    retry = Retry(total=3, connect=3, read=2, backoff_factor=0.5,
+                  status_forcelist=(429, 502, 503, 504), respect_retry_after_header=True)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=NETWORK_WORKERS, pool_maxsize=NETWORK_WORKERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def format_failures(failures, limit):
+    """One "device: reason" line per failure, up to `limit`, then a count of the rest."""
+    lines = [f"{device}: {message}" for device, message in failures[:limit]]
+    if len(failures) > limit:
+        lines.append(f"...and {len(failures) - limit} more (see the log).")
+    return "\n".join(lines)
+
+
+def parse_sse(lines):
+    """
+    Turns the lines of a text/event-stream response (requests' iter_lines(decode_unicode=True)) into
+    (event, data) tuples, with data JSON-decoded. Comment lines (the server's keepalives) are skipped.
+    """
+    event, data = "message", []
+    for line in lines:
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+
+
+class OperationCancelled(Exception):
+    pass
 
 
 class AdminGUI:
@@ -18,7 +100,81 @@ class AdminGUI:
         self.root.resizable(True, True)
 
         self.admin_key = None
+        # Network calls run on worker threads; their results are queued and applied on the Tk thread.
+        self.session = create_session()
+        self.executor = ThreadPoolExecutor(max_workers=NETWORK_WORKERS, thread_name_prefix="admin-api")
+        self._results = queue.Queue()
+        self._refresh_seq = {"licenses": 0, "devices": 0, "versions": 0}
+        self._bulk_cancel = None
+        # Device table state: what's loaded, how it's sorted/filtered, and where the next page starts.
+        self._device_rows = {}  # device_id (also the Treeview iid) -> displayed values
+        self._device_sort = ("device_id", "asc")
+        self._device_query = {}
+        self._next_cursor = None
+        self._devices_loading = False
+        self._changes_since = None  # /admin/license_changes cursor
+        self._change_poll_delay = CHANGE_POLL_MS
+        self._stream_connected = False
+        self._event_response = None
+        self._device_refresh_pending = False
+        self._closing = threading.Event()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
         self._create_login_ui()
+        self.root.after(RESULT_POLL_MS, self._poll_results)
+
+    # --- Background work ---
+
+    def _run_in_background(self, work, on_success, on_error=None):
+        """Runs `work()` on the thread pool, then `on_success(result)` or `on_error(exc)` on the Tk thread."""
+        def task():
+            try:
+                self._results.put((on_success, work()))
+            except Exception as e:
+                self._results.put((on_error or self._show_network_error, e))
+        self.executor.submit(task)
+
+    def _poll_results(self):
+        try:
+            while True:
+                callback, value = self._results.get_nowait()
+                try:
+                    callback(value)
+                except Exception as e:
+                    messagebox.showerror("Error", f"An unexpected error occurred: {e}", parent=self.root)
+        except queue.Empty:
+            pass
+        self.root.after(RESULT_POLL_MS, self._poll_results)
+
+    def _show_network_error(self, e):
+        if isinstance(e, requests.exceptions.RequestException):
+            messagebox.showerror("Connection Error", f"Could not connect to the backend: {e}", parent=self.root)
+        else:
+            messagebox.showerror("Error", f"An unexpected error occurred: {e}", parent=self.root)
+
+    def _auth(self, params):
+        return dict(params, admin_key=self.admin_key, tenant_id=ADMIN_TENANT_ID)
+
+    def _api_get(self, path, **params):
+        response = self.session.get(f"{LICENSE_ADMIN_API_URL}{path}", params=self._auth(params),
+                                    timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def _api_post(self, path, payload):
+        response = self.session.post(f"{LICENSE_ADMIN_API_URL}{path}", json=self._auth(payload),
+                                     timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def _on_close(self):
+        self._closing.set()
+        if self._event_response is not None:
+            self._event_response.close()
+        if self._bulk_cancel is not None:
+            self._bulk_cancel.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+        self.root.destroy()
 
     def _create_login_ui(self):
         """Creates the initial login interface for the admin."""
@@ -42,8 +198,10 @@ class AdminGUI:
             self.admin_key = entered_key
             self.login_frame.destroy()
             self._create_main_admin_ui()
-            self.refresh_license_status()  # Refresh both on login
+            self.refresh_license_status()  # Both refreshes run concurrently on the worker pool
             self.refresh_version_status()
+            self._start_event_stream()
+            self._poll_license_changes()
         else:
             messagebox.showerror("Login Failed", "Incorrect Admin Secret Key.", parent=self.root)
             self.admin_key_entry.delete(0, tk.END)
@@ -84,21 +242,43 @@ class AdminGUI:
         self.new_total_entry.pack(side="left", padx=5)
         ttk.Button(set_licenses_frame, text="Set", command=self._set_total_licenses).pack(side="left", padx=5)
 
+        # Device filters (applied server-side)
+        filter_frame = ttk.Frame(parent_frame)
+        filter_frame.pack(pady=(10, 0), fill="x")
+        ttk.Label(filter_frame, text="Status:").pack(side="left", padx=5)
+        self.status_filter = ttk.Combobox(filter_frame, values=("All", "active", "inactive"), state="readonly", width=10)
+        self.status_filter.set("All")
+        self.status_filter.pack(side="left", padx=5)
+        self.status_filter.bind("<<ComboboxSelected>>", lambda event: self._apply_device_filters())
+        ttk.Label(filter_frame, text="Username:").pack(side="left", padx=5)
+        self.username_filter_entry = ttk.Entry(filter_frame, width=15)
+        self.username_filter_entry.pack(side="left", padx=5)
+        ttk.Label(filter_frame, text="Hostname:").pack(side="left", padx=5)
+        self.hostname_filter_entry = ttk.Entry(filter_frame, width=15)
+        self.hostname_filter_entry.pack(side="left", padx=5)
+        for entry in (self.username_filter_entry, self.hostname_filter_entry):
+            entry.bind("<Return>", lambda event: self._apply_device_filters())
+        ttk.Button(filter_frame, text="Filter", command=self._apply_device_filters).pack(side="left", padx=5)
+
         # Activated Devices List
         devices_frame = ttk.LabelFrame(parent_frame, text="Activated/Inactive Devices", padding="10")
         devices_frame.pack(pady=10, fill="both", expand=True)
-        columns = ("device_id", "username", "hostname", "status", "activated_at")
-        self.devices_tree = ttk.Treeview(devices_frame, columns=columns, show="headings", selectmode="extended")
+        self.devices_tree = ttk.Treeview(devices_frame, columns=DEVICE_COLUMNS, show="headings", selectmode="extended")
 
-        for col_name in columns: self.devices_tree.heading(col_name, text=col_name.replace("_", " ").title())
+        for col_name in DEVICE_COLUMNS:
+            self.devices_tree.heading(col_name, text=col_name.replace("_", " ").title(),
+                                      command=lambda c=col_name: self._sort_devices_by(c))
         for col_name, width in [("device_id", 150), ("username", 100), ("hostname", 100), ("status", 80),
                                 ("activated_at", 150)]:
             self.devices_tree.column(col_name, width=width, stretch=tk.YES if col_name != "status" else tk.NO)
+        self._update_sort_headings()
 
         self.devices_tree.pack(side="left", fill="both", expand=True)
-        tree_scrollbar = ttk.Scrollbar(devices_frame, command=self.devices_tree.yview)
-        tree_scrollbar.pack(side="right", fill="y")
-        self.devices_tree.config(yscrollcommand=tree_scrollbar.set)
+        self.tree_scrollbar = ttk.Scrollbar(devices_frame, command=self.devices_tree.yview)
+        self.tree_scrollbar.pack(side="right", fill="y")
+        self.devices_tree.config(yscrollcommand=self._on_devices_scrolled)
+        self.devices_count_label = ttk.Label(parent_frame, text="")
+        self.devices_count_label.pack(anchor="w", padx=5)
 
         # Action Buttons
         action_buttons_frame = ttk.Frame(parent_frame)
@@ -110,6 +290,21 @@ class AdminGUI:
         ttk.Button(action_buttons_frame, text="Refresh Licenses", command=self.refresh_license_status).pack(side="left",
                                                                                                             expand=True,
                                                                                                             padx=5)
+        ttk.Button(action_buttons_frame, text="Import Devices...", command=self._import_devices).pack(side="left",
+                                                                                                      expand=True,
+                                                                                                      padx=5)
+        ttk.Button(action_buttons_frame, text="Export Devices...", command=self._export_devices).pack(side="left",
+                                                                                                      expand=True,
+                                                                                                      padx=5)
+
+        # Progress of bulk operations (hidden while idle)
+        self.progress_frame = ttk.Frame(parent_frame)
+        self.progress_label = ttk.Label(self.progress_frame, text="")
+        self.progress_label.pack(side="left", padx=5)
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="determinate")
+        self.progress_bar.pack(side="left", fill="x", expand=True, padx=5)
+        self.cancel_button = ttk.Button(self.progress_frame, text="Cancel", command=self._cancel_bulk_operation)
+        self.cancel_button.pack(side="left", padx=5)
 
     def _create_version_management_tab(self, parent_frame):
         """Populates the new version management tab."""
@@ -158,110 +353,506 @@ class AdminGUI:
                                                                                                         padx=5)
 
     def refresh_license_status(self):
-        """Fetches and updates license status from the backend."""
-        try:
-            response = requests.get(f"{LICENSE_ADMIN_API_URL}/admin/view_status?admin_key={self.admin_key}")
-            response.raise_for_status()
-            status_data = response.json()
-            self.total_licenses_label.config(text=f"Total Licenses: {status_data['total_licenses']}")
-            self.activated_count_label.config(text=f"Activated Count: {status_data['activated_count']}")
-            self.licenses_remaining_label.config(text=f"Licenses Remaining: {status_data['licenses_remaining']}")
-
-            for i in self.devices_tree.get_children(): self.devices_tree.delete(i)
-            if status_data.get("activated_devices"):
-                for device_id, info in status_data["activated_devices"].items():
-                    self.devices_tree.insert("", "end", values=(
-                    device_id, info.get("username", "N/A"), info.get("hostname", "N/A"), info.get("status", "N/A"),
-                    info.get("activated_at", "N/A")))
+        """Refreshes the seat summary and re-fetches the loaded device rows, updating only what changed."""
+        self._refresh_seq["licenses"] += 1
+        seq = self._refresh_seq["licenses"]
+        self.licenses_remaining_label.config(text="Licenses Remaining: loading...")
+        self._run_in_background(lambda: self._api_get("/admin/license_summary"),
+                                lambda summary: self._show_license_summary(seq, summary),
+                                lambda e: self._license_refresh_failed(seq, e))
+        self._reload_devices(keep_loaded=True)
+
+    def _show_license_summary(self, seq, summary):
+        if seq != self._refresh_seq["licenses"]:
+            return  # a newer refresh is on its way
+        self.total_licenses_label.config(text=f"Total Licenses: {summary['total_licenses']}")
+        self.activated_count_label.config(text=f"Activated Count: {summary['activated_count']}")
+        self.licenses_remaining_label.config(text=f"Licenses Remaining: {summary['licenses_remaining']}")
+
+    def _license_refresh_failed(self, seq, e):
+        if seq != self._refresh_seq["licenses"]:
+            return
+        self.licenses_remaining_label.config(text="Licenses Remaining: N/A")
+        self._show_network_error(e)
+
+    def _poll_license_changes(self):
+        """While the event stream is down, periodically asks whether any device changed and refreshes if one did."""
+        if self._stream_connected:
+            self.root.after(CHANGE_POLL_MS, self._poll_license_changes)
+            return
+        since = self._changes_since or "now"
+
+        def work():
+            changed, cursor = 0, since
+            while True:
+                page = self._api_get("/admin/license_changes", since=cursor, limit=1000)
+                changed += len(page["changes"])
+                cursor = page["next_since"]
+                if not page["has_more"]:
+                    return changed, cursor
+
+        def done(result):
+            changed, self._changes_since = result
+            self._change_poll_delay = CHANGE_POLL_MS
+            if changed and since != "now":
+                self.refresh_license_status()
+            self.root.after(CHANGE_POLL_MS, self._poll_license_changes)
+
+        def failed(e):
+            response = getattr(e, "response", None)
+            if response is not None and response.status_code == 501:
+                # Delta sync needs the Postgres backend; asking again won't help.
+                log.info("Backend has no /admin/license_changes; polling for license changes stopped.")
+                return
+            self._change_poll_delay = min(self._change_poll_delay * 2, CHANGE_POLL_MAX_BACKOFF_MS)
+            log.warning("Polling for license changes failed, retrying in %ds: %s", self._change_poll_delay // 1000, e)
+            self.root.after(self._change_poll_delay, self._poll_license_changes)
+
+        self._run_in_background(work, done, failed)
+
+    # --- Live updates (/admin/events) ---
+
+    def _start_event_stream(self):
+        threading.Thread(target=self._event_stream_loop, name="admin-events", daemon=True).start()
+
+    def _event_stream_loop(self):
+        """Dedicated thread: holds the SSE connection open, reconnecting with backoff, and queues each event."""
+        backoff, connected_before = 1, False
+        while not self._closing.is_set():
+            try:
+                with self.session.get(f"{LICENSE_ADMIN_API_URL}/admin/events", params=self._auth({}),
+                                      stream=True, timeout=(REQUEST_TIMEOUT[0], EVENT_STREAM_READ_TIMEOUT)) as response:
+                    response.raise_for_status()
+                    self._event_response = response
+                    self._results.put((self._event_stream_connected, connected_before))
+                    connected_before, backoff = True, 1
+                    for event in parse_sse(response.iter_lines(decode_unicode=True)):
+                        self._results.put((self._apply_admin_event, event))
+            except Exception as e:
+                if self._closing.is_set():
+                    return
+                log.warning("Admin event stream disconnected, reconnecting in %ds: %s", backoff, e)
+                self._results.put((self._event_stream_disconnected, None))
+                self._closing.wait(backoff)
+                backoff = min(backoff * 2, EVENT_STREAM_MAX_BACKOFF)
+                continue
+            finally:
+                self._event_response = None
+            # The server closes streams periodically; reconnect straight away.
+            self._results.put((self._event_stream_disconnected, None))
+
+    def _event_stream_connected(self, reconnect):
+        self._stream_connected = True
+        if reconnect:
+            self.refresh_license_status()  # catch up on anything sent while disconnected
+
+    def _event_stream_disconnected(self, _):
+        self._stream_connected = False
+
+    def _apply_admin_event(self, event):
+        kind, data = event
+        if kind == "seats":
+            self.total_licenses_label.config(text=f"Total Licenses: {data['total_licenses']}")
+            self.activated_count_label.config(text=f"Activated Count: {data['activated_count']}")
+            self.licenses_remaining_label.config(text=f"Licenses Remaining: {data['licenses_remaining']}")
+        elif kind == "device":
+            self._apply_device_event(data)
+        elif kind == "versions":
+            self.refresh_version_status()
+        elif kind == "resync":
+            self.refresh_license_status()
+            self.refresh_version_status()
+
+    def _apply_device_event(self, device):
+        """Updates a loaded row in place; anything that changes which rows are shown, or their order, re-fetches."""
+        device_id = device["device_id"]
+        values = tuple("N/A" if device.get(col) is None else device[col] for col in DEVICE_COLUMNS)
+        shown = self._device_rows.get(device_id)
+        if not self._matches_device_filters(device):
+            if shown is not None:
+                self.devices_tree.delete(device_id)
+                del self._device_rows[device_id]
+            return
+        if shown is None:
+            self._schedule_device_refresh()  # may belong somewhere in the loaded range
+            return
+        if shown != values:
+            self.devices_tree.item(device_id, values=values)
+            self._device_rows[device_id] = values
+            sort_index = DEVICE_COLUMNS.index(self._device_sort[0])
+            if shown[sort_index] != values[sort_index]:
+                self._schedule_device_refresh()
+
+    def _matches_device_filters(self, device):
+        query = self._device_query
+        if query.get("status") and device.get("status") != query["status"]:
+            return False
+        return all((device.get(name) or "").startswith(query[name])
+                   for name in ("username", "hostname") if query.get(name))
+
+    def _schedule_device_refresh(self):
+        """Coalesces bursts of events (e.g. a bulk update) into one diffed re-fetch."""
+        if self._device_refresh_pending:
+            return
+        self._device_refresh_pending = True
+
+        def run():
+            self._device_refresh_pending = False
+            self._reload_devices(keep_loaded=True)
+        self.root.after(DEVICE_REFRESH_DEBOUNCE_MS, run)
+
+    # --- Device table (paged, sorted and filtered server-side) ---
+
+    def _fetch_devices(self, query, count, cursor=None):
+        """Worker thread: fetches up to `count` devices after `cursor`. Returns (devices, next_cursor)."""
+        devices = []
+        while True:
+            params = dict(query, limit=min(count - len(devices), SERVER_MAX_PAGE_SIZE))
+            if cursor:
+                params["cursor"] = cursor
+            page = self._api_get("/admin/view_status", **params)
+            devices.extend(page["devices"])
+            cursor = page["next_cursor"]
+            if not cursor or len(devices) >= count:
+                return devices, cursor
+
+    def _reload_devices(self, keep_loaded):
+        """
+        Re-fetches the device list from the top. With keep_loaded, as many rows as are already shown are
+        fetched, so a refresh doesn't lose the user's scroll position; otherwise just the first page.
+        """
+        self._refresh_seq["devices"] += 1
+        seq = self._refresh_seq["devices"]
+        query = self._device_query = self._current_device_query()
+        count = max(len(self._device_rows), DEVICE_PAGE_SIZE) if keep_loaded else DEVICE_PAGE_SIZE
+        self._devices_loading = True
+        self._run_in_background(lambda: self._fetch_devices(query, count),
+                                lambda result: self._show_devices(seq, result, replace=True),
+                                lambda e: self._devices_failed(seq, e))
+
+    def _load_more_devices(self):
+        if self._devices_loading or not self._next_cursor:
+            return
+        seq = self._refresh_seq["devices"]
+        query, cursor = self._device_query, self._next_cursor
+        self._devices_loading = True
+        self.devices_count_label.config(text=f"{len(self._device_rows)} devices loaded, loading more...")
+        self._run_in_background(lambda: self._fetch_devices(query, DEVICE_PAGE_SIZE, cursor),
+                                lambda result: self._show_devices(seq, result, replace=False),
+                                lambda e: self._devices_failed(seq, e))
+
+    def _show_devices(self, seq, result, replace):
+        if seq != self._refresh_seq["devices"]:
+            return
+        self._devices_loading = False
+        devices, self._next_cursor = result
+        rows = [(device["device_id"],
+                 tuple("N/A" if device.get(col) is None else device[col] for col in DEVICE_COLUMNS))
+                for device in devices]
+        if replace:
+            self._diff_device_rows(rows)
+        else:
+            self._append_device_rows(rows)
+
+        if not self._device_rows:
+            self.devices_count_label.config(text="No devices found.")
+        else:
+            more = ", scroll for more" if self._next_cursor else ""
+            self.devices_count_label.config(text=f"{len(self._device_rows)} devices loaded{more}.")
+
+    def _diff_device_rows(self, rows):
+        """Brings the tree in line with `rows` (in order), touching only rows that were added, changed or moved."""
+        tree = self.devices_tree
+        wanted = {device_id for device_id, _ in rows}
+        stale = [device_id for device_id in self._device_rows if device_id not in wanted]
+        if stale:
+            tree.delete(*stale)
+            for device_id in stale:
+                del self._device_rows[device_id]
+
+        current = list(tree.get_children())
+        for index, (device_id, values) in enumerate(rows):
+            if device_id in self._device_rows:
+                if self._device_rows[device_id] != values:
+                    tree.item(device_id, values=values)
+                if index >= len(current) or current[index] != device_id:
+                    tree.move(device_id, "", index)
+                    current.remove(device_id)
+                    current.insert(index, device_id)
             else:
-                self.devices_tree.insert("", "end", values=("No devices activated.", "", "", "", ""))
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Connection Error", f"Could not connect to the backend: {e}", parent=self.root)
-        except Exception as e:
-            messagebox.showerror("Error", f"An unexpected error occurred: {e}", parent=self.root)
+                tree.insert("", index, iid=device_id, values=values)
+                current.insert(index, device_id)
+            self._device_rows[device_id] = values
+
+    def _append_device_rows(self, rows):
+        tree = self.devices_tree
+        for device_id, values in rows:
+            if device_id in self._device_rows:
+                # Already shown (the list shifted since the last page); keep one copy, in its new place.
+                tree.item(device_id, values=values)
+                tree.move(device_id, "", "end")
+            else:
+                tree.insert("", "end", iid=device_id, values=values)
+            self._device_rows[device_id] = values
+
+    def _devices_failed(self, seq, e):
+        if seq != self._refresh_seq["devices"]:
+            return
+        self._devices_loading = False
+        self.devices_count_label.config(text="Could not load devices.")
+        self._show_network_error(e)
+
+    def _on_devices_scrolled(self, first, last):
+        self.tree_scrollbar.set(first, last)
+        if float(last) >= LOAD_MORE_THRESHOLD:
+            self._load_more_devices()
+
+    def _current_device_query(self):
+        order, direction = self._device_sort
+        query = {"order": order, "direction": direction}
+        if self.status_filter.get() != "All":
+            query["status"] = self.status_filter.get()
+        for name, entry in (("username", self.username_filter_entry), ("hostname", self.hostname_filter_entry)):
+            if entry.get().strip():
+                query[name] = entry.get().strip()
+        return query
+
+    def _apply_device_filters(self):
+        self._reload_devices(keep_loaded=False)
+
+    def _sort_devices_by(self, column):
+        order, direction = self._device_sort
+        direction = "desc" if order == column and direction == "asc" else "asc"
+        self._device_sort = (column, direction)
+        self._update_sort_headings()
+        self.devices_tree.yview_moveto(0)
+        self._reload_devices(keep_loaded=False)
+
+    def _update_sort_headings(self):
+        order, direction = self._device_sort
+        for col_name in DEVICE_COLUMNS:
+            arrow = (" ▲" if direction == "asc" else " ▼") if col_name == order else ""
+            self.devices_tree.heading(col_name, text=col_name.replace("_", " ").title() + arrow)
 
     def _set_total_licenses(self):
         """Sends request to set new total license count."""
         try:
             new_total = int(self.new_total_entry.get())
-            if new_total < 0:
-                messagebox.showwarning("Invalid Input", "Total licenses cannot be negative.", parent=self.root)
-                return
-            payload = {"new_total_licenses": new_total, "admin_key": self.admin_key}
-            response = requests.post(f"{LICENSE_ADMIN_API_URL}/admin/set_total_licenses", json=payload)
-            response.raise_for_status()
-            result = response.json()
+        except ValueError:
+            messagebox.showwarning("Invalid Input", "Please enter a whole number for total licenses.", parent=self.root)
+            return
+        if new_total < 0:
+            messagebox.showwarning("Invalid Input", "Total licenses cannot be negative.", parent=self.root)
+            return
+
+        def done(result):
             if result.get("success"):
                 messagebox.showinfo("Success", result.get("message"), parent=self.root)
                 self.new_total_entry.delete(0, tk.END)
                 self.refresh_license_status()
             else:
                 messagebox.showerror("Update Failed", result.get("message"), parent=self.root)
-        except ValueError:
-            messagebox.showwarning("Invalid Input", "Please enter a whole number for total licenses.", parent=self.root)
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("API Error", f"Failed to set total licenses: {e}", parent=self.root)
-        except Exception as e:
-            messagebox.showerror("Error", f"An unexpected error occurred: {e}", parent=self.root)
+
+        def failed(e):
+            if isinstance(e, requests.exceptions.RequestException):
+                messagebox.showerror("API Error", f"Failed to set total licenses: {e}", parent=self.root)
+            else:
+                self._show_network_error(e)
+
+        self._run_in_background(
+            lambda: self._api_post("/admin/set_total_licenses", {"new_total_licenses": new_total}), done, failed)
 
     def _process_selected_devices(self, action_type):
-        """Activates or deactivates selected devices."""
+        """Activates or deactivates selected devices in the background, with progress and a Cancel button."""
         selected_items = self.devices_tree.selection()
         if not selected_items:
             messagebox.showwarning("No Selection", "Please select one or more devices.", parent=self.root)
             return
+        if self._bulk_cancel is not None:
+            messagebox.showwarning("Busy", "Another bulk operation is still running.", parent=self.root)
+            return
 
-        device_ids = [self.devices_tree.item(item)['values'][0] for item in selected_items]
-        endpoint = f"{LICENSE_ADMIN_API_URL}/admin/{action_type}_device"
-
-        success_count, fail_count = 0, 0
-        for device_id in device_ids:
-            try:
-                payload = {"device_id": device_id, "admin_key": self.admin_key}
-                response = requests.post(endpoint, json=payload)
+        # Rows are keyed by device_id, so the selected iids are the device IDs.
+        device_ids = list(selected_items)
+        cancel = self._bulk_cancel = threading.Event()
+        self._show_progress(f"{action_type.title()} 0/{len(device_ids)}", 0, len(device_ids))
+
+        failures = []  # (device_id or "N device(s)", message)
+
+        def work():
+            succeeded, failed = 0, 0
+            for start in range(0, len(device_ids), BULK_CHUNK_SIZE):
+                if cancel.is_set():
+                    raise OperationCancelled((succeeded, failed))
+                chunk = device_ids[start:start + BULK_CHUNK_SIZE]
+                try:
+                    results = self._api_post("/admin/bulk_update_devices",
+                                             {"action": action_type, "device_ids": chunk}).get("results", {})
+                    for device_id, result in results.items():
+                        if result.get("success"):
+                            succeeded += 1
+                        else:
+                            log.warning("Failed to %s %s: %s", action_type, device_id, result.get("message"))
+                            failures.append((device_id, result.get("message")))
+                            failed += 1
+                except Exception as e:
+                    log.warning("Failed to %s %d device(s): %s", action_type, len(chunk), e)
+                    failures.append((f"{len(chunk)} device(s)", str(e)))
+                    failed += len(chunk)
+                done = start + len(chunk)
+                self._results.put((lambda _, done=done: self._show_progress(
+                    f"{action_type.title()} {done}/{len(device_ids)}", done, len(device_ids)), None))
+            return succeeded, failed
+
+        def finished(counts):
+            self._bulk_cancel = None
+            self._hide_progress()
+            success_count, fail_count = counts
+            if success_count > 0:
+                messagebox.showinfo("Operation Complete", f"Successfully {action_type}d {success_count} device(s).",
+                                    parent=self.root)
+            if fail_count > 0:
+                messagebox.showerror("Operation Failed",
+                                     f"Failed to {action_type} {fail_count} device(s):\n"
+                                     + format_failures(failures, BULK_FAILURES_SHOWN), parent=self.root)
+            self.refresh_license_status()
+
+        def stopped(e):
+            self._bulk_cancel = None
+            self._hide_progress()
+            if isinstance(e, OperationCancelled):
+                success_count, fail_count = e.args[0]
+                skipped = len(device_ids) - success_count - fail_count
+                messagebox.showinfo("Operation Cancelled",
+                                    f"{action_type.title()}d {success_count} device(s) before cancelling; "
+                                    f"{skipped} were not processed.", parent=self.root)
+                self.refresh_license_status()
+            else:
+                self._show_network_error(e)
+
+        self._run_in_background(work, finished, stopped)
+
+    def _show_progress(self, text, done, total):
+        self.progress_label.config(text=text)
+        self.progress_bar.config(maximum=max(total, 1), value=done)
+        self.cancel_button.config(state="normal")
+        if not self.progress_frame.winfo_ismapped():
+            self.progress_frame.pack(pady=5, fill="x")
+
+    def _hide_progress(self):
+        self.progress_bar.stop()
+        self.progress_bar.config(mode="determinate")
+        self.progress_frame.pack_forget()
+
+    def _cancel_bulk_operation(self):
+        if self._bulk_cancel is not None:
+            self._bulk_cancel.set()
+            self.cancel_button.config(state="disabled")
+            self.progress_label.config(text="Cancelling after the current batch...")
+
+    @staticmethod
+    def _transfer_format(path):
+        return "ndjson" if os.path.splitext(path)[1].lower() in (".ndjson", ".jsonl") else "csv"
+
+    def _import_devices(self):
+        """Uploads a CSV/NDJSON device file to /admin/import_devices, streaming it from disk."""
+        path = filedialog.askopenfilename(parent=self.root, title="Import Devices", filetypes=[
+            ("Device files", "*.csv *.ndjson *.jsonl"), ("All files", "*.*")])
+        if not path:
+            return
+        update = messagebox.askyesnocancel(
+            "Existing Devices", "Update devices that are already registered?\n\n"
+            "Yes: overwrite them with the file's values\nNo: leave them unchanged", parent=self.root)
+        if update is None:
+            return
+        params = self._auth({"format": self._transfer_format(path), "on_conflict": "update" if update else "skip"})
+
+        def work():
+            with open(path, "rb") as f:
+                response = self.session.post(f"{LICENSE_ADMIN_API_URL}/admin/import_devices", params=params, data=f,
+                                             timeout=TRANSFER_TIMEOUT)
+            # Rejected imports (400/409) explain themselves in the body.
+            if response.status_code not in (400, 409):
                 response.raise_for_status()
-                if response.json().get("success"):
-                    success_count += 1
-                else:
-                    fail_count += 1
-            except Exception as e:
-                print(f"Failed to {action_type} {device_id}: {e}")
-                fail_count += 1
+            return response.json()
 
-        if success_count > 0:
-            messagebox.showinfo("Operation Complete", f"Successfully {action_type}d {success_count} device(s).",
-                                parent=self.root)
-        if fail_count > 0:
-            messagebox.showerror("Operation Failed", f"Failed to {action_type} {fail_count} device(s). Check console.",
-                                 parent=self.root)
+        def done(result):
+            self._hide_progress()
+            if result.get("success"):
+                messagebox.showinfo("Import Complete", result.get("message"), parent=self.root)
+                self.refresh_license_status()
+            else:
+                details = "\n".join(f"Line {e['line']}: {e['device_id'] or '(blank)'}: {e['error']}"
+                                    for e in result.get("errors", []))
+                messagebox.showerror("Import Failed", f"{result.get('message')}\n\n{details}".strip(),
+                                     parent=self.root)
 
-        self.refresh_license_status()
+        def failed(e):
+            self._hide_progress()
+            self._show_network_error(e)
+
+        self._show_progress(f"Importing {os.path.basename(path)}...", 0, 0)
+        self.progress_bar.config(mode="indeterminate")
+        self.progress_bar.start()
+        self.cancel_button.config(state="disabled")
+        self._run_in_background(work, done, failed)
+
+    def _export_devices(self):
+        """Downloads every device (honouring the current filters and sort) to a CSV/NDJSON file."""
+        path = filedialog.asksaveasfilename(parent=self.root, title="Export Devices", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("NDJSON", "*.ndjson")])
+        if not path:
+            return
+        params = self._auth(dict(self._device_query, format=self._transfer_format(path)))
 
-    def refresh_version_status(self):
-        """Fetches and updates the version history from the backend."""
-        try:
-            response = requests.get(f"{LICENSE_ADMIN_API_URL}/admin/get_versions?admin_key={self.admin_key}")
-            response.raise_for_status()
-            data = response.json()
-
-            for i in self.versions_tree.get_children(): self.versions_tree.delete(i)
-
-            if data.get("success") and data.get("versions"):
-                for ver in data["versions"]:
-                    latest_marker = "✅" if ver.get("is_latest") else ""
-                    self.versions_tree.insert("", "end", values=(
-                        latest_marker,
-                        ver.get("version_number", "N/A"),
-                        ver.get("release_date", "N/A"),
-                        ver.get("download_url", "N/A")
-                    ))
-            else:
-                self.versions_tree.insert("", "end", values=("", "Could not load versions.", "", ""))
+        def work():
+            written = 0
+            with self.session.get(f"{LICENSE_ADMIN_API_URL}/admin/export_devices", params=params, stream=True,
+                                  timeout=TRANSFER_TIMEOUT) as response:
+                response.raise_for_status()
+                with open(path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        f.write(chunk)
+                        written += len(chunk)
+            return written
+
+        def done(written):
+            self._hide_progress()
+            messagebox.showinfo("Export Complete", f"Saved {written:,} bytes to {path}.", parent=self.root)
+
+        def failed(e):
+            self._hide_progress()
+            self._show_network_error(e)
+
+        self._show_progress(f"Exporting to {os.path.basename(path)}...", 0, 0)
+        self.progress_bar.config(mode="indeterminate")
+        self.progress_bar.start()
+        self.cancel_button.config(state="disabled")
+        self._run_in_background(work, done, failed)
 
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Connection Error", f"Could not connect to the backend: {e}", parent=self.root)
-        except Exception as e:
-            messagebox.showerror("Error", f"An unexpected error occurred: {e}", parent=self.root)
+    def refresh_version_status(self):
+        """Fetches the version history from the backend in the background."""
+        self._refresh_seq["versions"] += 1
+        seq = self._refresh_seq["versions"]
+        self._run_in_background(lambda: self._api_get("/admin/get_versions"),
+                                lambda data: self._show_versions(seq, data))
+
+    def _show_versions(self, seq, data):
+        if seq != self._refresh_seq["versions"]:
+            return
+        for i in self.versions_tree.get_children(): self.versions_tree.delete(i)
+
+        if data.get("success") and data.get("versions"):
+            for ver in data["versions"]:
+                latest_marker = "✅" if ver.get("is_latest") else ""
+                self.versions_tree.insert("", "end", values=(
+                    latest_marker,
+                    ver.get("version_number", "N/A"),
+                    ver.get("release_date", "N/A"),
+                    ver.get("download_url", "N/A")
+                ))
+        else:
+            self.versions_tree.insert("", "end", values=("", "Could not load versions.", "", ""))
 
     def _set_latest_version(self):
         """Sends a request to set the new latest version."""
@@ -278,14 +869,10 @@ class AdminGUI:
 
         payload = {
             "version_number": new_version,
-            "download_url": download_url,
-            "admin_key": self.admin_key
+            "download_url": download_url
         }
 
-        try:
-            response = requests.post(f"{LICENSE_ADMIN_API_URL}/admin/set_latest_version", json=payload)
-            response.raise_for_status()
-            result = response.json()
+        def done(result):
             if result.get("success"):
                 messagebox.showinfo("Success", result.get("message"), parent=self.root)
                 self.new_version_entry.delete(0, tk.END)
@@ -293,13 +880,18 @@ class AdminGUI:
             else:
                 messagebox.showerror("Update Failed", result.get("message", "An unknown error occurred."),
                                      parent=self.root)
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("API Error", f"Failed to set latest version: {e}", parent=self.root)
-        except Exception as e:
-            messagebox.showerror("Error", f"An unexpected error occurred: {e}", parent=self.root)
+
+        def failed(e):
+            if isinstance(e, requests.exceptions.RequestException):
+                messagebox.showerror("API Error", f"Failed to set latest version: {e}", parent=self.root)
+            else:
+                self._show_network_error(e)
+
+        self._run_in_background(lambda: self._api_post("/admin/set_latest_version", payload), done, failed)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     root = tk.Tk()
     app = AdminGUI(root)
     root.mainloop()
@@ -0,0 +1,148 @@
+"""
+Signed offline license tokens.
+
+activate_license/check_license hand active devices a short-lived Ed25519-signed JWT
+(alg "EdDSA") carrying the device_id, its tenant ("tid"), status and expiry. Clients verify it locally with the
+public key from /license_token_public_key and only call the server again when it's close to
+expiry. Deactivations still reach clients within a bounded window through the signed
+revocation list served by /revoked_licenses.
+
+Tokens are enabled by setting LICENSE_TOKEN_PRIVATE_KEY (PEM text) or
+LICENSE_TOKEN_PRIVATE_KEY_FILE. Generate a key with:
+
+    python Teal_License_Tokens.py generate-key > license_token_key.pem
+"""
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.exceptions import InvalidSignature
+
+# --- Configuration ---
+LICENSE_TOKEN_TTL = int(os.environ.get("LICENSE_TOKEN_TTL", 24 * 3600))
+# How often clients are expected to refresh the revocation list; the longest a deactivated
+# device can keep working offline is this interval (plus clock skew).
+REVOCATION_LIST_MAX_AGE = int(os.environ.get("REVOCATION_LIST_MAX_AGE", 900))
+TOKEN_ISSUER = "teal-licensing"
+
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64url_decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _load_private_key():
+    pem = os.environ.get("LICENSE_TOKEN_PRIVATE_KEY")
+    path = os.environ.get("LICENSE_TOKEN_PRIVATE_KEY_FILE")
+    if not pem and path:
+        with open(path, "rb") as f:
+            pem = f.read()
+    if not pem:
+        return None
+    if isinstance(pem, str):
+        pem = pem.encode("ascii")
+    key = serialization.load_pem_private_key(pem, password=None)
+    if not isinstance(key, Ed25519PrivateKey):
+        raise ValueError("LICENSE_TOKEN_PRIVATE_KEY must be an Ed25519 private key.")
+    return key
+
+
+class TokenSigner:
+    def __init__(self, private_key):
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        raw = self.public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        self.key_id = hashlib.sha256(raw).hexdigest()[:16]
+        self._header = _b64url(json.dumps({"alg": "EdDSA", "typ": "JWT", "kid": self.key_id},
+                                          separators=(",", ":")).encode("utf-8"))
+
+    def sign(self, claims):
+        payload = _b64url(json.dumps(claims, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+        signing_input = f"{self._header}.{payload}".encode("ascii")
+        return f"{self._header}.{payload}.{_b64url(self.private_key.sign(signing_input))}"
+
+    def public_key_pem(self):
+        return self.public_key.public_bytes(serialization.Encoding.PEM,
+                                            serialization.PublicFormat.SubjectPublicKeyInfo).decode("ascii")
+
+
+_signer = None
+_signer_loaded = False
+
+
+def get_signer():
+    """Returns the configured TokenSigner, or None when tokens are disabled."""
+    global _signer, _signer_loaded
+    if not _signer_loaded:
+        private_key = _load_private_key()
+        _signer = TokenSigner(private_key) if private_key is not None else None
+        _signer_loaded = True
+        if _signer is None:
+            print("License tokens disabled: LICENSE_TOKEN_PRIVATE_KEY is not set.")
+    return _signer
+
+
+def issue_license_token(device_id, status="active", tenant_id=None):
+    """Returns {"license_token", "license_token_expires_at"} for a response body, or {} if tokens are disabled."""
+    signer = get_signer()
+    if signer is None:
+        return {}
+    # Millisecond iat so a reactivation in the same second as a revocation still postdates it.
+    now = round(time.time(), 3)
+    expires_at = int(now) + LICENSE_TOKEN_TTL
+    claims = {"iss": TOKEN_ISSUER, "sub": device_id, "status": status, "iat": now, "exp": expires_at}
+    if tenant_id is not None:
+        claims["tid"] = tenant_id
+    token = signer.sign(claims)
+    return {"license_token": token, "license_token_expires_at": expires_at}
+
+
+def sign_revocation_list(revoked, tenant_id=None):
+    """Signs [{"device_id", "revoked_at"}] so clients can trust the list they cache. Returns None if disabled."""
+    signer = get_signer()
+    if signer is None:
+        return None
+    now = int(time.time())
+    # Expires when clients are due to refresh it, so a stale list is recognisable as such.
+    claims = {"iss": TOKEN_ISSUER, "typ": "revocations", "iat": now, "exp": now + REVOCATION_LIST_MAX_AGE,
+              "revoked": revoked}
+    if tenant_id is not None:
+        claims["tid"] = tenant_id
+    return signer.sign(claims)
+
+
+def verify_token(token, public_key_pem, now=None):
+    """
+    Reference verifier (what clients should do): checks the signature and expiry and returns the claims.
+    Raises ValueError for anything invalid.
+    """
+    public_key = serialization.load_pem_public_key(public_key_pem.encode("ascii"))
+    if not isinstance(public_key, Ed25519PublicKey):
+        raise ValueError("Not an Ed25519 public key")
+    try:
+        header, payload, signature = token.split(".")
+        if json.loads(_b64url_decode(header)).get("alg") != "EdDSA":
+            raise ValueError("Unexpected token algorithm")
+        public_key.verify(_b64url_decode(signature), f"{header}.{payload}".encode("ascii"))
+        claims = json.loads(_b64url_decode(payload))
+    except InvalidSignature:
+        raise ValueError("Invalid token signature")
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Malformed token: {e}")
+    if claims.get("exp", 0) < (time.time() if now is None else now):
+        raise ValueError("Token expired")
+    return claims
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["generate-key"]:
+        sys.exit("usage: python Teal_License_Tokens.py generate-key")
+    print(Ed25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode("ascii"))
@@ -0,0 +1,203 @@
+"""
+Minimal Prometheus-style metrics: counters, histograms and scrape-time gauges rendered in the
+text exposition format, plus an instrumented psycopg2 connection class that times every query.
+
+Metrics are per process. Under Gunicorn each worker keeps its own values, so every sample carries
+a `worker` label (the pid) and dashboards should sum across it.
+"""
+import os
+import time
+import threading
+import psycopg2.extensions
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    labels = dict(labels, worker=str(os.getpid()))
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(series[-2])}"
+            yield f"{self.name}_count{_format_labels(labels)} {series[-1]}"
+
+
+class CallbackGauge:
+    """A gauge (or counter, via `kind`) whose samples are read from `callback()` at scrape time.
+    The callback returns {label-value tuple: value}."""
+
+    def __init__(self, name, documentation, labelnames, callback, kind="gauge"):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.callback, self.kind = callback, kind
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        try:
+            samples = self.callback()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e}")
+            return
+        for key, value in samples.items():
+            yield f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+db_query_seconds = REGISTRY.register(Histogram(
+    "teal_db_query_duration_seconds", "Time spent executing individual database statements."))
+db_rows_total = REGISTRY.register(Counter(
+    "teal_db_rows_total", "Rows returned or affected by database statements."))
+
+
+# --- Per-request accumulation ---
+# Handlers run one request per thread, so a thread-local is enough to attribute queries to the current request.
+
+_current = threading.local()
+
+
+def begin_request():
+    _current.stats = {"queries": 0, "query_time": 0.0, "rows": 0, "acquire_time": 0.0}
+
+
+def end_request():
+    stats = getattr(_current, "stats", None)
+    _current.stats = None
+    return stats
+
+
+def record_query(duration, rows):
+    db_query_seconds.observe(duration)
+    db_rows_total.inc(rows)
+    stats = getattr(_current, "stats", None)
+    if stats is not None:
+        stats["queries"] += 1
+        stats["query_time"] += duration
+        stats["rows"] += rows
+
+
+def record_acquire(duration):
+    stats = getattr(_current, "stats", None)
+    if stats is not None:
+        stats["acquire_time"] += duration
+
+
+# --- Instrumented psycopg2 connection ---
+
+class _TimedCursorMixin:
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(time.perf_counter() - started, max(self.rowcount, 0))
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(time.perf_counter() - started, max(self.rowcount, 0))
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query(time.perf_counter() - started, max(self.rowcount, 0))
+
+
+_timed_cursor_classes = {}
+
+
+def _timed_cursor_class(base):
+    cls = _timed_cursor_classes.get(base)
+    if cls is None:
+        cls = _timed_cursor_classes[base] = type("Timed" + base.__name__, (_TimedCursorMixin, base), {})
+    return cls
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection whose cursors (of any cursor_factory) report every statement to record_query()."""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
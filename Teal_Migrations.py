@@ -0,0 +1,269 @@
+"""
+Versioned schema migrations.
+
+Migrations live in ./migrations as ordered pairs of SQL files:
+
+    0003_license_indexes.up.sql
+    0003_license_indexes.down.sql   (optional; without it the migration can't be reverted)
+
+Each file runs in its own transaction, and its version is recorded in `schema_migrations`
+in that same transaction. A file whose first line is `-- migrate:no-transaction` is run
+statement by statement in autocommit mode instead (needed for CREATE INDEX CONCURRENTLY);
+statements in such files must each end with a `;` at the end of a line.
+
+A CREATE INDEX CONCURRENTLY that fails partway (a deadlock, a cancelled deploy, a duplicate under a UNIQUE
+index) leaves an INVALID index behind, which `IF NOT EXISTS` would then skip on the rerun. Before each
+`CREATE [UNIQUE] INDEX CONCURRENTLY IF NOT EXISTS name` the runner drops `name` if it exists and is invalid,
+and `status` lists any invalid indexes it finds.
+
+Usage:
+    python Teal_Migrations.py status
+    python Teal_Migrations.py up [--target VERSION]
+    python Teal_Migrations.py down [--steps N]
+"""
+import os
+import re
+import sys
+import argparse
+from collections import namedtuple
+import psycopg2
+from psycopg2 import sql as pgsql
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+# Arbitrary constant key for pg_advisory_lock so concurrent deploys/workers migrate one at a time.
+MIGRATION_LOCK_ID = 7406_2301
+
+Migration = namedtuple("Migration", ["version", "name", "up_path", "down_path"])
+
+_FILE_PATTERN = re.compile(r"^(\d+)_(\w+)\.(up|down)\.sql$")
+_CONCURRENT_INDEX_PATTERN = re.compile(
+    r"^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE | re.MULTILINE)
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Returns every migration found in `directory`, ordered by version."""
+    found = {}
+    for filename in os.listdir(directory):
+        match = _FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        version, name, direction = int(match.group(1)), match.group(2), match.group(3)
+        entry = found.setdefault(version, {"name": name, "up": None, "down": None})
+        if entry["name"] != name:
+            raise ValueError(f"Migration {version} has conflicting names: {entry['name']} and {name}")
+        entry[direction] = os.path.join(directory, filename)
+
+    migrations = []
+    for version in sorted(found):
+        entry = found[version]
+        if entry["up"] is None:
+            raise ValueError(f"Migration {version}_{entry['name']} has no .up.sql file")
+        migrations.append(Migration(version, entry["name"], entry["up"], entry["down"]))
+    return migrations
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _split_statements(sql):
+    statements, current = [], []
+    for line in sql.splitlines():
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statement = "\n".join(current).strip()
+            if any(l.strip() and not l.strip().startswith("--") for l in current):
+                statements.append(statement)
+            current = []
+    if any(l.strip() and not l.strip().startswith("--") for l in current):
+        statements.append("\n".join(current).strip())
+    return statements
+
+
+def concurrent_index_name(statement):
+    """The index a `CREATE INDEX CONCURRENTLY IF NOT EXISTS` statement builds, or None for any other statement."""
+    code = "\n".join(line for line in statement.splitlines() if not line.strip().startswith("--"))
+    match = _CONCURRENT_INDEX_PATTERN.search(code)
+    return match.group(1) if match else None
+
+
+def invalid_indexes(conn):
+    """Names of the INVALID indexes (failed or still-running concurrent builds) visible on the search path."""
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND pg_table_is_visible(c.oid) ORDER BY c.relname;
+    ''')
+    names = [row[0] for row in cur.fetchall()]
+    if not conn.autocommit:
+        conn.commit()
+    cur.close()
+    return names
+
+
+def _drop_if_invalid(cur, index_name, log=print):
+    """Drops a leftover INVALID index so the following CREATE ... IF NOT EXISTS rebuilds it. Needs autocommit."""
+    cur.execute("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);", (index_name,))
+    row = cur.fetchone()
+    if row and row[0]:
+        log(f"Dropping invalid index {index_name} left by an earlier failed build...")
+        cur.execute(pgsql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(pgsql.Identifier(index_name)))
+
+
+def _run_file(conn, path, record_sql, record_params, log=print):
+    """Runs one migration file and records it, atomically unless the file opts out of transactions."""
+    sql = _read(path)
+    cur = conn.cursor()
+    try:
+        if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+            conn.autocommit = True
+            try:
+                for statement in _split_statements(sql):
+                    index_name = concurrent_index_name(statement)
+                    if index_name:
+                        _drop_if_invalid(cur, index_name, log)
+                    cur.execute(statement)
+                cur.execute(record_sql, record_params)
+            finally:
+                conn.autocommit = False
+        else:
+            cur.execute(sql)
+            cur.execute(record_sql, record_params)
+            conn.commit()
+    except Exception:
+        if not conn.autocommit:
+            conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def ensure_migrations_table(conn):
+    cur = conn.cursor()
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version BIGINT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    ''')
+    conn.commit()
+    cur.close()
+
+
+def applied_versions(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT version FROM schema_migrations ORDER BY version;")
+    versions = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    cur.close()
+    return versions
+
+
+class _migration_lock:
+    """Session-level advisory lock held for the duration of a migrate up/down run."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        cur = self.conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+        self.conn.commit()
+        cur.close()
+
+    def __exit__(self, *exc):
+        if not self.conn.closed:
+            if not self.conn.autocommit:
+                self.conn.rollback()
+            cur = self.conn.cursor()
+            cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+            self.conn.commit()
+            cur.close()
+
+
+def migrate_up(conn, target=None, log=print):
+    """Applies every pending migration up to `target` (all by default). Returns the versions applied."""
+    ensure_migrations_table(conn)
+    applied = []
+    with _migration_lock(conn):
+        done = set(applied_versions(conn))
+        for migration in discover_migrations():
+            if migration.version in done or (target is not None and migration.version > target):
+                continue
+            log(f"Applying migration {migration.version:04d}_{migration.name}...")
+            _run_file(conn, migration.up_path,
+                      "INSERT INTO schema_migrations (version, name) VALUES (%s, %s);",
+                      (migration.version, migration.name), log)
+            applied.append(migration.version)
+    return applied
+
+
+def migrate_down(conn, steps=1, log=print):
+    """Reverts the `steps` most recently applied migrations. Returns the versions reverted."""
+    ensure_migrations_table(conn)
+    reverted = []
+    with _migration_lock(conn):
+        by_version = {m.version: m for m in discover_migrations()}
+        for version in reversed(applied_versions(conn)[-steps:] if steps > 0 else []):
+            migration = by_version.get(version)
+            if migration is None:
+                raise ValueError(f"Applied migration {version} has no file in {MIGRATIONS_DIR}")
+            if migration.down_path is None:
+                raise ValueError(f"Migration {version:04d}_{migration.name} is irreversible (no .down.sql)")
+            log(f"Reverting migration {migration.version:04d}_{migration.name}...")
+            _run_file(conn, migration.down_path, "DELETE FROM schema_migrations WHERE version = %s;", (version,),
+                      log)
+            reverted.append(version)
+    return reverted
+
+
+def migration_status(conn):
+    """Returns [(migration, applied: bool)] for every migration on disk."""
+    ensure_migrations_table(conn)
+    done = set(applied_versions(conn))
+    return [(m, m.version in done) for m in discover_migrations()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teal licensing database migrations.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="list migrations and whether they're applied")
+    up = sub.add_parser("up", help="apply pending migrations")
+    up.add_argument("--target", type=int, help="stop after this version")
+    down = sub.add_parser("down", help="revert applied migrations")
+    down.add_argument("--steps", type=int, default=1, help="how many to revert (default 1)")
+    args = parser.parse_args(argv)
+
+    db_url = os.environ.get('DATABASE_URL')
+    if not db_url:
+        print("FATAL ERROR: DATABASE_URL environment variable is not set.")
+        return 1
+
+    conn = psycopg2.connect(db_url)
+    try:
+        if args.command == "status":
+            for migration, applied in migration_status(conn):
+                print(f"[{'x' if applied else ' '}] {migration.version:04d}_{migration.name}"
+                      f"{'' if migration.down_path else '  (irreversible)'}")
+            for name in invalid_indexes(conn):
+                print(f"WARNING: index {name} is INVALID (a failed or still-running CREATE INDEX CONCURRENTLY); "
+                      f"rerun `up` or the migration that creates it to rebuild it.")
+        elif args.command == "up":
+            applied = migrate_up(conn, target=args.target)
+            print(f"Applied {len(applied)} migration(s).")
+        else:
+            reverted = migrate_down(conn, steps=args.steps)
+            print(f"Reverted {len(reverted)} migration(s).")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
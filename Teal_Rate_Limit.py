@@ -0,0 +1,114 @@
+"""
+Token-bucket rate limiting for the public license endpoints.
+
+Every client IP and every device (tenant_id, device_id) gets its own bucket. A bucket holds up to `burst` tokens,
+refills at `rate` tokens per second, and each request takes one; a request that finds its bucket
+empty is rejected with the number of seconds until a token is available (sent as Retry-After).
+
+Buckets live in a RateLimitBackend. The default MemoryRateLimitBackend is per process, so under
+Gunicorn the effective limit is multiplied by the worker count. To share buckets across workers
+or hosts, set RATE_LIMIT_BACKEND to "module:callable" returning an object with the same take()
+method (e.g. one backed by Redis).
+"""
+import os
+import time
+import importlib
+import threading
+from collections import OrderedDict
+
+# --- Configuration ---
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+# Heartbeats come every few minutes, so a device looping on retries is caught quickly.
+RATE_LIMIT_DEVICE_PER_MINUTE = float(os.environ.get("RATE_LIMIT_DEVICE_PER_MINUTE", 20))
+RATE_LIMIT_DEVICE_BURST = int(os.environ.get("RATE_LIMIT_DEVICE_BURST", 10))
+# Whole offices can sit behind one NAT address, so the per-IP limit is much looser.
+RATE_LIMIT_IP_PER_MINUTE = float(os.environ.get("RATE_LIMIT_IP_PER_MINUTE", 1200))
+RATE_LIMIT_IP_BURST = int(os.environ.get("RATE_LIMIT_IP_BURST", 200))
+# How many reverse proxies in front of the app append to X-Forwarded-For (0: ignore the header). Each one
+# appends the address it got the request from, so the client address is that many hops from the right;
+# anything further left was sent by the client and can't be trusted. RATE_LIMIT_TRUST_FORWARDED_FOR=1
+# (the old on/off setting) means one proxy.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get(
+    "RATE_LIMIT_TRUSTED_PROXIES", 1 if os.environ.get("RATE_LIMIT_TRUST_FORWARDED_FOR") == "1" else 0))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", 200000))
+
+
+class MemoryRateLimitBackend:
+    """
+    In-process buckets keyed by string. Least recently used buckets are dropped beyond
+    `max_keys`; a dropped bucket simply starts full again, which only errs towards allowing.
+    """
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    def take(self, key, rate, burst):
+        """Takes one token from `key`'s bucket. Returns 0.0 if allowed, else seconds until a token is free."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                wait, tokens = 0.0, tokens - 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self):
+        with self._lock:
+            return {"buckets": len(self._buckets), "max_keys": self.max_keys}
+
+
+def load_backend(spec=None):
+    """Builds the backend named by RATE_LIMIT_BACKEND ("module:callable"), defaulting to in-memory buckets."""
+    spec = spec if spec is not None else os.environ.get("RATE_LIMIT_BACKEND")
+    if not spec:
+        return MemoryRateLimitBackend()
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+class RateLimiter:
+    def __init__(self, backend, enabled=RATE_LIMIT_ENABLED):
+        self.backend = backend
+        self.enabled = enabled
+        self.device_rate = RATE_LIMIT_DEVICE_PER_MINUTE / 60.0
+        self.ip_rate = RATE_LIMIT_IP_PER_MINUTE / 60.0
+
+    def check(self, ip, tenant_id=None, device_id=None):
+        """
+        Charges one request to the client's IP bucket and, if both tenant_id and device_id are given, its
+        device bucket (device ids are only unique within a tenant).
+        Returns (scope, retry_after) for the first bucket that's empty, or None if the request may proceed.
+        The device bucket isn't charged when the IP is already over its limit.
+        """
+        if not self.enabled:
+            return None
+        if ip:
+            wait = self.backend.take(f"ip:{ip}", self.ip_rate, RATE_LIMIT_IP_BURST)
+            if wait > 0:
+                return "ip", wait
+        if tenant_id and device_id:
+            wait = self.backend.take(f"device:{tenant_id}:{device_id}", self.device_rate, RATE_LIMIT_DEVICE_BURST)
+            if wait > 0:
+                return "device", wait
+        return None
+
+
+def client_ip(remote_addr, forwarded_for=None, trusted_proxies=None):
+    """
+    The address to rate limit on: the X-Forwarded-For hop added by the outermost trusted proxy, else the
+    socket peer (also when the header has fewer hops than there are proxies, i.e. it didn't come through them).
+    """
+    trusted_proxies = RATE_LIMIT_TRUSTED_PROXIES if trusted_proxies is None else trusted_proxies
+    if trusted_proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",")]
+        if len(hops) >= trusted_proxies and hops[-trusted_proxies]:
+            return hops[-trusted_proxies]
+    return remote_addr
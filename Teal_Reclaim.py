@@ -0,0 +1,104 @@
+"""
+Seat reclamation for abandoned devices.
+
+check_license only notes in memory when a device was seen (LastSeenBuffer); a flusher writes the
+buffered timestamps to licenses.last_seen in one statement every few seconds, so heartbeats never
+wait on an UPDATE. A sweeper (both run as BackgroundTask threads) then deactivates devices idle past
+a threshold, freeing their seats, and later moves them to the licenses_archive table, a bounded
+batch per transaction.
+"""
+import os
+import time
+import threading
+
+
+class LastSeenBuffer:
+    """
+    Thread-safe {(tenant_id, device_id): seen_at} map, drained by the flusher. Repeat heartbeats from
+    a device between flushes overwrite one entry. When max_entries devices are pending, new devices
+    are dropped (counted in stats) until the next flush: last_seen is best-effort, and the device's
+    next heartbeat records it again.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._recorded = 0
+        self._dropped = 0
+        self._flushed = 0
+
+    def record(self, tenant_id, device_id, seen_at=None):
+        """Notes a heartbeat; returns True once the buffer is full (the caller should flush early)."""
+        key = (tenant_id, device_id)
+        seen_at = time.time() if seen_at is None else seen_at
+        with self._lock:
+            if key in self._pending or len(self._pending) < self.max_entries:
+                self._pending[key] = seen_at
+                self._recorded += 1
+            else:
+                self._dropped += 1
+            return len(self._pending) >= self.max_entries
+
+    def drain(self):
+        """Takes everything pending as [(tenant_id, device_id, seen_at)], sorted so writers lock rows in one order."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return sorted((tenant_id, device_id, seen_at) for (tenant_id, device_id), seen_at in pending.items())
+
+    def restore(self, entries):
+        """Puts back a drained batch whose write failed, without overwriting newer heartbeats."""
+        with self._lock:
+            for tenant_id, device_id, seen_at in entries:
+                if len(self._pending) >= self.max_entries:
+                    self._dropped += 1
+                    continue
+                self._pending.setdefault((tenant_id, device_id), seen_at)
+
+    def mark_flushed(self, count):
+        with self._lock:
+            self._flushed += count
+
+    def stats(self):
+        with self._lock:
+            return {"pending": len(self._pending), "max_entries": self.max_entries, "recorded": self._recorded,
+                    "dropped": self._dropped, "flushed": self._flushed}
+
+
+class BackgroundTask:
+    """
+    Calls `task()` every `interval` seconds on a daemon thread, started once per process (safe to
+    call ensure_started on every request, and after a fork). wake() runs it early.
+    """
+
+    def __init__(self, name, task, interval):
+        self.name = name
+        self.task = task
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.task()
+            except Exception as e:
+                print(f"Error in {self.name}: {e}")
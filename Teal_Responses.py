@@ -0,0 +1,124 @@
+"""
+JSON response encoding for the Flask and ASGI apps.
+
+FastJSONProvider replaces Flask's JSON provider (app.json), so every jsonify() and request.get_json()
+goes through orjson. The output is what Flask's own provider wrote: compact, key-sorted, and ASCII-only
+(non-ASCII text escaped as \\uXXXX), so clients see the same bytes as before. Constant bodies (health,
+fixed errors) are encoded once at import as StaticJSON and only wrapped in a fresh response object per
+request.
+"""
+import re
+import uuid
+import codecs
+import decimal
+import datetime
+import dataclasses
+import orjson
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date, parse_etags
+
+JSON_MIMETYPE = "application/json"
+
+# PASSTHROUGH_DATETIME: dates go through _default (HTTP dates, as jsonify always sent them), not RFC 3339.
+_ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+# What json.dumps(ensure_ascii=True) escapes beyond the control characters orjson already does: DEL and
+# everything non-ASCII.
+_NEEDS_ESCAPE = re.compile(r"[^\x00-\x7e]")
+
+
+def _default(o):
+    """The non-JSON types Flask's own provider accepts, converted the same way."""
+    if isinstance(o, datetime.date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _escape(match):
+    code = ord(match.group())
+    if code > 0xFFFF:
+        code -= 0x10000
+        return "\\u%04x\\u%04x" % (0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+    return "\\u%04x" % code
+
+
+def _needs_escape(data):
+    return not data.isascii() or b"\x7f" in data
+
+
+def ascii_json(body):
+    """Escapes UTF-8 JSON bytes the way json.dumps(ensure_ascii=True) does; ASCII input is returned as is."""
+    if not _needs_escape(body):
+        return body
+    return _NEEDS_ESCAPE.sub(_escape, body.decode()).encode()
+
+
+def dumps(obj):
+    """Compact, key-sorted, ASCII-only JSON as bytes."""
+    return ascii_json(orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS))
+
+
+loads = orjson.loads
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider on dumps()/loads() above. Install with `app.json = FastJSONProvider(app)`."""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        # Encoded straight to bytes (no str round trip), with jsonify's trailing newline.
+        return self._app.response_class(dumps(self._prepare_response_obj(args, kwargs)) + b"\n",
+                                        mimetype=self.mimetype)
+
+
+class StaticJSON:
+    """A constant JSON response, encoded once; calling it returns a new Flask Response around the same bytes."""
+
+    def __init__(self, body, status=200):
+        self.body = dumps(body) + b"\n"
+        self.status = status
+
+    def __call__(self):
+        return Response(self.body, status=self.status, mimetype=JSON_MIMETYPE)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether an If-None-Match header value matches `etag` (unquoted). Weak comparison, as RFC 9110 specifies
+    for If-None-Match: W/"x" matches "x" (proxies that compress responses weaken their ETags) and * matches
+    anything. Shared by the Flask and ASGI apps so both answer 304 to the same requests.
+    """
+    return bool(if_none_match) and parse_etags(if_none_match).contains_weak(etag)
+
+
+def join_json_lines(chunks):
+    """
+    Concatenates COPY ... TO STDOUT output whose rows are consecutive pieces of one JSON document (see
+    postgres_view_status_sql), dropping the row terminators: JSON text from Postgres never contains a
+    raw newline. Non-ASCII is escaped as in dumps(). Ends with jsonify's trailing newline.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        chunk = chunk.replace(b"\n", b"")
+        # A chunk may end inside a multi-byte character; the decoder carries it over to the next one.
+        if not _needs_escape(chunk) and not decoder.getstate()[0]:
+            yield chunk
+        else:
+            yield _NEEDS_ESCAPE.sub(_escape, decoder.decode(chunk)).encode()
+    decoder.decode(b"", final=True)
+    yield b"\n"
@@ -0,0 +1,1158 @@
+"""
+Storage backends for the license server.
+
+The license, seat, tenant and version SQL behind the Flask endpoints lives in a LicenseRepository,
+with two implementations:
+
+  - PostgresLicenseRepository: the production backend (pooled psycopg2 connections, migrations/,
+    LISTEN/NOTIFY invalidation of other workers' caches).
+  - SQLiteLicenseRepository: an embedded database file in WAL mode for tests, benchmarks and
+    small single-node installs. Reads never wait on writers, and every write runs under
+    BEGIN IMMEDIATE (SQLite's single write lock), so seat changes are serialized across threads
+    and processes just as the tenant row lock serializes them in Postgres.
+
+Devices live in tenants (license pools): each tenant has its own license key, seat limit, seat
+counter and device_id namespace, so every device-level call takes a tenant_id. Heartbeats are
+batched into licenses.last_seen (touch_devices), which the idle sweep uses to free seats, and
+activations and heartbeats are appended to the license_events audit table (record_events).
+
+Select a backend with STORAGE_BACKEND=postgres|sqlite (and SQLITE_PATH, default teal_licenses.db;
+":memory:" keeps everything in this process). Delta sync, the admin event stream, COPY
+import/export and the async app are Postgres-only.
+"""
+import io
+import os
+import re
+import csv
+import json
+import base64
+import time
+import sqlite3
+import threading
+import contextlib
+from collections import namedtuple
+from datetime import datetime, timezone
+import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+from Teal_Audit import EVENT_COLUMNS, HEARTBEAT, ACTIVE_DEVICE_EVENTS
+from Teal_Cache import notify
+from Teal_Migrations import migrate_up
+
+# --- Configuration ---
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "postgres")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "teal_licenses.db")
+# How long a writer waits for SQLite's write lock before failing.
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 10))
+
+# The tenant that requests without a tenant_id (every pre-tenant client) belong to.
+DEFAULT_TENANT_ID = "default"
+# Also enforced by a CHECK constraint (migrations/0008_tenants.up.sql). No "/", see tenant_device_key().
+TENANT_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+# Outcomes of a device status change (set_device_status / set_devices_status).
+NOT_FOUND, UNCHANGED, NO_SEATS, UPDATED = "not_found", "unchanged", "no_seats", "updated"
+# Outcomes of create_tenant / update_tenant.
+CREATED, EXISTS, KEY_IN_USE = "created", "exists", "key_in_use"
+# Arbitrary constant key for pg_try_advisory_xact_lock, so one worker at a time runs an idle-device sweep batch.
+IDLE_SWEEP_LOCK_ID = 7406_2302
+
+
+def tenant_device_key(tenant_id, device_id):
+    """One string naming a device across tenants: the license cache key and LICENSE_CHANNEL payload."""
+    return f"{tenant_id}/{device_id}"
+
+
+# --- Device Listing ---
+
+# Keyset orderings: sort expressions, always ending in device_id so every key is unique.
+# The cursor carries the sort key (as text) of the last row returned.
+DEVICE_ORDERINGS = {
+    "device_id": ("device_id",),
+    "activated_at": ("activated_at", "device_id"),
+    "username": ("username", "device_id"),
+    "hostname": ("COALESCE(hostname, '')", "device_id"),
+    "status": ("status", "device_id"),
+}
+
+DeviceQuery = namedtuple("DeviceQuery", "order direction status username hostname after cursor_order")
+
+
+def encode_cursor(order, key):
+    return base64.urlsafe_b64encode(json.dumps([order, key]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, order):
+    """Returns the key values encoded in `cursor`; raises ValueError if it's malformed or for another ordering."""
+    try:
+        cursor_order, key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_order != order or not isinstance(key, list) or len(key) != len(DEVICE_ORDERINGS[order.split(":")[0]]):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def parse_device_query(args):
+    """Builds a DeviceQuery from request args (filters, order, direction, cursor). Raises ValueError on bad input."""
+    order = args.get('order', 'device_id')
+    if order not in DEVICE_ORDERINGS:
+        raise ValueError(f"order must be one of: {', '.join(DEVICE_ORDERINGS)}")
+    direction = args.get('direction', 'asc')
+    if direction not in ('asc', 'desc'):
+        raise ValueError("direction must be asc or desc")
+    # Descending cursors are tagged so they can't be replayed against the ascending order.
+    cursor_order = order if direction == 'asc' else f"{order}:desc"
+    after = decode_cursor(args['cursor'], cursor_order) if args.get('cursor') else None
+    return DeviceQuery(order, direction, args.get('status') or None, args.get('username') or None,
+                       args.get('hostname') or None, after, cursor_order)
+
+
+class LicenseRepository:
+    """
+    Interface shared by the storage backends. Status changes return one of NOT_FOUND, UNCHANGED,
+    NO_SEATS or UPDATED; timestamps come back as 'YYYY-MM-DD HH:MM:SS UTC' text.
+    """
+
+    # Whether reads cross a network and other processes' writes are announced, i.e. whether callers
+    # should put caches (invalidated by LISTEN/NOTIFY) in front of the reads.
+    cache_reads = False
+
+    def setup(self, license_key, total_licenses, version_number, download_url):
+        """
+        Creates or migrates the schema and seeds the default tenant and versions.
+        Returns (tenant_created, version_created).
+        """
+        raise NotImplementedError
+
+    def tenant_keys(self):
+        """{license_key: tenant_id} for every tenant."""
+        raise NotImplementedError
+
+    def tenant_for_key(self, license_key):
+        raise NotImplementedError
+
+    def tenants(self):
+        """Every tenant with its seat totals (not its key), ordered by tenant_id."""
+        raise NotImplementedError
+
+    def create_tenant(self, tenant_id, name, license_key, total_licenses):
+        """Returns CREATED, EXISTS (tenant_id taken) or KEY_IN_USE (another tenant has that key)."""
+        raise NotImplementedError
+
+    def update_tenant(self, tenant_id, name=None, license_key=None):
+        """Renames the tenant and/or replaces its key. Returns UPDATED, NOT_FOUND or KEY_IN_USE."""
+        raise NotImplementedError
+
+    def activate(self, tenant_id, device_id, username, hostname):
+        """
+        Takes one of the tenant's seats for device_id. Returns (result, licenses_remaining), result in
+        ('activated', 'reactivated', 'already_active', 'no_seats', 'unknown_tenant').
+        """
+        raise NotImplementedError
+
+    def license_status(self, tenant_id, device_id):
+        """The device's status, or None if it's unknown."""
+        raise NotImplementedError
+
+    def license_statuses(self, tenant_id, device_ids):
+        """{device_id: status} for the known devices among device_ids."""
+        raise NotImplementedError
+
+    def set_device_status(self, tenant_id, device_id, new_status):
+        raise NotImplementedError
+
+    def set_devices_status(self, tenant_id, device_ids, new_status):
+        """
+        Changes many devices in one transaction with a single seat check; when seats run out, devices are activated
+        in the given order. Returns ({device_id: outcome}, licenses_remaining), or None if the tenant doesn't exist.
+        """
+        raise NotImplementedError
+
+    def seat_summary(self, tenant_id):
+        """(total_licenses, active_count) from the maintained counter, or None if the tenant doesn't exist."""
+        raise NotImplementedError
+
+    def set_total_licenses(self, tenant_id, total):
+        """Returns False if the tenant doesn't exist."""
+        raise NotImplementedError
+
+    def reconcile_active_counts(self):
+        """Recomputes every tenant's active_count from the licenses table; returns [(tenant_id, old, new)]."""
+        raise NotImplementedError
+
+    def touch_devices(self, entries, min_interval=0):
+        """
+        Writes buffered heartbeats [(tenant_id, device_id, seen_at epoch)] to last_seen, skipping devices whose
+        stored last_seen is less than min_interval seconds older. Returns the number of rows written.
+        """
+        raise NotImplementedError
+
+    def deactivate_idle(self, idle_seconds, limit):
+        """
+        Deactivates up to `limit` active devices neither seen nor (re)activated for idle_seconds, releasing
+        their seats. Returns [(tenant_id, device_id)] deactivated, or None if another worker is sweeping.
+        """
+        raise NotImplementedError
+
+    def archive_idle(self, idle_seconds, limit):
+        """Moves up to `limit` inactive devices idle for idle_seconds to licenses_archive; returns like deactivate_idle."""
+        raise NotImplementedError
+
+    def record_events(self, events):
+        """Appends audit events [(occurred_at epoch, tenant_id, device_id, event)] to license_events in one write."""
+        raise NotImplementedError
+
+    def prune_events(self, before):
+        """
+        Deletes audit events older than `before` (epoch). Postgres drops whole monthly partitions, so up to
+        a month more is kept. Returns how many partitions (Postgres) or rows (SQLite) were removed.
+        """
+        raise NotImplementedError
+
+    def activity(self, tenant_id, days_since, hours_since):
+        """
+        Aggregated audit events: ([(day, event, count)] for activations and denials since days_since, and
+        [(hour, distinct active devices)] since hours_since), days as "YYYY-MM-DD" and hours as
+        "YYYY-MM-DD HH:00" in UTC; None if the tenant doesn't exist.
+        """
+        raise NotImplementedError
+
+    def all_devices(self, tenant_id):
+        """(total_licenses, [device dicts]) for the legacy /admin/view_status payload, or None if the tenant doesn't exist."""
+        raise NotImplementedError
+
+    def device_page(self, tenant_id, query, limit):
+        """One keyset page for a DeviceQuery: (devices, next_cursor)."""
+        raise NotImplementedError
+
+    def revocations(self, tenant_id):
+        """[(device_id, revoked_at epoch seconds)] for devices deactivated within the revocation max age."""
+        raise NotImplementedError
+
+    def latest_version(self):
+        """{"version_number", "download_url"} of the latest version, or None."""
+        raise NotImplementedError
+
+    def versions(self):
+        raise NotImplementedError
+
+    def set_latest_version(self, version_number, download_url):
+        """Marks the version as the only latest one, adding it if needed; returns True if it was added."""
+        raise NotImplementedError
+
+
+def plan_status_changes(device_ids, current, new_status, free_seats):
+    """Decides each device's outcome for a bulk status change; returns ({device_id: outcome}, [devices to change])."""
+    free_seats = max(free_seats, 0)
+    outcomes, to_change = {}, []
+    for device_id in device_ids:
+        status = current.get(device_id)
+        if status is None:
+            outcomes[device_id] = NOT_FOUND
+        elif status == new_status:
+            outcomes[device_id] = UNCHANGED
+        elif new_status == 'active' and len(to_change) >= free_seats:
+            outcomes[device_id] = NO_SEATS
+        else:
+            to_change.append(device_id)
+            outcomes[device_id] = UPDATED
+    return outcomes, to_change
+
+
+# --- Postgres ---
+
+# activated_at is compared as a timestamp, not as its text form.
+DEVICE_SORT_CASTS = {"activated_at": "::timestamptz"}
+DEVICE_COLUMNS = ("device_id, username, hostname, status, "
+                  "to_char(activated_at, 'YYYY-MM-DD HH24:MI:SS TZ') as activated_at")
+TENANT_COLUMNS = ("tenant_id, name, total_licenses, active_count AS activated_count, "
+                  "total_licenses - active_count AS licenses_remaining, "
+                  "to_char(created_at, 'YYYY-MM-DD HH24:MI:SS TZ') as created_at")
+
+
+def postgres_device_sql(tenant_id, query):
+    """The filtered, keyset-ordered device SELECT for a DeviceQuery (also streamed and COPYed by the endpoints)."""
+    sort_exprs = DEVICE_ORDERINGS[query.order]
+    where, params = ["tenant_id = %s"], [tenant_id]
+    if query.status:
+        where.append("status = %s")
+        params.append(query.status)
+    # Prefix matches so the username/hostname indexes stay usable.
+    for column in ("username", "hostname"):
+        value = getattr(query, column)
+        if value:
+            where.append(f"{column} LIKE %s")
+            params.append(value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+    if query.after is not None:
+        placeholders = ", ".join("%s" + DEVICE_SORT_CASTS.get(expr, "") for expr in sort_exprs)
+        where.append(f"({', '.join(sort_exprs)}) {'>' if query.direction == 'asc' else '<'} ({placeholders})")
+        params.extend(query.after)
+
+    sort_key = ", ".join(f"({expr})::text" for expr in sort_exprs)
+    sql = (f"SELECT {DEVICE_COLUMNS}, ARRAY[{sort_key}] AS _sort_key FROM licenses"
+           + " WHERE " + " AND ".join(where)
+           + " ORDER BY " + ", ".join(f"{expr} {query.direction.upper()}" for expr in sort_exprs))
+    return sql, params
+
+
+def postgres_view_status_sql(tenant_id):
+    """
+    The legacy /admin/view_status payload built by Postgres, one piece per row for COPY: the counts,
+    then one "device_id":{...} member per device, then the totals. Keys and devices come in jsonify's
+    (sorted) order, so the bytes match the Python path; being one statement, it is one snapshot.
+    """
+    sql = """
+        WITH seats AS (
+            SELECT total_licenses,
+                   (SELECT COUNT(*) FROM licenses WHERE tenant_id = %(tenant)s AND status = 'active') AS active,
+                   (SELECT MIN(device_id COLLATE "C") FROM licenses WHERE tenant_id = %(tenant)s) AS first_device
+            FROM tenants WHERE tenant_id = %(tenant)s)
+        SELECT piece FROM (
+            SELECT 0 AS part, NULL AS device_id,
+                   '{"activated_count":' || active || ',"activated_devices":{' AS piece FROM seats
+            UNION ALL
+            SELECT 1, d.device_id,
+                   CASE WHEN d.device_id = seats.first_device THEN '' ELSE ',' END
+                   || to_json(d.device_id)::text || ':' || row_to_json(d)::text
+            FROM seats, (
+                SELECT to_char(activated_at, 'YYYY-MM-DD HH24:MI:SS TZ') AS activated_at, device_id, hostname,
+                       status, username
+                FROM licenses WHERE tenant_id = %(tenant)s) d
+            UNION ALL
+            SELECT 2, NULL, '},"licenses_remaining":' || (total_licenses - active)
+                   || ',"total_licenses":' || total_licenses || '}' FROM seats
+        ) pieces ORDER BY part, device_id COLLATE "C"
+    """
+    return sql, {"tenant": tenant_id}
+
+
+# Seat counter: tenants.active_count is maintained in the same transaction as every license status change,
+# so activations never need to COUNT(*) the licenses table. Seat changes always lock the tenant row
+# before any licenses row (as teal_activate_device() in migrations/0008 does) so they can't deadlock each other.
+
+def claim_seat(cur, tenant_id):
+    """Atomically takes one of the tenant's seats; returns the seats remaining afterwards, or None if none are free."""
+    cur.execute(
+        """UPDATE tenants SET active_count = active_count + 1
+           WHERE tenant_id = %s AND active_count < total_licenses
+           RETURNING total_licenses - active_count AS remaining;""", (tenant_id,))
+    row = cur.fetchone()
+    return row['remaining'] if row else None
+
+
+def release_seat(cur, tenant_id):
+    """Gives one seat back after a device has been deactivated."""
+    cur.execute("UPDATE tenants SET active_count = GREATEST(active_count - 1, 0) WHERE tenant_id = %s;", (tenant_id,))
+
+
+def record_revocations(cur, tenant_id, device_ids, max_age):
+    """
+    Adds deactivated devices to the revocation list served to offline-token clients, and prunes
+    entries older than max_age (the token lifetime: no token issued before them can still be valid).
+    """
+    cur.execute(
+        """INSERT INTO license_revocations (tenant_id, device_id) SELECT %s, unnest(%s::text[])
+           ON CONFLICT (tenant_id, device_id) DO UPDATE SET revoked_at = NOW();""", (tenant_id, list(device_ids)))
+    cur.execute("DELETE FROM license_revocations WHERE revoked_at < NOW() - make_interval(secs => %s);",
+                (max_age,))
+
+
+class PostgresLicenseRepository(LicenseRepository):
+    """
+    Borrows connections through get_conn/release_conn (the pool in Teal_Backend). Status changes
+    NOTIFY license_channel per device and version changes NOTIFY version_channel, on commit.
+    """
+
+    cache_reads = True
+
+    def __init__(self, get_conn, release_conn, license_channel, version_channel, revocation_max_age):
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+        self.license_channel = license_channel
+        self.version_channel = version_channel
+        self.revocation_max_age = revocation_max_age
+
+    @contextlib.contextmanager
+    def _cursor(self, dict_rows=True, autocommit=False):
+        conn = self.get_conn()
+        if autocommit:
+            conn.autocommit = True
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if dict_rows else conn.cursor()
+        try:
+            yield conn, cur
+        finally:
+            cur.close()
+            self.release_conn(conn)
+
+    def setup(self, license_key, total_licenses, version_number, download_url):
+        conn = self.get_conn()
+        try:
+            migrate_up(conn)
+        finally:
+            self.release_conn(conn)
+
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute(
+                """INSERT INTO tenants (tenant_id, name, license_key, total_licenses) VALUES (%s, 'Default', %s, %s)
+                   ON CONFLICT (tenant_id) DO NOTHING;""", (DEFAULT_TENANT_ID, license_key, total_licenses))
+            tenant_created = cur.rowcount == 1
+            cur.execute("SELECT COUNT(*) FROM versions;")
+            version_created = cur.fetchone()[0] == 0
+            if version_created:
+                cur.execute("INSERT INTO versions (version_number, download_url, is_latest) VALUES (%s, %s, %s);",
+                            (version_number, download_url, True))
+            conn.commit()
+        return tenant_created, version_created
+
+    def tenant_keys(self):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute("SELECT license_key, tenant_id FROM tenants;")
+            return dict(cur.fetchall())
+
+    def tenant_for_key(self, license_key):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute("SELECT tenant_id FROM tenants WHERE license_key = %s;", (license_key,))
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def tenants(self):
+        with self._cursor() as (conn, cur):
+            cur.execute(f"SELECT {TENANT_COLUMNS} FROM tenants ORDER BY tenant_id;")
+            return cur.fetchall()
+
+    def create_tenant(self, tenant_id, name, license_key, total_licenses):
+        with self._cursor() as (conn, cur):
+            try:
+                cur.execute(
+                    """INSERT INTO tenants (tenant_id, name, license_key, total_licenses) VALUES (%s, %s, %s, %s)
+                       ON CONFLICT (tenant_id) DO NOTHING;""", (tenant_id, name, license_key, total_licenses))
+            except psycopg2.errors.UniqueViolation:
+                conn.rollback()
+                return KEY_IN_USE
+            conn.commit()
+            return CREATED if cur.rowcount == 1 else EXISTS
+
+    def update_tenant(self, tenant_id, name=None, license_key=None):
+        with self._cursor() as (conn, cur):
+            try:
+                cur.execute(
+                    """UPDATE tenants SET name = COALESCE(%s, name), license_key = COALESCE(%s, license_key)
+                       WHERE tenant_id = %s;""", (name, license_key, tenant_id))
+            except psycopg2.errors.UniqueViolation:
+                conn.rollback()
+                return KEY_IN_USE
+            conn.commit()
+            return UPDATED if cur.rowcount == 1 else NOT_FOUND
+
+    def activate(self, tenant_id, device_id, username, hostname):
+        # A single autocommitted statement: the function is its own transaction, so no separate COMMIT round trip.
+        with self._cursor(autocommit=True) as (conn, cur):
+            cur.execute("SELECT result, licenses_remaining FROM teal_activate_device(%s, %s, %s, %s);",
+                        (tenant_id, device_id, username, hostname))
+            activation = cur.fetchone()
+        return activation['result'], activation['licenses_remaining']
+
+    def license_status(self, tenant_id, device_id):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute("SELECT status FROM licenses WHERE tenant_id = %s AND device_id = %s;", (tenant_id, device_id))
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def license_statuses(self, tenant_id, device_ids):
+        # One ANY() query for the whole batch.
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute("SELECT device_id, status FROM licenses WHERE tenant_id = %s AND device_id = ANY(%s);",
+                        (tenant_id, list(device_ids)))
+            return dict(cur.fetchall())
+
+    def set_device_status(self, tenant_id, device_id, new_status):
+        with self._cursor() as (conn, cur):
+            cur.execute("SELECT status FROM licenses WHERE tenant_id = %s AND device_id = %s;", (tenant_id, device_id))
+            device = cur.fetchone()
+            if not device:
+                return NOT_FOUND
+            if device['status'] == new_status:
+                return UNCHANGED
+
+            if new_status == 'active':
+                if claim_seat(cur, tenant_id) is None:
+                    return NO_SEATS
+            else:
+                release_seat(cur, tenant_id)
+                record_revocations(cur, tenant_id, [device_id], self.revocation_max_age)
+
+            # An admin reactivation counts as a sighting, so the idle sweeper doesn't take it straight back.
+            cur.execute(
+                """UPDATE licenses SET status = %s, last_seen = CASE WHEN %s = 'active' THEN NOW() ELSE last_seen END
+                   WHERE tenant_id = %s AND device_id = %s AND status <> %s;""",
+                (new_status, new_status, tenant_id, device_id, new_status))
+            if cur.rowcount == 0:
+                # Changed by a concurrent request since we looked it up; undo the seat change.
+                conn.rollback()
+                return UNCHANGED
+            notify(cur, self.license_channel, tenant_device_key(tenant_id, device_id))
+            conn.commit()
+            return UPDATED
+
+    def set_devices_status(self, tenant_id, device_ids, new_status):
+        with self._cursor() as (conn, cur):
+            # Tenant first, then licenses rows: the same lock order as every other seat change.
+            cur.execute("SELECT total_licenses, active_count FROM tenants WHERE tenant_id = %s FOR UPDATE;",
+                        (tenant_id,))
+            tenant = cur.fetchone()
+            if not tenant:
+                return None
+            cur.execute("SELECT device_id, status FROM licenses WHERE tenant_id = %s AND device_id = ANY(%s) FOR UPDATE;",
+                        (tenant_id, list(device_ids)))
+            current = {row['device_id']: row['status'] for row in cur.fetchall()}
+
+            outcomes, to_change = plan_status_changes(
+                device_ids, current, new_status, tenant['total_licenses'] - tenant['active_count'])
+            if to_change:
+                cur.execute(
+                    """UPDATE licenses SET status = %s, last_seen = CASE WHEN %s = 'active' THEN NOW() ELSE last_seen END
+                       WHERE tenant_id = %s AND device_id = ANY(%s);""", (new_status, new_status, tenant_id, to_change))
+                delta = len(to_change) if new_status == 'active' else -len(to_change)
+                cur.execute("UPDATE tenants SET active_count = GREATEST(active_count + %s, 0) WHERE tenant_id = %s;",
+                            (delta, tenant_id))
+                if new_status != 'active':
+                    record_revocations(cur, tenant_id, to_change, self.revocation_max_age)
+                cur.execute("SELECT pg_notify(%s, %s || '/' || device_id) FROM unnest(%s::text[]) AS device_id;",
+                            (self.license_channel, tenant_id, to_change))
+            conn.commit()
+        active_count = tenant['active_count'] + (len(to_change) if new_status == 'active' else -len(to_change))
+        return outcomes, tenant['total_licenses'] - active_count
+
+    def seat_summary(self, tenant_id):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute("SELECT total_licenses, active_count FROM tenants WHERE tenant_id = %s;", (tenant_id,))
+            return cur.fetchone()
+
+    def set_total_licenses(self, tenant_id, total):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute("UPDATE tenants SET total_licenses = %s WHERE tenant_id = %s;", (total, tenant_id))
+            conn.commit()
+            return cur.rowcount == 1
+
+    def reconcile_active_counts(self):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            # Holding the tenant row locks blocks seat changes, so the counts below can't go stale before we write them.
+            cur.execute("SELECT tenant_id, active_count FROM tenants ORDER BY tenant_id FOR UPDATE;")
+            old = cur.fetchall()
+            cur.execute(
+                """UPDATE tenants t SET active_count = (
+                       SELECT COUNT(*) FROM licenses l WHERE l.tenant_id = t.tenant_id AND l.status = 'active')
+                   RETURNING tenant_id, active_count;""")
+            new = dict(cur.fetchall())
+            conn.commit()
+        return [(tenant_id, count, new[tenant_id]) for tenant_id, count in old]
+
+    def touch_devices(self, entries, min_interval=0):
+        tenant_ids, device_ids, seen = (list(column) for column in zip(*entries)) if entries else ([], [], [])
+        with self._cursor(dict_rows=False) as (conn, cur):
+            # SKIP LOCKED: heartbeats never queue behind a seat change or the sweeper; a device skipped here
+            # is written on a later flush.
+            cur.execute(
+                """WITH seen AS (
+                       SELECT l.tenant_id, l.device_id, to_timestamp(s.seen_at) AS seen_at
+                       FROM unnest(%s::text[], %s::text[], %s::float8[]) AS s (tenant_id, device_id, seen_at)
+                       JOIN licenses l ON l.tenant_id = s.tenant_id AND l.device_id = s.device_id
+                       WHERE l.last_seen IS NULL OR l.last_seen < to_timestamp(s.seen_at - %s)
+                       ORDER BY l.tenant_id, l.device_id
+                       FOR NO KEY UPDATE OF l SKIP LOCKED)
+                   UPDATE licenses l SET last_seen = seen.seen_at FROM seen
+                   WHERE l.tenant_id = seen.tenant_id AND l.device_id = seen.device_id;""",
+                (tenant_ids, device_ids, seen, min_interval))
+            conn.commit()
+            return cur.rowcount
+
+    def _try_sweep_lock(self, cur):
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s);", (IDLE_SWEEP_LOCK_ID,))
+        return cur.fetchone()[0]
+
+    def deactivate_idle(self, idle_seconds, limit):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            if not self._try_sweep_lock(cur):
+                conn.rollback()
+                return None
+            # last_seen isn't indexed (see migrations/0009), so this scans active rows until it has `limit`.
+            cur.execute(
+                """SELECT tenant_id, device_id FROM licenses
+                   WHERE status = 'active' AND GREATEST(last_seen, activated_at) < NOW() - make_interval(secs => %s)
+                   LIMIT %s;""", (idle_seconds, limit))
+            candidates = {}
+            for tenant_id, device_id in cur.fetchall():
+                candidates.setdefault(tenant_id, []).append(device_id)
+
+            deactivated = []
+            for tenant_id in sorted(candidates):
+                # Tenant first, like every seat change; SKIP LOCKED so the sweeper never makes activations wait
+                # longer than one batch, and never waits on them.
+                cur.execute("SELECT 1 FROM tenants WHERE tenant_id = %s FOR UPDATE SKIP LOCKED;", (tenant_id,))
+                if cur.fetchone() is None:
+                    continue
+                # Re-checked under the lock: a heartbeat flushed or a reactivation since the scan keeps the device.
+                cur.execute(
+                    """UPDATE licenses SET status = 'inactive'
+                       WHERE tenant_id = %s AND device_id = ANY(%s) AND status = 'active'
+                         AND GREATEST(last_seen, activated_at) < NOW() - make_interval(secs => %s)
+                       RETURNING device_id;""", (tenant_id, candidates[tenant_id], idle_seconds))
+                changed = [row[0] for row in cur.fetchall()]
+                if not changed:
+                    continue
+                cur.execute("UPDATE tenants SET active_count = GREATEST(active_count - %s, 0) WHERE tenant_id = %s;",
+                            (len(changed), tenant_id))
+                record_revocations(cur, tenant_id, changed, self.revocation_max_age)
+                cur.execute("SELECT pg_notify(%s, %s || '/' || device_id) FROM unnest(%s::text[]) AS device_id;",
+                            (self.license_channel, tenant_id, changed))
+                deactivated.extend((tenant_id, device_id) for device_id in changed)
+            conn.commit()
+        return deactivated
+
+    def archive_idle(self, idle_seconds, limit):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            if not self._try_sweep_lock(cur):
+                conn.rollback()
+                return None
+            # Inactive devices hold no seat, so no tenant lock is needed.
+            cur.execute(
+                """WITH moved AS (
+                       DELETE FROM licenses WHERE (tenant_id, device_id) IN (
+                           SELECT tenant_id, device_id FROM licenses
+                           WHERE status = 'inactive'
+                             AND GREATEST(last_seen, activated_at) < NOW() - make_interval(secs => %s)
+                           LIMIT %s FOR UPDATE SKIP LOCKED)
+                       RETURNING tenant_id, device_id, username, hostname, activated_at, last_seen)
+                   INSERT INTO licenses_archive (tenant_id, device_id, username, hostname, activated_at, last_seen, revision)
+                   SELECT moved.*, pg_current_xact_id()::text::bigint FROM moved
+                   RETURNING tenant_id, device_id;""", (idle_seconds, limit))
+            archived = cur.fetchall()
+            if archived:
+                tenant_ids, device_ids = (list(column) for column in zip(*archived))
+                cur.execute("SELECT pg_notify(%s, t || '/' || d) FROM unnest(%s::text[], %s::text[]) AS x (t, d);",
+                            (self.license_channel, tenant_ids, device_ids))
+            conn.commit()
+        return archived
+
+    def record_events(self, events):
+        rows = io.StringIO()
+        writer = csv.writer(rows, lineterminator="\n")
+        for occurred_at, tenant_id, device_id, event in events:
+            writer.writerow((datetime.fromtimestamp(occurred_at, timezone.utc).isoformat(), tenant_id, device_id, event))
+        rows.seek(0)
+        times = [event[0] for event in events]
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute("SELECT teal_ensure_license_event_partitions(to_timestamp(%s), to_timestamp(%s));",
+                        (min(times), max(times)))
+            cur.copy_expert(f"COPY license_events ({', '.join(EVENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", rows)
+            conn.commit()
+
+    def prune_events(self, before):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute("SELECT teal_drop_license_event_partitions(to_timestamp(%s));", (before,))
+            dropped = cur.fetchone()[0]
+            conn.commit()
+        return dropped
+
+    def activity(self, tenant_id, days_since, hours_since):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute("SELECT 1 FROM tenants WHERE tenant_id = %s;", (tenant_id,))
+            if cur.fetchone() is None:
+                return None
+            # The occurred_at bounds let the planner skip every partition outside the window.
+            cur.execute(
+                """SELECT to_char(occurred_at AT TIME ZONE 'UTC', 'YYYY-MM-DD'), event, COUNT(*) FROM license_events
+                   WHERE tenant_id = %s AND occurred_at >= to_timestamp(%s) AND event <> %s GROUP BY 1, 2;""",
+                (tenant_id, days_since, HEARTBEAT))
+            daily = cur.fetchall()
+            cur.execute(
+                """SELECT to_char(occurred_at AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:00'), COUNT(DISTINCT device_id)
+                   FROM license_events WHERE tenant_id = %s AND occurred_at >= to_timestamp(%s) AND event = ANY(%s)
+                   GROUP BY 1;""", (tenant_id, hours_since, list(ACTIVE_DEVICE_EVENTS)))
+            return daily, cur.fetchall()
+
+    def all_devices(self, tenant_id):
+        with self._cursor() as (conn, cur):
+            cur.execute("SELECT total_licenses FROM tenants WHERE tenant_id = %s;", (tenant_id,))
+            tenant = cur.fetchone()
+            if not tenant:
+                return None
+            cur.execute(f"SELECT {DEVICE_COLUMNS} FROM licenses WHERE tenant_id = %s;", (tenant_id,))
+            return tenant['total_licenses'], cur.fetchall()
+
+    def device_page(self, tenant_id, query, limit):
+        sql, params = postgres_device_sql(tenant_id, query)
+        with self._cursor() as (conn, cur):
+            # Fetch one extra row to know whether there's a next page.
+            cur.execute(sql + " LIMIT %s;", params + [limit + 1])
+            devices = cur.fetchall()
+        next_cursor = None
+        if len(devices) > limit:
+            devices = devices[:limit]
+            next_cursor = encode_cursor(query.cursor_order, devices[-1]['_sort_key'])
+        for device in devices:
+            del device['_sort_key']
+        return devices, next_cursor
+
+    def revocations(self, tenant_id):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            cur.execute(
+                """SELECT device_id, EXTRACT(EPOCH FROM revoked_at)::float8 FROM license_revocations
+                   WHERE tenant_id = %s AND revoked_at >= NOW() - make_interval(secs => %s) ORDER BY revoked_at;""",
+                (tenant_id, self.revocation_max_age))
+            return cur.fetchall()
+
+    def latest_version(self):
+        with self._cursor() as (conn, cur):
+            cur.execute("SELECT version_number, download_url FROM versions WHERE is_latest = TRUE LIMIT 1;")
+            return cur.fetchone()
+
+    def versions(self):
+        with self._cursor() as (conn, cur):
+            cur.execute(
+                "SELECT version_number, to_char(release_date, 'YYYY-MM-DD HH24:MI:SS TZ') as release_date, "
+                "download_url, is_latest FROM versions ORDER BY release_date DESC;")
+            return cur.fetchall()
+
+    def set_latest_version(self, version_number, download_url):
+        with self._cursor(dict_rows=False) as (conn, cur):
+            try:
+                # Transaction: Set all other versions to not be the latest
+                cur.execute("UPDATE versions SET is_latest = FALSE;")
+                cur.execute(
+                    "UPDATE versions SET is_latest = TRUE, download_url = %s, release_date = NOW() "
+                    "WHERE version_number = %s;", (download_url, version_number))
+                added = cur.rowcount == 0
+                if added:
+                    cur.execute("INSERT INTO versions (version_number, download_url, is_latest) VALUES (%s, %s, TRUE);",
+                                (version_number, download_url))
+                # Delivered on commit, so other workers drop their cached record only once it's visible.
+                notify(cur, self.version_channel, version_number)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return added
+
+
+# --- SQLite ---
+
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%S UTC', 'now')"
+SQLITE_EPOCH = "((julianday('now') - 2440587.5) * 86400.0)"  # unix time with sub-second precision
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS tenants (
+    tenant_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    license_key TEXT NOT NULL UNIQUE,
+    total_licenses INTEGER NOT NULL CHECK (total_licenses >= 0),
+    active_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL DEFAULT ({SQLITE_NOW})
+);
+
+CREATE TABLE IF NOT EXISTS licenses (
+    tenant_id TEXT NOT NULL REFERENCES tenants (tenant_id),
+    device_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    hostname TEXT,
+    activated_at TEXT DEFAULT ({SQLITE_NOW}),
+    status TEXT NOT NULL DEFAULT 'active',
+    last_seen TEXT,
+    PRIMARY KEY (tenant_id, device_id)
+);
+CREATE INDEX IF NOT EXISTS licenses_status_device_idx ON licenses (tenant_id, status, device_id);
+CREATE INDEX IF NOT EXISTS licenses_activated_at_idx ON licenses (tenant_id, activated_at, device_id);
+CREATE INDEX IF NOT EXISTS licenses_username_device_idx ON licenses (tenant_id, username, device_id);
+CREATE INDEX IF NOT EXISTS licenses_hostname_device_idx ON licenses (tenant_id, COALESCE(hostname, ''), device_id);
+
+CREATE TABLE IF NOT EXISTS versions (
+    version_number TEXT PRIMARY KEY,
+    release_date TEXT DEFAULT ({SQLITE_NOW}),
+    download_url TEXT NOT NULL,
+    is_latest INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS versions_single_latest_idx ON versions (is_latest) WHERE is_latest;
+
+CREATE TABLE IF NOT EXISTS license_revocations (
+    tenant_id TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    revoked_at REAL NOT NULL DEFAULT {SQLITE_EPOCH},
+    PRIMARY KEY (tenant_id, device_id)
+);
+CREATE INDEX IF NOT EXISTS license_revocations_revoked_at_idx ON license_revocations (tenant_id, revoked_at);
+
+CREATE TABLE IF NOT EXISTS licenses_archive (
+    tenant_id TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    hostname TEXT,
+    activated_at TEXT,
+    status TEXT NOT NULL DEFAULT 'archived',
+    last_seen TEXT,
+    archived_at TEXT NOT NULL DEFAULT ({SQLITE_NOW}),
+    PRIMARY KEY (tenant_id, device_id, archived_at)
+);
+
+CREATE TABLE IF NOT EXISTS license_events (
+    occurred_at TEXT NOT NULL,
+    tenant_id TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS license_events_tenant_time_idx ON license_events (tenant_id, occurred_at);
+"""
+# Newest of last_seen and activated_at (NULL only if both are), like GREATEST() in Postgres.
+SQLITE_SEEN_AT = "COALESCE(MAX(last_seen, activated_at), last_seen, activated_at)"
+
+
+def sqlite_timestamp(epoch):
+    """Formats unix time like SQLITE_NOW, so stored timestamps compare correctly as text."""
+    return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(epoch))
+
+
+def glob_prefix(value):
+    """A GLOB pattern matching strings that start with value (GLOB is case-sensitive, like Postgres LIKE)."""
+    return "".join(f"[{c}]" if c in "*?[" else c for c in value) + "*"
+
+
+class SQLiteLicenseRepository(LicenseRepository):
+    """
+    One connection per thread (per process after a fork) on a WAL-mode database file; ":memory:"
+    uses a single connection shared under a lock instead, as each in-memory connection is its own database.
+    """
+
+    def __init__(self, path, revocation_max_age, busy_timeout=SQLITE_BUSY_TIMEOUT):
+        self.path = path
+        self.revocation_max_age = revocation_max_age
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._shared = self._connect() if path == ":memory:" else None
+        self._shared_lock = threading.RLock()
+
+    def _connect(self):
+        # isolation_level=None: no implicit transactions, every write below opens its own with BEGIN IMMEDIATE.
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL;")
+        # Durable at each checkpoint rather than each commit; WAL keeps the file consistent either way.
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute("PRAGMA foreign_keys = ON;")
+        return conn
+
+    @contextlib.contextmanager
+    def _connection(self):
+        if self._shared is not None:
+            with self._shared_lock:
+                yield self._shared
+            return
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        yield conn
+
+    @contextlib.contextmanager
+    def _write(self):
+        """
+        A write transaction. BEGIN IMMEDIATE takes the database's write lock up front (waiting up to
+        busy_timeout), so the reads that decide a seat change can't be invalidated before its writes.
+        """
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK;")
+                raise
+            conn.execute("COMMIT;")
+
+    def _query(self, sql, params=()):
+        with self._connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def setup(self, license_key, total_licenses, version_number, download_url):
+        with self._connection() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+            if "last_seen" not in {row['name'] for row in conn.execute("PRAGMA table_info(licenses);")}:
+                conn.execute("ALTER TABLE licenses ADD COLUMN last_seen TEXT;")
+        with self._write() as conn:
+            tenant_created = conn.execute(
+                "INSERT INTO tenants (tenant_id, name, license_key, total_licenses) VALUES (?, 'Default', ?, ?) "
+                "ON CONFLICT (tenant_id) DO NOTHING;", (DEFAULT_TENANT_ID, license_key, total_licenses)).rowcount == 1
+            version_created = conn.execute("SELECT COUNT(*) FROM versions;").fetchone()[0] == 0
+            if version_created:
+                conn.execute("INSERT INTO versions (version_number, download_url, is_latest) VALUES (?, ?, 1);",
+                             (version_number, download_url))
+        return tenant_created, version_created
+
+    def tenant_keys(self):
+        return {row['license_key']: row['tenant_id'] for row in self._query("SELECT license_key, tenant_id FROM tenants;")}
+
+    def tenant_for_key(self, license_key):
+        row = self._query("SELECT tenant_id FROM tenants WHERE license_key = ?;", (license_key,))
+        return row[0]['tenant_id'] if row else None
+
+    def tenants(self):
+        rows = self._query(
+            """SELECT tenant_id, name, total_licenses, active_count AS activated_count,
+                      total_licenses - active_count AS licenses_remaining, created_at
+               FROM tenants ORDER BY tenant_id;""")
+        return [dict(row) for row in rows]
+
+    def create_tenant(self, tenant_id, name, license_key, total_licenses):
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM tenants WHERE tenant_id = ?;", (tenant_id,)).fetchone():
+                return EXISTS
+            if conn.execute("SELECT 1 FROM tenants WHERE license_key = ?;", (license_key,)).fetchone():
+                return KEY_IN_USE
+            conn.execute("INSERT INTO tenants (tenant_id, name, license_key, total_licenses) VALUES (?, ?, ?, ?);",
+                         (tenant_id, name, license_key, total_licenses))
+        return CREATED
+
+    def update_tenant(self, tenant_id, name=None, license_key=None):
+        with self._write() as conn:
+            if license_key is not None and conn.execute(
+                    "SELECT 1 FROM tenants WHERE license_key = ? AND tenant_id <> ?;",
+                    (license_key, tenant_id)).fetchone():
+                return KEY_IN_USE
+            updated = conn.execute(
+                "UPDATE tenants SET name = COALESCE(?, name), license_key = COALESCE(?, license_key) "
+                "WHERE tenant_id = ?;", (name, license_key, tenant_id)).rowcount
+        return UPDATED if updated else NOT_FOUND
+
+    def activate(self, tenant_id, device_id, username, hostname):
+        # Lock-free fast path: most repeat activations are for devices that are already active.
+        if self.license_status(tenant_id, device_id) == 'active':
+            return 'already_active', None
+
+        with self._write() as conn:
+            tenant = conn.execute("SELECT total_licenses, active_count FROM tenants WHERE tenant_id = ?;",
+                                  (tenant_id,)).fetchone()
+            if tenant is None:
+                return 'unknown_tenant', None
+            device = conn.execute("SELECT status FROM licenses WHERE tenant_id = ? AND device_id = ?;",
+                                  (tenant_id, device_id)).fetchone()
+            if device is not None and device['status'] == 'active':
+                return 'already_active', None
+            if tenant['active_count'] >= tenant['total_licenses']:
+                return 'no_seats', max(tenant['total_licenses'] - tenant['active_count'], 0)
+
+            if device is None:
+                conn.execute("INSERT INTO licenses (tenant_id, device_id, username, hostname) VALUES (?, ?, ?, ?);",
+                             (tenant_id, device_id, username, hostname))
+            else:
+                conn.execute(
+                    f"""UPDATE licenses SET status = 'active', activated_at = {SQLITE_NOW}, username = ?, hostname = ?
+                        WHERE tenant_id = ? AND device_id = ?;""", (username, hostname, tenant_id, device_id))
+            conn.execute("UPDATE tenants SET active_count = active_count + 1 WHERE tenant_id = ?;", (tenant_id,))
+        result = 'activated' if device is None else 'reactivated'
+        return result, tenant['total_licenses'] - tenant['active_count'] - 1
+
+    def license_status(self, tenant_id, device_id):
+        row = self._query("SELECT status FROM licenses WHERE tenant_id = ? AND device_id = ?;", (tenant_id, device_id))
+        return row[0]['status'] if row else None
+
+    def license_statuses(self, tenant_id, device_ids):
+        device_ids = list(device_ids)
+        if not device_ids:
+            return {}
+        # json_each() binds the whole batch as one parameter (no limit on the number of placeholders).
+        rows = self._query(
+            """SELECT device_id, status FROM licenses
+               WHERE tenant_id = ? AND device_id IN (SELECT value FROM json_each(?));""",
+            (tenant_id, json.dumps(device_ids)))
+        return {row['device_id']: row['status'] for row in rows}
+
+    def set_device_status(self, tenant_id, device_id, new_status):
+        result = self.set_devices_status(tenant_id, [device_id], new_status)
+        return result[0][device_id] if result else NOT_FOUND
+
+    def set_devices_status(self, tenant_id, device_ids, new_status):
+        with self._write() as conn:
+            tenant = conn.execute("SELECT total_licenses, active_count FROM tenants WHERE tenant_id = ?;",
+                                  (tenant_id,)).fetchone()
+            if tenant is None:
+                return None
+            current = {row['device_id']: row['status'] for row in conn.execute(
+                """SELECT device_id, status FROM licenses
+                   WHERE tenant_id = ? AND device_id IN (SELECT value FROM json_each(?));""",
+                (tenant_id, json.dumps(list(device_ids))))}
+
+            outcomes, to_change = plan_status_changes(
+                device_ids, current, new_status, tenant['total_licenses'] - tenant['active_count'])
+            if to_change:
+                changed = json.dumps(to_change)
+                conn.execute(
+                    f"""UPDATE licenses SET status = ?1, last_seen = CASE WHEN ?1 = 'active' THEN {SQLITE_NOW} ELSE last_seen END
+                        WHERE tenant_id = ?2 AND device_id IN (SELECT value FROM json_each(?3));""",
+                    (new_status, tenant_id, changed))
+                delta = len(to_change) if new_status == 'active' else -len(to_change)
+                conn.execute("UPDATE tenants SET active_count = MAX(active_count + ?, 0) WHERE tenant_id = ?;",
+                             (delta, tenant_id))
+                if new_status != 'active':
+                    self._record_revocations(conn, tenant_id, changed)
+        active_count = tenant['active_count'] + (len(to_change) if new_status == 'active' else -len(to_change))
+        return outcomes, tenant['total_licenses'] - active_count
+
+    def seat_summary(self, tenant_id):
+        row = self._query("SELECT total_licenses, active_count FROM tenants WHERE tenant_id = ?;", (tenant_id,))
+        return tuple(row[0]) if row else None
+
+    def set_total_licenses(self, tenant_id, total):
+        with self._write() as conn:
+            return conn.execute("UPDATE tenants SET total_licenses = ? WHERE tenant_id = ?;",
+                                (total, tenant_id)).rowcount == 1
+
+    def reconcile_active_counts(self):
+        with self._write() as conn:
+            old = conn.execute("SELECT tenant_id, active_count FROM tenants ORDER BY tenant_id;").fetchall()
+            conn.execute(
+                """UPDATE tenants SET active_count = (
+                       SELECT COUNT(*) FROM licenses l WHERE l.tenant_id = tenants.tenant_id AND l.status = 'active');""")
+            new = dict(conn.execute("SELECT tenant_id, active_count FROM tenants;").fetchall())
+        return [(row['tenant_id'], row['active_count'], new[row['tenant_id']]) for row in old]
+
+    def _record_revocations(self, conn, tenant_id, device_ids_json):
+        conn.execute(
+            f"""INSERT INTO license_revocations (tenant_id, device_id) SELECT ?, value FROM json_each(?)
+                WHERE true ON CONFLICT (tenant_id, device_id) DO UPDATE SET revoked_at = {SQLITE_EPOCH};""",
+            (tenant_id, device_ids_json))
+        conn.execute(f"DELETE FROM license_revocations WHERE revoked_at < {SQLITE_EPOCH} - ?;",
+                     (self.revocation_max_age,))
+
+    def touch_devices(self, entries, min_interval=0):
+        with self._write() as conn:
+            return conn.executemany(
+                """UPDATE licenses SET last_seen = ? WHERE tenant_id = ? AND device_id = ?
+                   AND (last_seen IS NULL OR last_seen < ?);""",
+                [(sqlite_timestamp(seen_at), tenant_id, device_id, sqlite_timestamp(seen_at - min_interval))
+                 for tenant_id, device_id, seen_at in entries]).rowcount
+
+    def deactivate_idle(self, idle_seconds, limit):
+        cutoff = sqlite_timestamp(time.time() - idle_seconds)
+        # BEGIN IMMEDIATE already keeps other sweepers (and seat changes) out for the length of one batch.
+        with self._write() as conn:
+            candidates = {}
+            for row in conn.execute(
+                    f"SELECT tenant_id, device_id FROM licenses WHERE status = 'active' AND {SQLITE_SEEN_AT} < ? LIMIT ?;",
+                    (cutoff, limit)):
+                candidates.setdefault(row['tenant_id'], []).append(row['device_id'])
+            for tenant_id, device_ids in candidates.items():
+                changed = json.dumps(device_ids)
+                conn.execute(
+                    """UPDATE licenses SET status = 'inactive'
+                       WHERE tenant_id = ? AND device_id IN (SELECT value FROM json_each(?));""", (tenant_id, changed))
+                conn.execute("UPDATE tenants SET active_count = MAX(active_count - ?, 0) WHERE tenant_id = ?;",
+                             (len(device_ids), tenant_id))
+                self._record_revocations(conn, tenant_id, changed)
+        return [(tenant_id, device_id) for tenant_id, device_ids in candidates.items() for device_id in device_ids]
+
+    def archive_idle(self, idle_seconds, limit):
+        cutoff = sqlite_timestamp(time.time() - idle_seconds)
+        with self._write() as conn:
+            rows = conn.execute(
+                f"""SELECT rowid, tenant_id, device_id FROM licenses
+                    WHERE status = 'inactive' AND {SQLITE_SEEN_AT} < ? LIMIT ?;""", (cutoff, limit)).fetchall()
+            rowids = json.dumps([row['rowid'] for row in rows])
+            conn.execute(
+                """INSERT INTO licenses_archive (tenant_id, device_id, username, hostname, activated_at, last_seen)
+                   SELECT tenant_id, device_id, username, hostname, activated_at, last_seen FROM licenses
+                   WHERE rowid IN (SELECT value FROM json_each(?));""", (rowids,))
+            conn.execute("DELETE FROM licenses WHERE rowid IN (SELECT value FROM json_each(?));", (rowids,))
+        return [(row['tenant_id'], row['device_id']) for row in rows]
+
+    def record_events(self, events):
+        with self._write() as conn:
+            conn.executemany(
+                f"INSERT INTO license_events ({', '.join(EVENT_COLUMNS)}) VALUES (?, ?, ?, ?);",
+                [(sqlite_timestamp(occurred_at), tenant_id, device_id, event)
+                 for occurred_at, tenant_id, device_id, event in events])
+
+    def prune_events(self, before):
+        with self._write() as conn:
+            return conn.execute("DELETE FROM license_events WHERE occurred_at < ?;", (sqlite_timestamp(before),)).rowcount
+
+    def activity(self, tenant_id, days_since, hours_since):
+        with self._connection() as conn:
+            if conn.execute("SELECT 1 FROM tenants WHERE tenant_id = ?;", (tenant_id,)).fetchone() is None:
+                return None
+            daily = conn.execute(
+                """SELECT substr(occurred_at, 1, 10), event, COUNT(*) FROM license_events
+                   WHERE tenant_id = ? AND occurred_at >= ? AND event <> ? GROUP BY 1, 2;""",
+                (tenant_id, sqlite_timestamp(days_since), HEARTBEAT)).fetchall()
+            hourly = conn.execute(
+                f"""SELECT substr(occurred_at, 1, 13) || ':00', COUNT(DISTINCT device_id) FROM license_events
+                    WHERE tenant_id = ? AND occurred_at >= ? AND event IN ({', '.join('?' * len(ACTIVE_DEVICE_EVENTS))})
+                    GROUP BY 1;""", (tenant_id, sqlite_timestamp(hours_since), *ACTIVE_DEVICE_EVENTS)).fetchall()
+        return [tuple(row) for row in daily], [tuple(row) for row in hourly]
+
+    def all_devices(self, tenant_id):
+        # Both reads in one snapshot, like the Postgres version's single transaction.
+        with self._connection() as conn:
+            conn.execute("BEGIN;")
+            try:
+                tenant = conn.execute("SELECT total_licenses FROM tenants WHERE tenant_id = ?;", (tenant_id,)).fetchone()
+                devices = conn.execute(
+                    "SELECT device_id, username, hostname, status, activated_at FROM licenses WHERE tenant_id = ?;",
+                    (tenant_id,)).fetchall()
+            finally:
+                conn.execute("COMMIT;")
+        if not tenant:
+            return None
+        return tenant['total_licenses'], [dict(d) for d in devices]
+
+    def device_page(self, tenant_id, query, limit):
+        sort_exprs = DEVICE_ORDERINGS[query.order]
+        where, params = ["tenant_id = ?"], [tenant_id]
+        if query.status:
+            where.append("status = ?")
+            params.append(query.status)
+        for column in ("username", "hostname"):
+            value = getattr(query, column)
+            if value:
+                where.append(f"{column} GLOB ?")
+                params.append(glob_prefix(value))
+        if query.after is not None:
+            placeholders = ", ".join("?" for _ in sort_exprs)
+            where.append(f"({', '.join(sort_exprs)}) {'>' if query.direction == 'asc' else '<'} ({placeholders})")
+            params.extend(query.after)
+
+        sort_key = ", ".join(f"{expr} AS _k{i}" for i, expr in enumerate(sort_exprs))
+        sql = (f"SELECT device_id, username, hostname, status, activated_at, {sort_key} FROM licenses"
+               + " WHERE " + " AND ".join(where)
+               + " ORDER BY " + ", ".join(f"{expr} {query.direction.upper()}" for expr in sort_exprs)
+               + " LIMIT ?;")
+        rows = self._query(sql, params + [limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(query.cursor_order, [rows[-1][f"_k{i}"] for i in range(len(sort_exprs))])
+        return [{k: row[k] for k in ("device_id", "username", "hostname", "status", "activated_at")}
+                for row in rows], next_cursor
+
+    def revocations(self, tenant_id):
+        rows = self._query(
+            f"""SELECT device_id, revoked_at FROM license_revocations
+                WHERE tenant_id = ? AND revoked_at >= {SQLITE_EPOCH} - ? ORDER BY revoked_at;""",
+            (tenant_id, self.revocation_max_age))
+        return [tuple(row) for row in rows]
+
+    def latest_version(self):
+        row = self._query("SELECT version_number, download_url FROM versions WHERE is_latest LIMIT 1;")
+        return dict(row[0]) if row else None
+
+    def versions(self):
+        rows = self._query(
+            "SELECT version_number, release_date, download_url, is_latest FROM versions ORDER BY release_date DESC;")
+        return [dict(row, is_latest=bool(row['is_latest'])) for row in rows]
+
+    def set_latest_version(self, version_number, download_url):
+        with self._write() as conn:
+            conn.execute("UPDATE versions SET is_latest = 0;")
+            added = conn.execute(
+                f"UPDATE versions SET is_latest = 1, download_url = ?, release_date = {SQLITE_NOW} "
+                f"WHERE version_number = ?;", (download_url, version_number)).rowcount == 0
+            if added:
+                conn.execute("INSERT INTO versions (version_number, download_url, is_latest) VALUES (?, ?, 1);",
+                             (version_number, download_url))
+        return added
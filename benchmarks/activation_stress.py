@@ -0,0 +1,96 @@
+"""
+Concurrency stress test for license activation.
+
+Fires many simultaneous /activate_license requests at the last few free seats and
+checks that exactly that many succeed and that the tenant's active_count still matches
+its licenses afterwards. tests/test_seat_concurrency.py checks the same invariant on every
+test run (when DATABASE_URL is set); this script is for hammering it at larger scale.
+
+Run it against a throwaway database only -- it changes total_licenses and inserts
+(then deletes) its own devices:
+
+    DATABASE_URL=postgresql://localhost/teal_stress python benchmarks/activation_stress.py --seats 5 --clients 200
+"""
+import os
+import sys
+import uuid
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seats", type=int, default=5, help="free seats to race for")
+    parser.add_argument("--clients", type=int, default=200, help="concurrent activations")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--tenant", default="default", help="tenant whose seats are raced for")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DB_POOL_MAX_SIZE", str(min(args.clients, 50)))
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # all clients share one address
+    import Teal_Backend as backend
+    backend.setup_database()
+
+    app = backend.app
+    failures = 0
+    for round_no in range(1, args.rounds + 1):
+        prefix = f"stress-{uuid.uuid4().hex[:8]}-"
+        conn = backend.get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT total_licenses, license_key FROM tenants WHERE tenant_id = %s;", (args.tenant,))
+            original_total, license_key = cur.fetchone()
+            active = {tenant: new for tenant, old, new in backend.reconcile_active_counts()}.get(args.tenant, 0)
+            cur.execute("UPDATE tenants SET total_licenses = %s WHERE tenant_id = %s;",
+                        (active + args.seats, args.tenant))
+            conn.commit()
+        finally:
+            cur.close()
+            backend.release_db_connection(conn)
+
+        barrier = threading.Barrier(args.clients)
+
+        def activate(i):
+            client = app.test_client()
+            payload = {"license_key": license_key, "device_id": f"{prefix}{i}", "username": "stress", "hostname": "stress"}
+            barrier.wait()
+            return client.post("/activate_license", json=payload).status_code
+
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            codes = list(pool.map(activate, range(args.clients)))
+
+        conn = backend.get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""SELECT COUNT(*) FROM licenses
+                           WHERE tenant_id = %s AND device_id LIKE %s AND status = 'active';""",
+                        (args.tenant, prefix + "%"))
+            activated = cur.fetchone()[0]
+            cur.execute("SELECT active_count FROM tenants WHERE tenant_id = %s;", (args.tenant,))
+            counter = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM licenses WHERE tenant_id = %s AND status = 'active';", (args.tenant,))
+            actual = cur.fetchone()[0]
+
+            cur.execute("SELECT 1 FROM tenants WHERE tenant_id = %s FOR UPDATE;", (args.tenant,))
+            cur.execute("DELETE FROM licenses WHERE tenant_id = %s AND device_id LIKE %s;", (args.tenant, prefix + "%"))
+            cur.execute("""UPDATE tenants SET total_licenses = %s, active_count = active_count - %s
+                           WHERE tenant_id = %s;""", (original_total, activated, args.tenant))
+            conn.commit()
+        finally:
+            cur.close()
+            backend.release_db_connection(conn)
+
+        ok = codes.count(200) == args.seats and activated == args.seats and counter == actual
+        failures += not ok
+        print(f"round {round_no}: {codes.count(200)} succeeded, {codes.count(403)} rejected, "
+              f"{len(codes) - codes.count(200) - codes.count(403)} errors; "
+              f"counter={counter} actual={actual} -> {'OK' if ok else 'SEAT LIMIT VIOLATED'}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Response-encoding benchmark.
+
+Compares, in one process:
+  - encoders:     jsonify() on Flask's stock provider vs FastJSONProvider, for a constant error body
+                  and a view_status-sized payload, and StaticJSON (the precomputed bytes)
+  - view_status:  the legacy full payload built in Python (RealDictCursor rows -> dict -> jsonify,
+                  with each encoder) vs built by Postgres and streamed through COPY untouched;
+                  reports time to the last byte and peak Python memory (tracemalloc)
+
+The view_status runs seed a "bench" tenant with --devices devices, so point DATABASE_URL at a
+throwaway database; without it only the encoder runs happen.
+
+    DATABASE_URL=postgresql://localhost/teal_bench python benchmarks/json_responses.py --devices 50000
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import statistics
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+import Teal_Responses  # noqa: E402
+
+BENCH_TENANT = "bench"
+
+
+def timed(fn, runs):
+    """Median and best wall time of fn() over runs calls, in milliseconds."""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": statistics.median(samples), "min_ms": min(samples)}
+
+
+def peak_memory(fn):
+    """Peak Python allocation during one fn() call, in MiB."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def json_provider(app, provider_class):
+    saved = app.json
+    app.json = provider_class(app)
+    try:
+        yield
+    finally:
+        app.json = saved
+
+
+def sample_payload(devices):
+    rows = {f"device-{i:07d}": {"activated_at": "2026-01-01 00:00:00 UTC", "device_id": f"device-{i:07d}",
+                                "hostname": f"host-{i}", "status": "active" if i % 10 else "inactive",
+                                "username": f"user{i % 997}"} for i in range(devices)}
+    active = sum(1 for row in rows.values() if row["status"] == "active")
+    return {"total_licenses": devices, "activated_count": active, "licenses_remaining": devices - active,
+            "activated_devices": rows}
+
+
+def bench_encoders(tb, devices, runs):
+    from flask import jsonify
+    error = {"success": False, "message": "License not found for this device."}
+    payload = sample_payload(devices)
+    results = {}
+    with tb.app.test_request_context():
+        for label, provider in (("stdlib", DefaultJSONProvider), ("fast", Teal_Responses.FastJSONProvider)):
+            with json_provider(tb.app, provider):
+                small = timed(lambda: [jsonify(error).get_data() for _ in range(1000)], runs)
+                large = timed(lambda: jsonify(payload).get_data(), runs)
+            results[f"jsonify_error_x1000_{label}"] = small
+            results[f"jsonify_view_status_{label}"] = large
+        results["static_error_x1000"] = timed(lambda: [tb.LICENSE_NOT_FOUND().get_data() for _ in range(1000)], runs)
+    return results
+
+
+def seed_devices(tb, devices):
+    conn = tb.get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM licenses WHERE tenant_id = %s;", (BENCH_TENANT,))
+        cur.execute(
+            """INSERT INTO tenants (tenant_id, name, license_key, total_licenses) VALUES (%s, 'Bench', 'bench-key', %s)
+               ON CONFLICT (tenant_id) DO UPDATE SET total_licenses = EXCLUDED.total_licenses;""",
+            (BENCH_TENANT, devices))
+        cur.execute(
+            """INSERT INTO licenses (tenant_id, device_id, username, hostname, status)
+               SELECT %s, 'device-' || lpad(i::text, 7, '0'), 'user' || (i %% 997), 'host-' || i,
+                      CASE WHEN i %% 10 = 0 THEN 'inactive' ELSE 'active' END
+               FROM generate_series(1, %s) AS i;""", (BENCH_TENANT, devices))
+        cur.execute("UPDATE tenants SET active_count = (SELECT COUNT(*) FROM licenses WHERE tenant_id = %s "
+                    "AND status = 'active') WHERE tenant_id = %s;", (BENCH_TENANT, BENCH_TENANT))
+        conn.commit()
+        cur.execute("ANALYZE licenses;")
+        conn.commit()
+    finally:
+        tb.release_db_connection(conn)
+
+
+def bench_view_status(tb, runs):
+    from flask import jsonify
+    repository = tb.get_repository()
+
+    def python_path():
+        total, devices = repository.all_devices(BENCH_TENANT)
+        active = sum(1 for d in devices if d['status'] == 'active')
+        return jsonify({"total_licenses": total, "activated_count": active, "licenses_remaining": total - active,
+                        "activated_devices": {d['device_id']: d for d in devices}}).get_data()
+
+    def postgres_path():
+        # Consumed chunk by chunk, the way the WSGI server sends it.
+        sql, params = tb.postgres_view_status_sql(BENCH_TENANT)
+        chunks = tb.stream_copy(f"COPY ({sql}) TO STDOUT WITH ({tb.JSON_LINES_COPY_OPTIONS})", params)
+        return sum(len(chunk) for chunk in Teal_Responses.join_json_lines(chunks))
+
+    results = {}
+    with tb.app.test_request_context():
+        with json_provider(tb.app, Teal_Responses.FastJSONProvider):
+            body = python_path()
+        assert len(body) == postgres_path(), "the two view_status paths should produce the same bytes"
+        for label, provider in (("python_stdlib", DefaultJSONProvider), ("python_fast", Teal_Responses.FastJSONProvider)):
+            with json_provider(tb.app, provider):
+                results[label] = {**timed(python_path, runs), "peak_mib": peak_memory(python_path)}
+        results["postgres_stream"] = {**timed(postgres_path, runs), "peak_mib": peak_memory(postgres_path)}
+    results["body_bytes"] = len(body)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=50000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import Teal_Backend as tb
+    results = {"devices": args.devices, "encoders": bench_encoders(tb, args.devices, args.runs)}
+    for label, r in results["encoders"].items():
+        print(f"{label:>32}: median {r['median_ms']:9.2f} ms")
+
+    if os.environ.get("DATABASE_URL"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            tb.setup_database()
+        seed_devices(tb, args.devices)
+        results["view_status"] = bench_view_status(tb, args.runs)
+        print(f"view_status ({args.devices} devices, {results['view_status']['body_bytes'] / 2**20:.1f} MiB body):")
+        for label in ("python_stdlib", "python_fast", "postgres_stream"):
+            r = results["view_status"][label]
+            print(f"{label:>32}: median {r['median_ms']:9.2f} ms, peak Python memory {r['peak_mib']:7.1f} MiB")
+    else:
+        print("DATABASE_URL not set: skipping the view_status comparison.")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+"""
+Load-test harness for the licensing API.
+
+Starts Teal_Backend under Gunicorn against a throwaway Postgres, seeds it, and drives
+realistic traffic mixes:
+
+  heartbeat          POST /check_license for seeded (and some unknown) devices
+  app_version        GET /app_version, mostly revalidating with If-None-Match
+  activation_burst   every client races for the last few free seats at once
+  view_status        GET /admin/view_status (full legacy payload and keyset pages) on the seeded table
+  mixed              heartbeats + version polls + occasional activations, in production-like ratios
+
+Per scenario it reports p50/p95/p99 latency and throughput per endpoint plus the number of
+database statements executed (from pg_stat_statements when it's loaded, otherwise committed
+transactions from pg_stat_database), and writes everything to JSON so runs can be compared:
+
+    # Against an existing throwaway database:
+    DATABASE_URL=postgresql://localhost/teal_bench python benchmarks/load_test.py --output before.json
+    # Or let the harness create a temporary cluster with initdb/pg_ctl (must not run as root):
+    python benchmarks/load_test.py --initdb --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import random
+import shutil
+import signal
+import argparse
+import tempfile
+import datetime
+import threading
+import subprocess
+from collections import defaultdict
+import psycopg2
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_KEY = "LoadTestAdminKey"
+MASTER_KEY = "LoadTestMasterKey"
+
+
+# --- Throwaway Postgres ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TemporaryPostgres:
+    """A containerless Postgres cluster in a temp directory, created with initdb and removed on stop()."""
+
+    def __init__(self, pg_bin=None):
+        self.pg_bin = pg_bin
+        self.data_dir = tempfile.mkdtemp(prefix="teal-bench-pg-")
+        self.port = free_port()
+
+    def _tool(self, name):
+        path = os.path.join(self.pg_bin, name) if self.pg_bin else shutil.which(name)
+        if not path:
+            raise RuntimeError(f"{name} not found; pass --pg-bin pointing at your Postgres bin directory")
+        return path
+
+    def start(self):
+        subprocess.run([self._tool("initdb"), "-D", self.data_dir, "-U", "postgres", "-A", "trust"],
+                       check=True, capture_output=True)
+        options = (f"-p {self.port} -k {self.data_dir} -c listen_addresses=127.0.0.1 "
+                   f"-c shared_preload_libraries=pg_stat_statements -c max_connections=300")
+        subprocess.run([self._tool("pg_ctl"), "-D", self.data_dir, "-o", options, "-w", "-l",
+                        os.path.join(self.data_dir, "server.log"), "start"], check=True, capture_output=True)
+        conn = psycopg2.connect(host="127.0.0.1", port=self.port, user="postgres", dbname="postgres")
+        conn.autocommit = True
+        conn.cursor().execute("CREATE DATABASE teal_bench;")
+        conn.close()
+        return f"postgresql://postgres@127.0.0.1:{self.port}/teal_bench"
+
+    def stop(self):
+        subprocess.run([self._tool("pg_ctl"), "-D", self.data_dir, "-m", "fast", "stop"], capture_output=True)
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+# --- Database setup & counters ---
+
+def prepare_database(database_url, seed_devices):
+    env = dict(os.environ, DATABASE_URL=database_url, FLASK_MASTER_KEY=MASTER_KEY)
+    subprocess.run([sys.executable, "-m", "flask", "--app", "Teal_Backend", "init-db"],
+                   cwd=REPO_ROOT, env=env, check=True, capture_output=True)
+
+    conn = psycopg2.connect(database_url)
+    cur = conn.cursor()
+    cur.execute("UPDATE tenants SET license_key = %s WHERE tenant_id = 'default';", (MASTER_KEY,))
+    cur.execute("DELETE FROM licenses WHERE device_id LIKE 'bench-%';")
+    # Three quarters active, the rest deactivated, spread over the last year.
+    cur.execute("""
+        INSERT INTO licenses (tenant_id, device_id, username, hostname, status, activated_at)
+        SELECT 'default', 'bench-' || g, 'user' || (g %% 500), 'host-' || g,
+               CASE WHEN g %% 4 = 0 THEN 'inactive' ELSE 'active' END,
+               NOW() - (g %% 365) * INTERVAL '1 day'
+        FROM generate_series(1, %s) AS g;
+    """, (seed_devices,))
+    conn.commit()
+    cur.execute("SELECT device_id FROM licenses WHERE device_id LIKE 'bench-%';")
+    device_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("ANALYZE licenses;")
+    conn.commit()
+    conn.close()
+    reset_free_seats(database_url, 0)
+    return device_ids
+
+
+def reset_free_seats(database_url, free):
+    """Reconciles the seat counter and sets total_licenses so exactly `free` seats remain."""
+    conn = psycopg2.connect(database_url)
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM tenants WHERE tenant_id = 'default' FOR UPDATE;")
+    cur.execute("SELECT COUNT(*) FROM licenses WHERE tenant_id = 'default' AND status = 'active';")
+    active = cur.fetchone()[0]
+    cur.execute("UPDATE tenants SET active_count = %s, total_licenses = %s WHERE tenant_id = 'default';",
+                (active, active + free))
+    conn.commit()
+    conn.close()
+
+
+class QueryCounter:
+    """Counts statements executed by the server between start() and stop()."""
+
+    def __init__(self, database_url):
+        self.database_url = database_url
+        self.source = None
+
+    def _read(self):
+        conn = psycopg2.connect(self.database_url)
+        conn.autocommit = True
+        cur = conn.cursor()
+        try:
+            if self.source in (None, "pg_stat_statements"):
+                try:
+                    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements;")
+                    cur.execute("SELECT COALESCE(SUM(calls), 0) FROM pg_stat_statements "
+                                "WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database());")
+                    self.source = "pg_stat_statements"
+                    return int(cur.fetchone()[0])
+                except psycopg2.Error:
+                    self.source = "pg_stat_database.xact"
+            cur.execute("SELECT pg_stat_clear_snapshot();")
+            cur.execute("SELECT xact_commit + xact_rollback FROM pg_stat_database WHERE datname = current_database();")
+            return int(cur.fetchone()[0])
+        finally:
+            conn.close()
+
+    def start(self):
+        self._start = self._read()
+
+    def stop(self):
+        # pg_stat_database is only flushed periodically by backends.
+        if self.source != "pg_stat_statements":
+            time.sleep(1.0)
+        return self._read() - self._start
+
+
+# --- Gunicorn ---
+
+class GunicornServer:
+    def __init__(self, database_url, workers, threads, extra_env=None):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        env = dict(os.environ, DATABASE_URL=database_url, FLASK_ADMIN_KEY=ADMIN_KEY, FLASK_MASTER_KEY=MASTER_KEY)
+        # Every simulated client shares 127.0.0.1, so the per-IP limiter would cap the run; opt back in via env.
+        env.setdefault("RATE_LIMIT_ENABLED", "0")
+        env.update(extra_env or {})
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--threads", str(threads),
+             "--bind", f"127.0.0.1:{self.port}", "--log-level", "warning", "Teal_Backend:create_app()"],
+            cwd=REPO_ROOT, env=env)
+
+    def wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("Gunicorn exited during startup")
+            try:
+                if requests.get(self.base_url + "/health", timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("Gunicorn did not become ready")
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+# --- Load generation ---
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile.
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, label, seconds, ok):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for label, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            endpoints[label] = {
+                "requests": len(values),
+                "errors": self.errors[label],
+                "throughput_rps": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "mean_ms": sum(values) / len(values) * 1000,
+            }
+        return endpoints
+
+
+def timed(session, recorder, label, method, url, expected=(200,), **kwargs):
+    started = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=30, **kwargs)
+        ok = response.status_code in expected
+    except requests.RequestException:
+        response, ok = None, False
+    recorder.record(label, time.perf_counter() - started, ok)
+    return response
+
+
+def run_clients(concurrency, duration, make_request):
+    """Runs `make_request(session, recorder, rng)` in a loop on `concurrency` threads for `duration` seconds."""
+    recorder = Recorder()
+    stop_at = time.monotonic() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        with requests.Session() as session:
+            while time.monotonic() < stop_at:
+                make_request(session, recorder, rng)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder, time.monotonic() - started
+
+
+def scenario_heartbeat(ctx):
+    url = ctx["base_url"] + "/check_license"
+    devices = ctx["device_ids"]
+
+    def make_request(session, recorder, rng):
+        # ~5% of heartbeats come from devices the server has never seen.
+        device_id = rng.choice(devices) if rng.random() > 0.05 else f"unknown-{rng.randrange(10 ** 6)}"
+        timed(session, recorder, "POST /check_license", "POST", url, expected=(200, 403), json={"device_id": device_id})
+
+    return run_clients(ctx["concurrency"], ctx["duration"], make_request)
+
+
+def scenario_app_version(ctx):
+    url = ctx["base_url"] + "/app_version"
+    etag = requests.get(url).headers.get("ETag")
+
+    def make_request(session, recorder, rng):
+        # Most launches revalidate a cached copy; first launches don't have one.
+        headers = {"If-None-Match": etag} if etag and rng.random() < 0.8 else {}
+        timed(session, recorder, "GET /app_version", "GET", url, expected=(200, 304), headers=headers)
+
+    return run_clients(ctx["concurrency"], ctx["duration"], make_request)
+
+
+def scenario_activation_burst(ctx):
+    """All clients fire at once for `seats` free seats; repeated for `rounds` rounds."""
+    url = ctx["base_url"] + "/activate_license"
+    recorder = Recorder()
+    started = time.monotonic()
+    oversold = 0
+    for round_no in range(ctx["burst_rounds"]):
+        reset_free_seats(ctx["database_url"], ctx["burst_seats"])
+        barrier = threading.Barrier(ctx["concurrency"])
+        successes = []
+
+        def client(i):
+            payload = {"license_key": MASTER_KEY, "device_id": f"burst-{ctx['run_id']}-{round_no}-{i}",
+                       "username": "burst", "hostname": f"burst-{i}"}
+            with requests.Session() as session:
+                barrier.wait()
+                response = timed(session, recorder, "POST /activate_license", "POST", url,
+                                 expected=(200, 403), json=payload)
+                if response is not None and response.status_code == 200:
+                    successes.append(i)
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(ctx["concurrency"])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        oversold += max(0, len(successes) - ctx["burst_seats"])
+    reset_free_seats(ctx["database_url"], 0)
+    ctx["notes"]["oversold_seats"] = oversold
+    return recorder, time.monotonic() - started
+
+
+def scenario_view_status(ctx):
+    base = ctx["base_url"] + "/admin/view_status"
+
+    def make_request(session, recorder, rng):
+        if rng.random() < 0.2:
+            timed(session, recorder, "GET /admin/view_status (full)", "GET", base, params={"admin_key": ADMIN_KEY})
+        else:
+            timed(session, recorder, "GET /admin/view_status (page)", "GET", base,
+                  params={"admin_key": ADMIN_KEY, "limit": 500, "status": "active"})
+
+    # Full listings are heavy; keep this scenario's concurrency modest.
+    return run_clients(max(1, ctx["concurrency"] // 8), ctx["duration"], make_request)
+
+
+def scenario_mixed(ctx):
+    base = ctx["base_url"]
+    devices = ctx["device_ids"]
+    etag = requests.get(base + "/app_version").headers.get("ETag")
+    counter = iter(range(10 ** 9))
+
+    def make_request(session, recorder, rng):
+        roll = rng.random()
+        if roll < 0.85:
+            timed(session, recorder, "POST /check_license", "POST", base + "/check_license",
+                  expected=(200, 403), json={"device_id": rng.choice(devices)})
+        elif roll < 0.98:
+            timed(session, recorder, "GET /app_version", "GET", base + "/app_version",
+                  expected=(200, 304), headers={"If-None-Match": etag} if etag else {})
+        else:
+            timed(session, recorder, "POST /activate_license", "POST", base + "/activate_license",
+                  expected=(200, 403), json={"license_key": MASTER_KEY, "username": "mixed", "hostname": "mixed",
+                                             "device_id": f"mixed-{ctx['run_id']}-{next(counter)}"})
+
+    return run_clients(ctx["concurrency"], ctx["duration"], make_request)
+
+
+SCENARIOS = {
+    "heartbeat": scenario_heartbeat,
+    "app_version": scenario_app_version,
+    "activation_burst": scenario_activation_burst,
+    "view_status": scenario_view_status,
+    "mixed": scenario_mixed,
+}
+
+
+# --- Reporting ---
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(results, baseline=None):
+    for name, scenario in results["scenarios"].items():
+        db = scenario["db"]
+        print(f"\n== {name} ({scenario['elapsed_s']:.1f}s, {db['statements']} DB statements via {db['source']}, "
+              f"{db['statements_per_request']:.2f}/request)")
+        for label, stats in scenario["endpoints"].items():
+            line = (f"  {label:<34} {stats['requests']:>7} req {stats['errors']:>5} err "
+                    f"{stats['throughput_rps']:>9.1f} rps  p50 {stats['p50_ms']:>7.2f}  p95 {stats['p95_ms']:>7.2f}  "
+                    f"p99 {stats['p99_ms']:>7.2f} ms")
+            old = (baseline or {}).get("scenarios", {}).get(name, {}).get("endpoints", {}).get(label)
+            if old and old["p95_ms"] and old["throughput_rps"]:
+                line += (f"   [p95 {100 * (stats['p95_ms'] / old['p95_ms'] - 1):+.0f}%, "
+                         f"rps {100 * (stats['throughput_rps'] / old['throughput_rps'] - 1):+.0f}%]")
+            print(line)
+        for key, value in scenario.get("notes", {}).items():
+            print(f"  {key}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"),
+                        help="throwaway database to use (default: $DATABASE_URL)")
+    parser.add_argument("--initdb", action="store_true", help="create a temporary Postgres cluster instead")
+    parser.add_argument("--pg-bin", help="directory containing initdb/pg_ctl (default: $PATH)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset to run")
+    parser.add_argument("--workers", type=int, default=4, help="Gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="Gunicorn threads per worker")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent client threads")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per timed scenario")
+    parser.add_argument("--seed-devices", type=int, default=50000)
+    parser.add_argument("--burst-seats", type=int, default=5)
+    parser.add_argument("--burst-rounds", type=int, default=10)
+    parser.add_argument("--output", help="write JSON results here (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier JSON results to diff against")
+    args = parser.parse_args()
+
+    selected = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in selected if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    if not args.initdb and not args.database_url:
+        parser.error("pass --initdb or point --database-url/DATABASE_URL at a throwaway database")
+
+    postgres = TemporaryPostgres(args.pg_bin) if args.initdb else None
+    server = None
+    try:
+        database_url = postgres.start() if postgres else args.database_url
+        print(f"Seeding {args.seed_devices} devices...")
+        device_ids = prepare_database(database_url, args.seed_devices)
+
+        server = GunicornServer(database_url, args.workers, args.threads)
+        server.wait_ready()
+
+        results = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "params": {k: v for k, v in vars(args).items() if k not in ("database_url", "compare", "output")},
+            },
+            "scenarios": {},
+        }
+        counter = QueryCounter(database_url)
+        for name in selected:
+            print(f"Running {name}...")
+            ctx = {"base_url": server.base_url, "database_url": database_url, "device_ids": device_ids,
+                   "concurrency": args.concurrency, "duration": args.duration, "burst_seats": args.burst_seats,
+                   "burst_rounds": args.burst_rounds, "run_id": int(time.time()), "notes": {}}
+            counter.start()
+            recorder, elapsed = SCENARIOS[name](ctx)
+            statements = counter.stop()
+            endpoints = recorder.summary(elapsed)
+            total_requests = sum(e["requests"] for e in endpoints.values())
+            results["scenarios"][name] = {
+                "elapsed_s": elapsed,
+                "endpoints": endpoints,
+                "db": {"source": counter.source, "statements": statements,
+                       "statements_per_request": statements / total_requests if total_requests else 0.0},
+                "notes": ctx["notes"],
+            }
+    finally:
+        if server:
+            server.stop()
+        if postgres:
+            postgres.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results",
+        f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['meta']['commit'] or 'nocommit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
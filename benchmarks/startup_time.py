@@ -0,0 +1,62 @@
+"""
+Worker boot-time benchmark.
+
+Measures, in fresh interpreter processes, how long it takes before a worker could serve:
+  - lazy:   import Teal_Backend + create_app()           (current behaviour)
+  - eager:  the same plus setup_database() at boot       (what every worker used to do on import)
+
+    DATABASE_URL=postgresql://localhost/teal_bench python benchmarks/startup_time.py --runs 10
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT_SNIPPET = """
+import time, sys, io, contextlib
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import Teal_Backend
+    app = Teal_Backend.create_app()
+    if {eager!r}:
+        Teal_Backend.setup_database()
+print(time.perf_counter() - started)
+"""
+
+
+def boot_once(eager):
+    code = BOOT_SNIPPET.format(root=REPO_ROOT, eager=eager)
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        sys.exit("DATABASE_URL must point at a throwaway database (the eager runs apply migrations).")
+
+    results = {}
+    for label, eager in (("lazy", False), ("eager", True)):
+        boot_once(eager)  # warm the OS file cache and apply migrations once
+        samples = [boot_once(eager) for _ in range(args.runs)]
+        results[label] = {"median_ms": statistics.median(samples) * 1000,
+                          "max_ms": max(samples) * 1000, "runs": args.runs}
+        print(f"{label:>5}: median {results[label]['median_ms']:.1f} ms, max {results[label]['max_ms']:.1f} ms")
+
+    print(f"speedup: {results['eager']['median_ms'] / results['lazy']['median_ms']:.1f}x")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+-- Baseline schema. Written to be idempotent so it also adopts databases created by the
+-- original setup_database() before migrations existed.
+
+-- --- Licenses Table ---
+CREATE TABLE IF NOT EXISTS licenses (
+    device_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    hostname TEXT,
+    activated_at TIMESTAMPTZ DEFAULT NOW(),
+    status TEXT NOT NULL DEFAULT 'active'
+);
+
+-- --- Settings Table ---
+CREATE TABLE IF NOT EXISTS settings (
+    id INT PRIMARY KEY,
+    master_key TEXT NOT NULL,
+    total_licenses INT NOT NULL
+);
+
+-- Maintained seat counter; backfilled from the licenses table the first time it's added.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'settings' AND column_name = 'active_count'
+    ) THEN
+        ALTER TABLE settings ADD COLUMN active_count INT NOT NULL DEFAULT 0;
+        UPDATE settings SET active_count = (SELECT COUNT(*) FROM licenses WHERE status = 'active');
+    END IF;
+END
+$$;
+
+-- --- Versions Table ---
+CREATE TABLE IF NOT EXISTS versions (
+    version_number TEXT PRIMARY KEY,
+    release_date TIMESTAMPTZ DEFAULT NOW(),
+    download_url TEXT NOT NULL,
+    is_latest BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- --- Atomic Activation Function ---
+-- One round trip per activation: key check, seat check and upsert run under the settings row lock.
+-- Returns result in ('activated', 'reactivated', 'already_active', 'no_seats', 'invalid_key', 'not_initialized').
+CREATE OR REPLACE FUNCTION teal_activate_license(
+    p_license_key TEXT, p_device_id TEXT, p_username TEXT, p_hostname TEXT,
+    OUT result TEXT, OUT licenses_remaining INT
+) LANGUAGE plpgsql AS $$
+DECLARE
+    v_master_key TEXT;
+    v_total INT;
+    v_active INT;
+    v_inserted BOOLEAN;
+BEGIN
+    -- Unlocked fast path: most repeat activations are for devices that are already active.
+    PERFORM 1 FROM licenses WHERE device_id = p_device_id AND status = 'active';
+    IF FOUND THEN
+        SELECT master_key INTO v_master_key FROM settings WHERE id = 1;
+        result := CASE WHEN v_master_key = p_license_key THEN 'already_active' ELSE 'invalid_key' END;
+        RETURN;
+    END IF;
+
+    SELECT master_key, total_licenses, active_count INTO v_master_key, v_total, v_active
+    FROM settings WHERE id = 1 FOR UPDATE;
+    IF NOT FOUND THEN
+        result := 'not_initialized';
+        RETURN;
+    END IF;
+    IF v_master_key <> p_license_key THEN
+        result := 'invalid_key';
+        RETURN;
+    END IF;
+    IF v_active >= v_total THEN
+        result := 'no_seats';
+        licenses_remaining := GREATEST(v_total - v_active, 0);
+        RETURN;
+    END IF;
+
+    INSERT INTO licenses (device_id, username, hostname, status) VALUES (p_device_id, p_username, p_hostname, 'active')
+    ON CONFLICT (device_id) DO UPDATE
+        SET status = 'active', activated_at = NOW(), username = EXCLUDED.username, hostname = EXCLUDED.hostname
+        WHERE licenses.status <> 'active'
+    RETURNING (xmax = 0) INTO v_inserted;
+    IF NOT FOUND THEN
+        -- Activated concurrently before we took the lock.
+        result := 'already_active';
+        RETURN;
+    END IF;
+
+    UPDATE settings SET active_count = active_count + 1 WHERE id = 1;
+    PERFORM pg_notify('teal_license_changed', p_device_id);
+    result := CASE WHEN v_inserted THEN 'activated' ELSE 'reactivated' END;
+    licenses_remaining := v_total - v_active - 1;
+END;
+$$;
@@ -0,0 +1 @@
+DROP INDEX IF EXISTS versions_single_latest_idx;
@@ -0,0 +1,9 @@
+-- Enforce at most one versions row with is_latest = TRUE.
+-- Databases that already have several keep only the most recently released one as latest.
+UPDATE versions SET is_latest = FALSE
+WHERE is_latest
+  AND version_number <> (
+      SELECT version_number FROM versions WHERE is_latest ORDER BY release_date DESC, version_number DESC LIMIT 1
+  );
+
+CREATE UNIQUE INDEX IF NOT EXISTS versions_single_latest_idx ON versions (is_latest) WHERE is_latest;
@@ -0,0 +1,6 @@
+-- migrate:no-transaction
+DROP INDEX CONCURRENTLY IF EXISTS licenses_hostname_idx;
+DROP INDEX CONCURRENTLY IF EXISTS licenses_username_idx;
+DROP INDEX CONCURRENTLY IF EXISTS licenses_activated_at_idx;
+DROP INDEX CONCURRENTLY IF EXISTS licenses_status_device_idx;
+DROP INDEX CONCURRENTLY IF EXISTS licenses_active_idx;
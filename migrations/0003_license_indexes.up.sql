@@ -0,0 +1,15 @@
+-- migrate:no-transaction
+-- Built CONCURRENTLY so adding them to a large licenses table doesn't block activations.
+
+-- Active devices only: keeps seat reconciliation and status=active listings off the full table.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS licenses_active_idx ON licenses (device_id) WHERE status = 'active';
+
+-- status filter + device_id keyset pagination in /admin/view_status.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS licenses_status_device_idx ON licenses (status, device_id);
+
+-- order=activated_at keyset pagination.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS licenses_activated_at_idx ON licenses (activated_at, device_id);
+
+-- Prefix (LIKE 'abc%') filters on username and hostname.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS licenses_username_idx ON licenses (username text_pattern_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS licenses_hostname_idx ON licenses (hostname text_pattern_ops);
@@ -0,0 +1 @@
+DROP TABLE IF EXISTS license_revocations;
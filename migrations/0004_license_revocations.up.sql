@@ -0,0 +1,8 @@
+-- Devices deactivated recently enough that clients may still hold a valid offline license token.
+-- Tokens issued before revoked_at must be rejected; rows older than the token lifetime are pruned.
+CREATE TABLE IF NOT EXISTS license_revocations (
+    device_id TEXT PRIMARY KEY,
+    revoked_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS license_revocations_revoked_at_idx ON license_revocations (revoked_at);
@@ -0,0 +1,3 @@
+-- migrate:no-transaction
+DROP INDEX CONCURRENTLY IF EXISTS licenses_hostname_device_idx;
+DROP INDEX CONCURRENTLY IF EXISTS licenses_username_device_idx;
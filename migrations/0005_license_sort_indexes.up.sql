@@ -0,0 +1,6 @@
+-- migrate:no-transaction
+-- Keyset pagination for the admin console's sortable columns (order=username|hostname in /admin/view_status).
+-- order=status uses licenses_status_device_idx from 0003.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS licenses_username_device_idx ON licenses (username, device_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS licenses_hostname_device_idx ON licenses ((COALESCE(hostname, '')), device_id);
@@ -0,0 +1,5 @@
+DROP INDEX IF EXISTS licenses_revision_idx;
+DROP TRIGGER IF EXISTS licenses_stamp_revision ON licenses;
+DROP FUNCTION IF EXISTS teal_licenses_stamp_revision();
+ALTER TABLE licenses DROP COLUMN IF EXISTS updated_at;
+ALTER TABLE licenses DROP COLUMN IF EXISTS revision;
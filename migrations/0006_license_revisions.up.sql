@@ -0,0 +1,29 @@
+-- Change tracking for /admin/license_changes.
+-- Every insert, and every update that touches a device's visible fields, stamps the row with the
+-- writing transaction's id as its revision. Readers only return revisions below the oldest
+-- still-running transaction (pg_snapshot_xmin), so a slow writer's change is never skipped by a
+-- cursor that has already moved past it.
+
+ALTER TABLE licenses ADD COLUMN IF NOT EXISTS revision BIGINT;
+ALTER TABLE licenses ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+
+CREATE OR REPLACE FUNCTION teal_licenses_stamp_revision() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.revision := pg_current_xact_id()::text::bigint;
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS licenses_stamp_revision ON licenses;
+CREATE TRIGGER licenses_stamp_revision
+    BEFORE INSERT OR UPDATE OF device_id, username, hostname, activated_at, status ON licenses
+    FOR EACH ROW EXECUTE FUNCTION teal_licenses_stamp_revision();
+
+-- Existing rows all get this migration's revision (and their activation time as updated_at).
+UPDATE licenses SET revision = pg_current_xact_id()::text::bigint, updated_at = COALESCE(activated_at, NOW())
+WHERE revision IS NULL;
+ALTER TABLE licenses ALTER COLUMN revision SET NOT NULL;
+ALTER TABLE licenses ALTER COLUMN updated_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS licenses_revision_idx ON licenses (revision, device_id);
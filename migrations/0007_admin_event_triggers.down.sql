@@ -0,0 +1,6 @@
+DROP TRIGGER IF EXISTS versions_notify_admin ON versions;
+DROP TRIGGER IF EXISTS settings_notify_admin ON settings;
+DROP TRIGGER IF EXISTS licenses_notify_admin ON licenses;
+DROP FUNCTION IF EXISTS teal_notify_versions_changed();
+DROP FUNCTION IF EXISTS teal_notify_seats_changed();
+DROP FUNCTION IF EXISTS teal_notify_device_changed();
@@ -0,0 +1,54 @@
+-- Change notifications for the /admin/events stream. Payloads are JSON on one channel
+-- (ADMIN_EVENTS_CHANNEL in Teal_Backend.py) and, like every NOTIFY, are only delivered on commit.
+
+CREATE OR REPLACE FUNCTION teal_notify_device_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('teal_admin_events', json_build_object(
+        'type', 'device',
+        'device_id', NEW.device_id,
+        'username', NEW.username,
+        'hostname', NEW.hostname,
+        'status', NEW.status,
+        'activated_at', to_char(NEW.activated_at, 'YYYY-MM-DD HH24:MI:SS TZ'),
+        'revision', NEW.revision
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION teal_notify_seats_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('teal_admin_events', json_build_object(
+        'type', 'seats',
+        'total_licenses', NEW.total_licenses,
+        'activated_count', NEW.active_count,
+        'licenses_remaining', NEW.total_licenses - NEW.active_count
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION teal_notify_versions_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('teal_admin_events', '{"type":"versions"}');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS licenses_notify_admin ON licenses;
+CREATE TRIGGER licenses_notify_admin
+    AFTER INSERT OR UPDATE OF device_id, username, hostname, activated_at, status ON licenses
+    FOR EACH ROW EXECUTE FUNCTION teal_notify_device_changed();
+
+DROP TRIGGER IF EXISTS settings_notify_admin ON settings;
+CREATE TRIGGER settings_notify_admin
+    AFTER UPDATE OF total_licenses, active_count ON settings
+    FOR EACH ROW WHEN (OLD.total_licenses IS DISTINCT FROM NEW.total_licenses
+                       OR OLD.active_count IS DISTINCT FROM NEW.active_count)
+    EXECUTE FUNCTION teal_notify_seats_changed();
+
+-- Statement level: set_latest_version touches every row, but clients just re-fetch the (short) list.
+DROP TRIGGER IF EXISTS versions_notify_admin ON versions;
+CREATE TRIGGER versions_notify_admin
+    AFTER INSERT OR UPDATE OR DELETE ON versions
+    FOR EACH STATEMENT EXECUTE FUNCTION teal_notify_versions_changed();
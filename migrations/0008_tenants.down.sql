@@ -0,0 +1,134 @@
+-- Only a single-tenant database can go back to the settings singleton.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM tenants WHERE tenant_id <> 'default') THEN
+        RAISE EXCEPTION 'Delete every tenant except ''default'' (and its devices) before reverting 0008_tenants';
+    END IF;
+END
+$$;
+
+CREATE TABLE settings (
+    id INT PRIMARY KEY,
+    master_key TEXT NOT NULL,
+    total_licenses INT NOT NULL,
+    active_count INT NOT NULL DEFAULT 0
+);
+INSERT INTO settings (id, master_key, total_licenses, active_count)
+SELECT 1, license_key, total_licenses, active_count FROM tenants WHERE tenant_id = 'default';
+
+DROP TRIGGER IF EXISTS tenants_notify_keys ON tenants;
+DROP TRIGGER IF EXISTS tenants_notify_admin ON tenants;
+DROP FUNCTION IF EXISTS teal_notify_tenants_changed();
+
+CREATE OR REPLACE FUNCTION teal_notify_device_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('teal_admin_events', json_build_object(
+        'type', 'device',
+        'device_id', NEW.device_id,
+        'username', NEW.username,
+        'hostname', NEW.hostname,
+        'status', NEW.status,
+        'activated_at', to_char(NEW.activated_at, 'YYYY-MM-DD HH24:MI:SS TZ'),
+        'revision', NEW.revision
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION teal_notify_seats_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('teal_admin_events', json_build_object(
+        'type', 'seats',
+        'total_licenses', NEW.total_licenses,
+        'activated_count', NEW.active_count,
+        'licenses_remaining', NEW.total_licenses - NEW.active_count
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER settings_notify_admin
+    AFTER UPDATE OF total_licenses, active_count ON settings
+    FOR EACH ROW WHEN (OLD.total_licenses IS DISTINCT FROM NEW.total_licenses
+                       OR OLD.active_count IS DISTINCT FROM NEW.active_count)
+    EXECUTE FUNCTION teal_notify_seats_changed();
+
+DROP FUNCTION IF EXISTS teal_activate_device(TEXT, TEXT, TEXT, TEXT);
+CREATE OR REPLACE FUNCTION teal_activate_license(
+    p_license_key TEXT, p_device_id TEXT, p_username TEXT, p_hostname TEXT,
+    OUT result TEXT, OUT licenses_remaining INT
+) LANGUAGE plpgsql AS $$
+DECLARE
+    v_master_key TEXT;
+    v_total INT;
+    v_active INT;
+    v_inserted BOOLEAN;
+BEGIN
+    PERFORM 1 FROM licenses WHERE device_id = p_device_id AND status = 'active';
+    IF FOUND THEN
+        SELECT master_key INTO v_master_key FROM settings WHERE id = 1;
+        result := CASE WHEN v_master_key = p_license_key THEN 'already_active' ELSE 'invalid_key' END;
+        RETURN;
+    END IF;
+
+    SELECT master_key, total_licenses, active_count INTO v_master_key, v_total, v_active
+    FROM settings WHERE id = 1 FOR UPDATE;
+    IF NOT FOUND THEN
+        result := 'not_initialized';
+        RETURN;
+    END IF;
+    IF v_master_key <> p_license_key THEN
+        result := 'invalid_key';
+        RETURN;
+    END IF;
+    IF v_active >= v_total THEN
+        result := 'no_seats';
+        licenses_remaining := GREATEST(v_total - v_active, 0);
+        RETURN;
+    END IF;
+
+    INSERT INTO licenses (device_id, username, hostname, status) VALUES (p_device_id, p_username, p_hostname, 'active')
+    ON CONFLICT (device_id) DO UPDATE
+        SET status = 'active', activated_at = NOW(), username = EXCLUDED.username, hostname = EXCLUDED.hostname
+        WHERE licenses.status <> 'active'
+    RETURNING (xmax = 0) INTO v_inserted;
+    IF NOT FOUND THEN
+        result := 'already_active';
+        RETURN;
+    END IF;
+
+    UPDATE settings SET active_count = active_count + 1 WHERE id = 1;
+    PERFORM pg_notify('teal_license_changed', p_device_id);
+    result := CASE WHEN v_inserted THEN 'activated' ELSE 'reactivated' END;
+    licenses_remaining := v_total - v_active - 1;
+END;
+$$;
+
+DROP INDEX IF EXISTS licenses_revision_idx;
+DROP INDEX IF EXISTS licenses_hostname_device_idx;
+DROP INDEX IF EXISTS licenses_username_device_idx;
+DROP INDEX IF EXISTS licenses_hostname_idx;
+DROP INDEX IF EXISTS licenses_username_idx;
+DROP INDEX IF EXISTS licenses_activated_at_idx;
+DROP INDEX IF EXISTS licenses_status_device_idx;
+DROP INDEX IF EXISTS licenses_active_idx;
+CREATE INDEX licenses_active_idx ON licenses (device_id) WHERE status = 'active';
+CREATE INDEX licenses_status_device_idx ON licenses (status, device_id);
+CREATE INDEX licenses_activated_at_idx ON licenses (activated_at, device_id);
+CREATE INDEX licenses_username_idx ON licenses (username text_pattern_ops);
+CREATE INDEX licenses_hostname_idx ON licenses (hostname text_pattern_ops);
+CREATE INDEX licenses_username_device_idx ON licenses (username, device_id);
+CREATE INDEX licenses_hostname_device_idx ON licenses ((COALESCE(hostname, '')), device_id);
+CREATE INDEX licenses_revision_idx ON licenses (revision, device_id);
+
+DROP INDEX IF EXISTS license_revocations_revoked_at_idx;
+ALTER TABLE license_revocations DROP CONSTRAINT license_revocations_pkey;
+ALTER TABLE license_revocations ADD PRIMARY KEY (device_id);
+ALTER TABLE license_revocations DROP COLUMN tenant_id;
+CREATE INDEX license_revocations_revoked_at_idx ON license_revocations (revoked_at);
+
+ALTER TABLE licenses DROP CONSTRAINT licenses_pkey;
+ALTER TABLE licenses ADD PRIMARY KEY (device_id);
+ALTER TABLE licenses DROP COLUMN tenant_id;
+
+DROP TABLE tenants;
@@ -0,0 +1,156 @@
+-- License pools: each tenant has its own license key, seat limit, seat counter and device namespace.
+-- The singleton settings row becomes the 'default' tenant, which requests without a tenant_id keep using.
+-- The licenses indexes are rebuilt with tenant_id leading, inside this transaction, so licenses is
+-- write-locked until it commits: run it in a quiet period on large tables.
+
+CREATE TABLE IF NOT EXISTS tenants (
+    tenant_id TEXT PRIMARY KEY CHECK (tenant_id ~ '^[a-z0-9][a-z0-9_-]{0,62}$'),
+    name TEXT NOT NULL,
+    license_key TEXT NOT NULL UNIQUE,
+    total_licenses INT NOT NULL CHECK (total_licenses >= 0),
+    active_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO tenants (tenant_id, name, license_key, total_licenses, active_count)
+SELECT 'default', 'Default', master_key, total_licenses, active_count FROM settings WHERE id = 1
+ON CONFLICT (tenant_id) DO NOTHING;
+
+-- --- Device Namespace ---
+-- Existing devices belong to the default tenant; new rows must name their tenant.
+ALTER TABLE licenses ADD COLUMN tenant_id TEXT NOT NULL DEFAULT 'default';
+ALTER TABLE licenses ALTER COLUMN tenant_id DROP DEFAULT;
+ALTER TABLE licenses ADD CONSTRAINT licenses_tenant_fkey FOREIGN KEY (tenant_id) REFERENCES tenants (tenant_id);
+ALTER TABLE licenses DROP CONSTRAINT licenses_pkey;
+ALTER TABLE licenses ADD PRIMARY KEY (tenant_id, device_id);
+
+ALTER TABLE license_revocations ADD COLUMN tenant_id TEXT NOT NULL DEFAULT 'default';
+ALTER TABLE license_revocations ALTER COLUMN tenant_id DROP DEFAULT;
+ALTER TABLE license_revocations DROP CONSTRAINT license_revocations_pkey;
+ALTER TABLE license_revocations ADD PRIMARY KEY (tenant_id, device_id);
+DROP INDEX IF EXISTS license_revocations_revoked_at_idx;
+CREATE INDEX license_revocations_revoked_at_idx ON license_revocations (tenant_id, revoked_at);
+
+-- --- Tenant-Scoped Indexes ---
+-- Every listing, filter and seat query is for one tenant, so tenant_id leads each index.
+DROP INDEX IF EXISTS licenses_active_idx;
+DROP INDEX IF EXISTS licenses_status_device_idx;
+DROP INDEX IF EXISTS licenses_activated_at_idx;
+DROP INDEX IF EXISTS licenses_username_idx;
+DROP INDEX IF EXISTS licenses_hostname_idx;
+DROP INDEX IF EXISTS licenses_username_device_idx;
+DROP INDEX IF EXISTS licenses_hostname_device_idx;
+DROP INDEX IF EXISTS licenses_revision_idx;
+CREATE INDEX licenses_active_idx ON licenses (tenant_id, device_id) WHERE status = 'active';
+CREATE INDEX licenses_status_device_idx ON licenses (tenant_id, status, device_id);
+CREATE INDEX licenses_activated_at_idx ON licenses (tenant_id, activated_at, device_id);
+CREATE INDEX licenses_username_idx ON licenses (tenant_id, username text_pattern_ops);
+CREATE INDEX licenses_hostname_idx ON licenses (tenant_id, hostname text_pattern_ops);
+CREATE INDEX licenses_username_device_idx ON licenses (tenant_id, username, device_id);
+CREATE INDEX licenses_hostname_device_idx ON licenses (tenant_id, (COALESCE(hostname, '')), device_id);
+CREATE INDEX licenses_revision_idx ON licenses (tenant_id, revision, device_id);
+
+-- --- Activation ---
+-- The caller has already resolved the license key to a tenant (Teal_Backend keeps the key -> tenant map
+-- in memory), so this only takes the tenant's seat. Returns result in
+-- ('activated', 'reactivated', 'already_active', 'no_seats', 'unknown_tenant').
+DROP FUNCTION IF EXISTS teal_activate_license(TEXT, TEXT, TEXT, TEXT);
+CREATE OR REPLACE FUNCTION teal_activate_device(
+    p_tenant_id TEXT, p_device_id TEXT, p_username TEXT, p_hostname TEXT,
+    OUT result TEXT, OUT licenses_remaining INT
+) LANGUAGE plpgsql AS $$
+DECLARE
+    v_total INT;
+    v_active INT;
+    v_inserted BOOLEAN;
+BEGIN
+    -- Unlocked fast path: most repeat activations are for devices that are already active.
+    PERFORM 1 FROM licenses WHERE tenant_id = p_tenant_id AND device_id = p_device_id AND status = 'active';
+    IF FOUND THEN
+        result := 'already_active';
+        RETURN;
+    END IF;
+
+    SELECT total_licenses, active_count INTO v_total, v_active
+    FROM tenants WHERE tenant_id = p_tenant_id FOR UPDATE;
+    IF NOT FOUND THEN
+        result := 'unknown_tenant';
+        RETURN;
+    END IF;
+    IF v_active >= v_total THEN
+        result := 'no_seats';
+        licenses_remaining := GREATEST(v_total - v_active, 0);
+        RETURN;
+    END IF;
+
+    INSERT INTO licenses (tenant_id, device_id, username, hostname, status)
+    VALUES (p_tenant_id, p_device_id, p_username, p_hostname, 'active')
+    ON CONFLICT (tenant_id, device_id) DO UPDATE
+        SET status = 'active', activated_at = NOW(), username = EXCLUDED.username, hostname = EXCLUDED.hostname
+        WHERE licenses.status <> 'active'
+    RETURNING (xmax = 0) INTO v_inserted;
+    IF NOT FOUND THEN
+        -- Activated concurrently before we took the lock.
+        result := 'already_active';
+        RETURN;
+    END IF;
+
+    UPDATE tenants SET active_count = active_count + 1 WHERE tenant_id = p_tenant_id;
+    PERFORM pg_notify('teal_license_changed', p_tenant_id || '/' || p_device_id);
+    result := CASE WHEN v_inserted THEN 'activated' ELSE 'reactivated' END;
+    licenses_remaining := v_total - v_active - 1;
+END;
+$$;
+
+-- --- Change Notifications ---
+-- Admin events now say which tenant they're for; seat events come from the tenants table.
+CREATE OR REPLACE FUNCTION teal_notify_device_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('teal_admin_events', json_build_object(
+        'type', 'device',
+        'tenant_id', NEW.tenant_id,
+        'device_id', NEW.device_id,
+        'username', NEW.username,
+        'hostname', NEW.hostname,
+        'status', NEW.status,
+        'activated_at', to_char(NEW.activated_at, 'YYYY-MM-DD HH24:MI:SS TZ'),
+        'revision', NEW.revision
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION teal_notify_seats_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('teal_admin_events', json_build_object(
+        'type', 'seats',
+        'tenant_id', NEW.tenant_id,
+        'total_licenses', NEW.total_licenses,
+        'activated_count', NEW.active_count,
+        'licenses_remaining', NEW.total_licenses - NEW.active_count
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tenants_notify_admin ON tenants;
+CREATE TRIGGER tenants_notify_admin
+    AFTER UPDATE OF total_licenses, active_count ON tenants
+    FOR EACH ROW WHEN (OLD.total_licenses IS DISTINCT FROM NEW.total_licenses
+                       OR OLD.active_count IS DISTINCT FROM NEW.active_count)
+    EXECUTE FUNCTION teal_notify_seats_changed();
+
+-- Workers cache the license key -> tenant map (TENANT_CHANNEL in Teal_Backend.py); any key change drops it.
+CREATE OR REPLACE FUNCTION teal_notify_tenants_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('teal_tenants_changed', '');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tenants_notify_keys ON tenants;
+CREATE TRIGGER tenants_notify_keys
+    AFTER INSERT OR DELETE OR UPDATE OF license_key ON tenants
+    FOR EACH STATEMENT EXECUTE FUNCTION teal_notify_tenants_changed();
+
+DROP TABLE settings;
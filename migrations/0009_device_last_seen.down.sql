@@ -0,0 +1,4 @@
+-- Archived devices are lost: move any you need back into licenses first.
+DROP TABLE IF EXISTS licenses_archive;
+ALTER TABLE licenses RESET (fillfactor);
+ALTER TABLE licenses DROP COLUMN IF EXISTS last_seen;
@@ -0,0 +1,29 @@
+-- Idle-device reclamation: when each device last called /check_license, and a cold table for
+-- devices the sweeper archives (Teal_Reclaim.py).
+-- last_seen is written in batches by every worker's flusher, so it is deliberately left out of every
+-- index (and of the revision/admin-event triggers' column lists): its updates stay HOT and don't
+-- show up as device changes. The lower fillfactor leaves room on each page for those HOT updates.
+
+ALTER TABLE licenses ADD COLUMN IF NOT EXISTS last_seen TIMESTAMPTZ;
+ALTER TABLE licenses SET (fillfactor = 90);
+
+-- Archived rows are inactive devices moved out of licenses; status is always 'archived'. Each row
+-- gets the archiving transaction's revision, so /admin/license_changes reports the move.
+CREATE TABLE IF NOT EXISTS licenses_archive (
+    tenant_id TEXT NOT NULL REFERENCES tenants (tenant_id),
+    device_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    hostname TEXT,
+    activated_at TIMESTAMPTZ,
+    status TEXT NOT NULL DEFAULT 'archived',
+    last_seen TIMESTAMPTZ,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    revision BIGINT NOT NULL,
+    PRIMARY KEY (tenant_id, device_id, archived_at)
+);
+CREATE INDEX IF NOT EXISTS licenses_archive_revision_idx ON licenses_archive (tenant_id, revision, device_id);
+
+DROP TRIGGER IF EXISTS licenses_archive_notify_admin ON licenses_archive;
+CREATE TRIGGER licenses_archive_notify_admin
+    AFTER INSERT ON licenses_archive
+    FOR EACH ROW EXECUTE FUNCTION teal_notify_device_changed();
@@ -0,0 +1,4 @@
+-- The audit trail is lost.
+DROP FUNCTION IF EXISTS teal_drop_license_event_partitions(TIMESTAMPTZ);
+DROP FUNCTION IF EXISTS teal_ensure_license_event_partitions(TIMESTAMPTZ, TIMESTAMPTZ);
+DROP TABLE IF EXISTS license_events;
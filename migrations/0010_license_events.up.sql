@@ -0,0 +1,63 @@
+-- Append-only audit trail of activations and heartbeats, written in batches by each worker's
+-- flusher (Teal_Audit.py). Partitioned by month (UTC) so old months are dropped whole instead of
+-- DELETEd, and queries over recent activity only touch recent partitions. No foreign key: the
+-- table only grows, and it must not slow down or block on tenant changes.
+
+CREATE TABLE IF NOT EXISTS license_events (
+    occurred_at TIMESTAMPTZ NOT NULL,
+    tenant_id TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    event TEXT NOT NULL
+) PARTITION BY RANGE (occurred_at);
+CREATE INDEX IF NOT EXISTS license_events_tenant_time_idx ON license_events (tenant_id, occurred_at);
+
+-- Creates the monthly partitions license_events_YYYY_MM covering [p_from, p_to]. The flusher calls
+-- it before each write, so it is a couple of catalog lookups once the partitions exist. Creating one
+-- locks license_events exclusively; the short lock_timeout makes that flush fail and retry later
+-- rather than queue every other writer and reader behind a long-running query on the table.
+CREATE OR REPLACE FUNCTION teal_ensure_license_event_partitions(p_from TIMESTAMPTZ, p_to TIMESTAMPTZ)
+RETURNS VOID LANGUAGE plpgsql AS $$
+DECLARE
+    v_month TIMESTAMP := date_trunc('month', p_from AT TIME ZONE 'UTC');
+    v_name TEXT;
+    v_lock_timeout TEXT := current_setting('lock_timeout');
+BEGIN
+    WHILE v_month <= p_to AT TIME ZONE 'UTC' LOOP
+        v_name := 'license_events_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass(v_name) IS NULL THEN
+            PERFORM set_config('lock_timeout', '2s', true);
+            BEGIN
+                EXECUTE format('CREATE TABLE %I PARTITION OF license_events FOR VALUES FROM (%L) TO (%L)',
+                               v_name, v_month::TEXT || '+00', (v_month + INTERVAL '1 month')::TEXT || '+00');
+            EXCEPTION WHEN duplicate_table OR unique_violation THEN
+                NULL;  -- another worker created it first
+            END;
+            PERFORM set_config('lock_timeout', v_lock_timeout, true);
+        END IF;
+        v_month := v_month + INTERVAL '1 month';
+    END LOOP;
+END;
+$$;
+
+-- Drops the partitions whose whole month ends before p_before; returns how many.
+CREATE OR REPLACE FUNCTION teal_drop_license_event_partitions(p_before TIMESTAMPTZ)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    v_partition RECORD;
+    v_dropped INT := 0;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'license_events'::regclass AND c.relname ~ '^license_events_\d{4}_\d{2}$'
+    LOOP
+        IF to_date(right(v_partition.relname, 7), 'YYYY_MM')::TIMESTAMP + INTERVAL '1 month'
+                <= p_before AT TIME ZONE 'UTC' THEN
+            EXECUTE format('DROP TABLE %I', v_partition.relname);
+            v_dropped := v_dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN v_dropped;
+END;
+$$;
+
+SELECT teal_ensure_license_event_partitions(NOW(), NOW() + INTERVAL '1 month');
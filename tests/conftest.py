@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# The Teal_* modules live flat in the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path, monkeypatch):
+    """Teal_Backend serving from a fresh SQLite database (2 seats in the default tenant); returns (client, repository)."""
+    import Teal_Backend
+    from Teal_Rate_Limit import MemoryRateLimitBackend, RateLimiter
+    from Teal_Storage import SQLiteLicenseRepository
+
+    repository = SQLiteLicenseRepository(str(tmp_path / "teal.db"), 3600)
+    repository.setup(Teal_Backend.DEFAULT_MASTER_KEY, 2, "3.0.1", Teal_Backend.DEFAULT_DOWNLOAD_URL)
+    monkeypatch.setattr(Teal_Backend, "_repository", repository)
+    monkeypatch.setattr(Teal_Backend, "rate_limiter", RateLimiter(MemoryRateLimitBackend(), enabled=False))
+    # No background flusher threads that would outlive the test (and its repository).
+    monkeypatch.setattr(Teal_Backend, "record_heartbeats", lambda tenant_id, device_ids: None)
+    monkeypatch.setattr(Teal_Backend, "record_audit_event", lambda tenant_id, device_id, event: None)
+    return Teal_Backend.app.test_client(), repository
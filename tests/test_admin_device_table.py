@@ -0,0 +1,186 @@
+"""
+The admin console's incremental device table: paged fetches against the real endpoint (SQLite backend), and
+the row diffing and live-event updates, on a stand-in for the Treeview (no display needed); and how failed change
+polls and bulk updates are reported.
+"""
+import pytest
+
+import Teal_Backend
+
+pytest.importorskip("tkinter")
+import Teal_License_Admin_Tool
+from Teal_License_Admin_Tool import AdminGUI
+
+
+class FakeTree:
+    """The parts of ttk.Treeview the device table uses; counts the row operations."""
+
+    def __init__(self):
+        self.children, self.values, self.ops = [], {}, []
+
+    def get_children(self):
+        return tuple(self.children)
+
+    def insert(self, parent, index, iid, values):
+        self.children.insert(len(self.children) if index == "end" else index, iid)
+        self.values[iid] = values
+        self.ops.append(("insert", iid))
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.children.remove(iid)
+            del self.values[iid]
+            self.ops.append(("delete", iid))
+
+    def item(self, iid, values):
+        self.values[iid] = values
+        self.ops.append(("item", iid))
+
+    def move(self, iid, parent, index):
+        self.children.remove(iid)
+        self.children.insert(len(self.children) if index == "end" else index, iid)
+        self.ops.append(("move", iid))
+
+
+@pytest.fixture
+def console():
+    gui = AdminGUI.__new__(AdminGUI)  # skips the Tk window
+    gui.devices_tree = FakeTree()
+    gui._device_rows = {}
+    gui._device_sort = ("device_id", "asc")
+    gui._device_query = {}
+    gui.refreshes = []
+    gui._schedule_device_refresh = lambda: gui.refreshes.append(1)
+    return gui
+
+
+def row(device_id, status="active", username="u"):
+    return device_id, (device_id, username, "h", status, "2026-01-01 00:00:00 UTC")
+
+
+def test_refresh_touches_only_changed_rows(console):
+    console._diff_device_rows([row("a"), row("b"), row("c"), row("d")])
+    console.devices_tree.ops.clear()
+
+    console._diff_device_rows([row("a"), row("c", status="inactive"), row("e"), row("b")])
+    tree = console.devices_tree
+    assert tree.children == ["a", "c", "e", "b"] and list(console._device_rows) == ["a", "b", "c", "e"]
+    assert tree.values["c"][3] == "inactive"
+    assert ("insert", "a") not in tree.ops and ("item", "a") not in tree.ops
+    assert ("delete", "d") in tree.ops and ("insert", "e") in tree.ops and ("item", "c") in tree.ops
+
+
+def test_appended_pages_never_duplicate_a_row(console):
+    console._diff_device_rows([row("a"), row("b")])
+    console._append_device_rows([row("b"), row("c")])  # b shifted onto the next page
+    assert console.devices_tree.children == ["a", "b", "c"]
+
+
+def test_device_events_update_rows_in_place(console):
+    console._device_query = {"status": "active"}
+    console._diff_device_rows([row("a"), row("b")])
+
+    console._apply_device_event({"device_id": "a", "username": "u", "hostname": "h2", "status": "active",
+                                 "activated_at": "2026-01-01 00:00:00 UTC"})
+    assert console.devices_tree.values["a"][2] == "h2" and console.refreshes == []
+
+    console._apply_device_event({"device_id": "b", "status": "inactive"})  # no longer matches the filter
+    assert console.devices_tree.children == ["a"] and "b" not in console._device_rows
+
+    console._apply_device_event({"device_id": "z", "status": "active"})  # not loaded: may belong in range
+    assert console.refreshes == [1]
+
+
+def test_a_change_to_the_sort_column_refetches(console):
+    console._device_sort = ("username", "asc")
+    console._diff_device_rows([row("a", username="amy"), row("b", username="bob")])
+    console._apply_device_event({"device_id": "a", "username": "zed", "hostname": "h", "status": "active",
+                                 "activated_at": "2026-01-01 00:00:00 UTC"})
+    assert console.refreshes == [1]
+
+
+def test_fetch_follows_cursors_up_to_the_requested_count(console, sqlite_backend, monkeypatch):
+    client, repository = sqlite_backend
+    repository.set_total_licenses("default", 20)
+    for i in range(11):
+        repository.activate("default", f"d{i:02d}", "u", "h")
+    console.admin_key = Teal_Backend.ADMIN_SECRET_KEY
+    requested = []
+
+    def api_get(path, **params):
+        requested.append(params.get("limit"))
+        return client.get(path, query_string=console._auth(params)).get_json()
+
+    console._api_get = api_get
+    monkeypatch.setattr(Teal_License_Admin_Tool, "SERVER_MAX_PAGE_SIZE", 4)
+
+    devices, cursor = console._fetch_devices({"order": "device_id", "direction": "asc"}, 6)
+    assert [d["device_id"] for d in devices] == [f"d{i:02d}" for i in range(6)] and requested == [4, 2]
+    devices, cursor = console._fetch_devices({"order": "device_id", "direction": "asc"}, 100, cursor)
+    assert [d["device_id"] for d in devices] == [f"d{i:02d}" for i in range(6, 11)] and cursor is None
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(delay)
+
+
+@pytest.fixture
+def poller(console, sqlite_backend):
+    client, _ = sqlite_backend
+    console.root = FakeRoot()
+    console.admin_key = Teal_Backend.ADMIN_SECRET_KEY
+    console._stream_connected = False
+    console._changes_since = None
+    console._change_poll_delay = Teal_License_Admin_Tool.CHANGE_POLL_MS
+    console._run_in_background = lambda work, done, failed: run_now(work, done, failed)
+    return console, client
+
+
+def run_now(work, done, failed):
+    try:
+        result = work()
+    except Exception as e:
+        return failed(e)
+    done(result)
+
+
+def test_change_polling_stops_on_a_backend_without_delta_sync(poller, caplog):
+    import requests
+    console, client = poller
+
+    def api_get(path, **params):
+        response = requests.Response()
+        response.status_code = client.get(path, query_string=console._auth(params)).status_code
+        response.raise_for_status()
+
+    console._api_get = api_get
+    caplog.set_level("INFO", logger=Teal_License_Admin_Tool.__name__)
+    console._poll_license_changes()
+    assert console.root.scheduled == [] and "polling for license changes stopped" in caplog.text
+
+
+def test_failed_change_polls_back_off_until_one_succeeds(poller, monkeypatch):
+    import requests
+    console, _ = poller
+    monkeypatch.setattr(Teal_License_Admin_Tool, "CHANGE_POLL_MAX_BACKOFF_MS", 100000)
+    outcomes = [requests.exceptions.ConnectionError("refused")] * 4
+
+    def api_get(path, **params):
+        if outcomes:
+            raise outcomes.pop()
+        return {"changes": [], "next_since": "42:", "has_more": False}
+
+    console._api_get = api_get
+    for _ in range(5):
+        console._poll_license_changes()
+    assert console.root.scheduled == [30000, 60000, 100000, 100000, 15000] and console._changes_since == "42:"
+
+
+def test_bulk_failures_are_listed_up_to_the_limit():
+    failures = [(f"d{i}", "Device not found.") for i in range(4)]
+    assert Teal_License_Admin_Tool.format_failures(failures[:2], 3) == "d0: Device not found.\nd1: Device not found."
+    assert Teal_License_Admin_Tool.format_failures(failures, 3).endswith("\n...and 1 more (see the log).")
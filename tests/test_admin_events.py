@@ -0,0 +1,34 @@
+import pytest
+
+import Teal_Backend
+from Teal_Events import EventBroadcaster, format_sse
+
+
+def test_one_event_reaches_every_admin_stream(monkeypatch):
+    broadcaster = EventBroadcaster(max_clients=10)
+    monkeypatch.setattr(Teal_Backend, "admin_events", broadcaster)
+    summary = {"total_licenses": 5, "activated_count": 1, "licenses_remaining": 4}
+    streams = []
+    for _ in range(2):
+        stream = Teal_Backend.stream_admin_events(broadcaster.subscribe(), "default", summary)
+        assert next(stream) == "retry: 5000\n\n"
+        assert next(stream) == format_sse("seats", summary)
+        streams.append(stream)
+
+    event = {"type": "device", "tenant_id": "default", "device_id": "d0", "status": "active", "revision": 7}
+    broadcaster.publish(event)
+
+    expected = format_sse("device", {"tenant_id": "default", "device_id": "d0", "status": "active", "revision": 7}, 7)
+    assert [next(stream) for stream in streams] == [expected, expected]
+    assert event["type"] == "device"
+    for stream in streams:
+        stream.close()
+    assert broadcaster.client_count() == 0
+
+
+def test_admin_tool_parses_the_server_stream():
+    pytest.importorskip("tkinter")
+    from Teal_License_Admin_Tool import parse_sse
+    stream = ("retry: 5000\n\n" + format_sse("seats", {"total_licenses": 5}) + ": keepalive\n\n"
+              + format_sse("device", {"device_id": "ü"}, 7))
+    assert list(parse_sse(stream.split("\n"))) == [("seats", {"total_licenses": 5}), ("device", {"device_id": "ü"})]
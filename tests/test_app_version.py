@@ -0,0 +1,78 @@
+import types
+
+import pytest
+
+import Teal_Backend
+from Teal_Cache import VersionedValueCache
+
+BODY = {"latest_version": "3.1", "download_url": "https://example.invalid/download"}
+ETAG = "0123abcd"
+
+HEADERS = [
+    (None, 200),
+    (f'"{ETAG}"', 304),
+    (f'W/"{ETAG}"', 304),  # e.g. weakened by a compressing proxy
+    (f'"other", W/"{ETAG}"', 304),
+    ("*", 304),
+    ('"other"', 200),
+    (f'W/"{ETAG}x"', 200),
+]
+
+
+def headers(if_none_match):
+    return {} if if_none_match is None else {"If-None-Match": if_none_match}
+
+
+@pytest.fixture
+def flask_client(monkeypatch):
+    monkeypatch.setattr(Teal_Backend, "get_repository", lambda: types.SimpleNamespace(cache_reads=False))
+    monkeypatch.setattr(Teal_Backend, "load_latest_version", lambda: (BODY, ETAG))
+    return Teal_Backend.app.test_client()
+
+
+@pytest.fixture
+def async_client(monkeypatch):
+    pytest.importorskip("starlette")
+    from starlette.testclient import TestClient
+    import Teal_Backend_Async
+
+    async def load_latest_version():
+        return BODY, ETAG
+
+    monkeypatch.setattr(Teal_Backend_Async, "load_latest_version", load_latest_version)
+    monkeypatch.setattr(Teal_Backend_Async, "app_version_cache", VersionedValueCache(60))
+    # Without `with`, TestClient skips the lifespan (no database pool is opened).
+    return TestClient(Teal_Backend_Async.app)
+
+
+@pytest.mark.parametrize("if_none_match, status", HEADERS)
+def test_both_apps_answer_conditional_requests_alike(flask_client, async_client, if_none_match, status):
+    flask_response = flask_client.get("/app_version", headers=headers(if_none_match))
+    async_response = async_client.get("/app_version", headers=headers(if_none_match))
+    assert flask_response.status_code == async_response.status_code == status
+    assert flask_response.headers["ETag"] == async_response.headers["etag"] == f'"{ETAG}"'
+    if status == 200:
+        assert flask_response.get_data() == async_response.content
+
+
+def test_set_latest_version_replaces_the_cached_version(sqlite_backend, monkeypatch):
+    client, repository = sqlite_backend
+    repository.cache_reads = True  # serve through app_version_cache, as on Postgres
+    monkeypatch.setattr(Teal_Backend, "CACHE_LISTEN_ENABLED", False)
+    monkeypatch.setattr(Teal_Backend, "app_version_cache", VersionedValueCache(60))
+    loads = []
+    latest_version = repository.latest_version
+    monkeypatch.setattr(repository, "latest_version", lambda: loads.append(1) or latest_version())
+
+    first = client.get("/app_version")
+    assert first.get_json()["latest_version"] == "3.0.1"
+    assert client.get("/app_version", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert len(loads) == 1
+
+    assert client.post("/admin/set_latest_version", json={
+        "admin_key": Teal_Backend.ADMIN_SECRET_KEY, "version_number": "3.2.0",
+        "download_url": "https://example.invalid/3.2.0"}).status_code == 200
+    second = client.get("/app_version", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200 and second.headers["ETag"] != first.headers["ETag"]
+    assert second.get_json() == {"latest_version": "3.2.0", "download_url": "https://example.invalid/3.2.0"}
+    assert len(loads) == 2
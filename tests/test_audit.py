@@ -0,0 +1,147 @@
+"""
+Write-behind audit trail: the in-memory AuditEventQueue (coalescing, bounds, requeue), the flusher, /admin/activity
+on SQLite, and Postgres' monthly license_events partitions.
+"""
+import os
+import uuid
+import calendar
+
+import pytest
+
+import Teal_Backend
+from Teal_Audit import HEARTBEAT, AuditEventQueue
+from Teal_Storage import CREATED, PostgresLicenseRepository
+
+HOUR = 3600
+
+
+def test_heartbeats_coalesce_per_device_per_interval():
+    queue = AuditEventQueue(max_events=100, batch_size=100, heartbeat_interval=HOUR)
+    queue.heartbeat("t", "d1", 10 * HOUR + 1)
+    queue.heartbeat("t", "d1", 10 * HOUR + 3599)  # same hour
+    queue.heartbeat("t", "d2", 10 * HOUR + 5)
+    queue.heartbeat("t", "d1", 11 * HOUR)  # next hour
+    queue.put("t", "d1", "activated", 11 * HOUR + 1)  # never coalesced
+    assert queue.take(10) == [(10 * HOUR + 1, "t", "d1", HEARTBEAT), (10 * HOUR + 5, "t", "d2", HEARTBEAT),
+                              (11 * HOUR, "t", "d1", HEARTBEAT), (11 * HOUR + 1, "t", "d1", "activated")]
+    assert queue.stats()["coalesced"] == 1
+
+
+def test_a_full_queue_drops_and_counts_new_events():
+    queue = AuditEventQueue(max_events=2, batch_size=2, heartbeat_interval=HOUR)
+    assert queue.put("t", "d1", "activated", 1) is False
+    assert queue.put("t", "d2", "activated", 2) is True  # a full batch: wake the flusher
+    assert queue.put("t", "d3", "activated", 3) is True
+    assert queue.heartbeat("t", "d4", 4) is True
+    assert [event[2] for event in queue.take(10)] == ["d1", "d2"]
+    assert queue.stats()["dropped"] == 2
+
+
+def test_a_requeued_batch_goes_back_in_front_as_far_as_it_fits():
+    queue = AuditEventQueue(max_events=3, batch_size=10, heartbeat_interval=HOUR)
+    for i in range(3):
+        queue.put("t", f"d{i}", "activated", i)
+    batch = queue.take(2)
+    queue.put("t", "d3", "activated", 3)
+    queue.put("t", "d4", "activated", 4)
+    queue.put("t", "d5", "activated", 5)  # dropped: the queue is full again
+    queue.requeue(batch)  # no room left either
+    assert [event[2] for event in queue.take(10)] == ["d2", "d3", "d4"]
+    assert queue.stats()["dropped"] == 3
+
+    queue.put("t", "d6", "activated", 6)
+    queue.put("t", "d7", "activated", 7)
+    batch = queue.take(1)
+    queue.put("t", "d8", "activated", 8)
+    queue.requeue(batch)
+    assert [event[2] for event in queue.take(10)] == ["d6", "d7", "d8"]
+    assert queue.stats()["dropped"] == 3
+
+
+def test_flush_writes_in_batches_and_requeues_a_failed_one(sqlite_backend, monkeypatch):
+    _, repository = sqlite_backend
+    queue = AuditEventQueue(max_events=100, batch_size=2, heartbeat_interval=HOUR)
+    monkeypatch.setattr(Teal_Backend, "audit_queue", queue)
+    monkeypatch.setattr(Teal_Backend, "AUDIT_FLUSH_BATCH_SIZE", 2)
+    for i in range(5):
+        queue.put("default", f"d{i}", "activated", 1000.0 + i)
+
+    written = []
+    record_events = repository.record_events
+
+    def failing_once(events):
+        if not written:
+            written.append(None)
+            raise RuntimeError("database is locked")
+        written.append(len(events))
+        record_events(events)
+
+    monkeypatch.setattr(repository, "record_events", failing_once)
+    with pytest.raises(RuntimeError):
+        Teal_Backend.flush_audit_events()
+    assert queue.stats()["pending"] == 5
+    Teal_Backend.flush_audit_events()
+    assert written == [None, 2, 2, 1] and queue.stats()["written"] == 5
+    assert repository._query("SELECT COUNT(*) FROM license_events;")[0][0] == 5
+
+
+def test_activity_counts_events_per_day_and_devices_per_hour(sqlite_backend, monkeypatch):
+    client, repository = sqlite_backend
+    now = 1_800_000_000.0 + 12 * HOUR + 600  # 20:10 UTC, so the events below share one UTC day
+    monkeypatch.setattr(Teal_Backend.time, "time", lambda: now)
+    hour = now - now % HOUR
+    repository.record_events([
+        (hour + 1, "default", "d1", "activated"),
+        (hour + 2, "default", "d2", "denied"),
+        (hour + 3, "default", "d1", HEARTBEAT),
+        (hour - HOUR, "default", "d3", HEARTBEAT),
+        (hour - HOUR, "default", "d4", "denied"),  # never had a seat: not an active device
+        (hour + 4, "other", "d9", "activated"),
+    ])
+    body = client.get("/admin/activity", query_string={
+        "admin_key": Teal_Backend.ADMIN_SECRET_KEY, "days": 2, "hours": 3}).get_json()
+    assert body["activations_per_day"][-1] == {"day": "2027-01-15", "activated": 1, "reactivated": 0, "denied": 2}
+    assert body["activations_per_day"][0]["activated"] == 0
+    assert [h["active_devices"] for h in body["active_devices_per_hour"]] == [0, 1, 1]
+    assert client.get("/admin/activity", query_string={
+        "admin_key": Teal_Backend.ADMIN_SECRET_KEY, "days": 0}).status_code == 400
+
+
+@pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="needs DATABASE_URL (Postgres)")
+def test_events_land_in_monthly_partitions_that_prune_drops_whole():
+    repository = Teal_Backend.get_repository()
+    if not isinstance(repository, PostgresLicenseRepository):
+        pytest.skip("needs the postgres storage backend")
+    Teal_Backend.setup_database()
+    tenant_id = f"audit-{uuid.uuid4().hex[:12]}"
+    assert repository.create_tenant(tenant_id, "Audit", f"{tenant_id}-key", 5) == CREATED
+    january, february, march = (calendar.timegm((2001, month, 10, 0, 0, 0)) for month in (1, 2, 3))
+
+    def partitions():
+        conn = Teal_Backend.get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT relname FROM pg_class WHERE relkind = 'r' AND relname LIKE 'license_events_2001_%' "
+                            "ORDER BY 1;")
+                return [row[0] for row in cur.fetchall()]
+        finally:
+            Teal_Backend.release_db_connection(conn)
+
+    try:
+        # One batch spanning two months creates both partitions.
+        repository.record_events([(january, tenant_id, "d1", "activated"), (february, tenant_id, "d1", HEARTBEAT)])
+        assert partitions() == ["license_events_2001_01", "license_events_2001_02"]
+        assert repository.prune_events(calendar.timegm((2001, 2, 1, 0, 0, 0))) == 1
+        assert partitions() == ["license_events_2001_02"]
+        daily, hourly = repository.activity(tenant_id, january, february)
+        assert daily == [] and hourly == [("2001-02-10 00:00", 1)]
+    finally:
+        repository.prune_events(march)
+        conn = Teal_Backend.get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM tenants WHERE tenant_id = %s;", (tenant_id,))
+            conn.commit()
+        finally:
+            Teal_Backend.release_db_connection(conn)
+    assert partitions() == []
@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+from Teal_Bulk_IO import ImportFormatError, NDJSONToCSV, read_csv_header, stream_copy_out
+
+
+class FakeCursor:
+    def __init__(self, rows, fail_after=None):
+        self.rows = rows
+        self.fail_after = fail_after
+
+    def mogrify(self, sql, params):
+        return sql.encode()
+
+    def copy_expert(self, sql, file):
+        for i, row in enumerate(self.rows):
+            if i == self.fail_after:
+                raise OSError("server closed the connection unexpectedly")
+            file.write(row)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def rollback(self):
+        pass
+
+
+def run_export(get_conn, released):
+    return stream_copy_out(get_conn, released.append, "COPY (SELECT 1) TO STDOUT", liveness_interval=0.1)
+
+
+def test_export_streams_every_row_and_releases_the_connection():
+    released, conn = [], FakeConnection(FakeCursor([b"a\n", b"b\n", b"c\n"]))
+    assert b"".join(run_export(lambda: conn, released)) == b"a\nb\nc\n"
+    assert released == [conn]
+
+
+def test_connection_failure_is_raised_to_the_consumer():
+    def get_conn():
+        raise TimeoutError("Timed out waiting for a database connection.")
+
+    released = []
+    with pytest.raises(TimeoutError):
+        next(run_export(get_conn, released))
+    assert released == []
+
+
+def test_failure_mid_copy_is_raised_after_the_rows_already_sent():
+    # The first row fills a chunk on its own, so it reaches the client before the COPY fails.
+    released, conn = [], FakeConnection(FakeCursor([b"x" * 70000, b"y\n", b"z\n"], fail_after=2))
+    chunks = run_export(lambda: conn, released)
+    assert next(chunks) == b"x" * 70000
+    with pytest.raises(OSError, match="closed the connection"):
+        next(chunks)
+    assert released == [conn]
+
+
+def test_csv_header_is_validated():
+    assert read_csv_header(io.BytesIO(b"\xef\xbb\xbfDevice_ID, username,status\n")) == ["device_id", "username", "status"]
+    for header, message in ((b"device_id,colour\n", "Unknown column"), (b"username\n", "missing"),
+                            (b"device_id,username,username\n", "duplicate")):
+        with pytest.raises(ImportFormatError, match=message):
+            read_csv_header(io.BytesIO(header))
+
+
+def test_ndjson_rows_become_csv_with_line_numbers():
+    body = b'{"device_id": "d1", "username": "u", "hostname": null}\n\n{"device_id": "d,2", "username": "\xc3\xbc"}\n'
+    assert NDJSONToCSV(io.BytesIO(body)).read().decode() == '1,d1,u,,\n3,"d,2",\xfc,,\n'
+
+
+@pytest.mark.parametrize("line", [b"not json\n", b"[1, 2]\n"])
+def test_ndjson_bad_line_is_reported(line):
+    converter = NDJSONToCSV(io.BytesIO(b'{"device_id": "d1", "username": "u"}\n' + line))
+    with pytest.raises(ImportFormatError):
+        converter.read()
+    assert converter.error.startswith("Line 2: invalid JSON")
@@ -0,0 +1,68 @@
+"""
+/admin/bulk_update_devices and the per-device outcomes behind it (plan_status_changes), on the SQLite backend.
+"""
+import pytest
+
+import Teal_Backend
+from Teal_Storage import NO_SEATS, NOT_FOUND, UNCHANGED, UPDATED, plan_status_changes
+
+
+def bulk(client, action, device_ids, **extra):
+    return client.post("/admin/bulk_update_devices", json={
+        "admin_key": Teal_Backend.ADMIN_SECRET_KEY, "action": action, "device_ids": device_ids, **extra})
+
+
+def test_plan_activates_in_order_until_seats_run_out():
+    current = {"a": "inactive", "b": "active", "c": "inactive", "d": "inactive"}
+    assert plan_status_changes(["a", "b", "c", "ghost", "d"], current, "active", 1) == (
+        {"a": UPDATED, "b": UNCHANGED, "c": NO_SEATS, "ghost": NOT_FOUND, "d": NO_SEATS}, ["a"])
+    # An over-committed tenant (seat limit lowered below the active count) has no free seats, not negative ones.
+    assert plan_status_changes(["a"], current, "active", -3) == ({"a": NO_SEATS}, [])
+    assert plan_status_changes(["a", "b"], current, "inactive", 0) == ({"a": UNCHANGED, "b": UPDATED}, ["b"])
+
+
+def test_bulk_activation_fills_the_free_seats(sqlite_backend):
+    client, repository = sqlite_backend
+    for device_id in ("d0", "d1", "d2"):
+        repository.activate("default", device_id, "u", "h")
+        repository.set_device_status("default", device_id, "inactive")
+
+    response = bulk(client, "activate", ["d2", "d0", "d0", "ghost", "d1"])
+    body = response.get_json()
+    assert response.status_code == 200 and body["success"] is False
+    assert body["licenses_remaining"] == 0
+    # Seats go in the order given (d2, then d0); the duplicate d0 is one device.
+    assert {device_id: r["success"] for device_id, r in body["results"].items()} == \
+        {"d2": True, "d0": True, "ghost": False, "d1": False}
+    assert body["message"] == "2 device(s) set to active, 2 failed."
+    assert repository.license_statuses("default", ["d0", "d1", "d2"]) == \
+        {"d0": "active", "d1": "inactive", "d2": "active"}
+
+
+def test_bulk_deactivation_frees_seats(sqlite_backend):
+    client, repository = sqlite_backend
+    repository.activate("default", "d0", "u", "h")
+    body = bulk(client, "deactivate", ["d0"]).get_json()
+    assert body["success"] is True and body["licenses_remaining"] == 2
+    assert [device_id for device_id, _ in repository.revocations("default")] == ["d0"]
+
+
+@pytest.mark.parametrize("payload, status", [
+    ({"admin_key": "wrong", "action": "activate", "device_ids": ["d0"]}, 403),
+    ({"action": "suspend", "device_ids": ["d0"]}, 400),
+    ({"action": "activate", "device_ids": []}, 400),
+    ({"action": "activate", "device_ids": ["d0", ""]}, 400),
+    ({"action": "activate", "device_ids": "d0"}, 400),
+    ({"action": "activate", "device_ids": ["d0"], "tenant_id": "Not A Tenant"}, 400),
+    ({"action": "activate", "device_ids": ["d0"], "tenant_id": "missing"}, 404),
+])
+def test_bulk_update_rejects_bad_requests(sqlite_backend, payload, status):
+    client, _ = sqlite_backend
+    response = client.post("/admin/bulk_update_devices", json={"admin_key": Teal_Backend.ADMIN_SECRET_KEY, **payload})
+    assert response.status_code == status and response.get_json()["success"] is False
+
+
+def test_bulk_update_caps_the_batch(sqlite_backend, monkeypatch):
+    client, _ = sqlite_backend
+    monkeypatch.setattr(Teal_Backend, "BULK_UPDATE_MAX_DEVICES", 2)
+    assert bulk(client, "activate", ["d0", "d1", "d2"]).status_code == 400
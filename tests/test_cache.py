@@ -0,0 +1,193 @@
+import os
+import time
+import asyncio
+import threading
+
+import pytest
+
+from Teal_Cache import InvalidationListener, LRUTTLCache, SingleFlight, VersionedValueCache
+
+
+class Interrupt(BaseException):
+    """Stands in for KeyboardInterrupt / gevent's Timeout: not an Exception."""
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def race_followers(flights, leader_fn, followers=3):
+    """Runs leader_fn as the flight's leader with `followers` callers joining it; returns what each follower got."""
+    release, results = threading.Event(), []
+
+    def lead():
+        release.wait(2)
+        return leader_fn()
+
+    def follow():
+        try:
+            results.append(("value", flights.do("k", lambda: "follower ran its own load")))
+        except BaseException as e:
+            results.append(("error", e))
+
+    def leader():
+        try:
+            flights.do("k", lead)
+        except BaseException:
+            pass
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    wait_for(lambda: flights.stats()["calls"] == 1)
+    threads += [threading.Thread(target=follow) for _ in range(followers)]
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: flights.stats()["coalesced"] == followers)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    return results
+
+
+def test_single_flight_shares_the_leaders_value():
+    assert race_followers(SingleFlight(), lambda: 42) == [("value", 42)] * 3
+
+
+def test_single_flight_shares_the_leaders_exception():
+    error = ValueError("database went away")
+
+    def fail():
+        raise error
+    assert race_followers(SingleFlight(), fail) == [("error", error)] * 3
+
+
+def test_single_flight_followers_get_an_error_when_the_leader_is_interrupted():
+    def interrupted():
+        raise Interrupt()
+    results = race_followers(SingleFlight(), interrupted)
+    assert [kind for kind, _ in results] == ["error"] * 3
+    assert all(isinstance(e, RuntimeError) for _, e in results)
+
+
+def test_async_single_flight_followers_get_an_error_when_the_leader_is_interrupted():
+    flights = SingleFlight()
+
+    async def main():
+        started = asyncio.Event()
+
+        async def interrupted():
+            started.set()
+            await asyncio.sleep(0.01)
+            raise Interrupt()
+
+        async def leader():
+            try:
+                await flights.ado("k", interrupted)
+            except Interrupt:
+                return "interrupted"
+
+        leading = asyncio.ensure_future(leader())
+        await started.wait()
+        follower = asyncio.ensure_future(flights.ado("k", interrupted))
+        assert await leading == "interrupted"
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(follower, 2)
+
+    asyncio.run(main())
+
+
+def test_versioned_cache_drops_a_fill_that_raced_an_invalidation():
+    cache, loads = VersionedValueCache(ttl=60), []
+
+    def loader():
+        loads.append(1)
+        if len(loads) == 1:
+            cache.invalidate()  # e.g. a NOTIFY arriving while the query runs
+            return "stale"
+        return "fresh"
+
+    assert cache.get(loader) == "stale"  # the caller still gets what it loaded...
+    assert cache.get(loader) == "fresh"  # ...but it wasn't cached
+    assert cache.get(loader) == "fresh"
+    assert len(loads) == 2
+
+
+def test_lru_cache_drops_a_fill_that_raced_an_invalidation():
+    cache = LRUTTLCache(max_entries=10, ttl=60)
+
+    def stale_loader():
+        cache.invalidate("d1")
+        return "active"
+
+    assert cache.get("d1", stale_loader) == "active"
+    assert cache.get("d1", lambda: "inactive") == "inactive"
+    assert cache.get("d1", lambda: "not reloaded") == "inactive"
+
+
+def test_lru_cache_evicts_least_recently_used_and_expires_negative_entries():
+    cache = LRUTTLCache(max_entries=2, ttl=60, negative_ttl=0.05)
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: None)
+    cache.get("a", lambda: "reloaded")  # touch a, so b is the oldest
+    cache.get("c", lambda: 3)
+    assert cache.get("b", lambda: "reloaded") == "reloaded"
+    assert cache.stats()["evictions"] == 2
+
+    cache.get("missing", lambda: None)
+    assert cache.get("missing", lambda: "found") is None
+    time.sleep(0.06)
+    assert cache.get("missing", lambda: "found") == "found"
+
+
+def test_lru_cache_get_many_loads_only_the_misses():
+    cache, asked = LRUTTLCache(max_entries=10, ttl=60), []
+    cache.get("a", lambda: 1)
+
+    def loader(keys):
+        asked.append(list(keys))
+        return {"b": 2}
+    assert cache.get_many(["a", "b", "c"], loader) == {"a": 1, "b": 2, "c": None}
+    assert cache.get_many(["a", "b", "c"], loader) == {"a": 1, "b": 2, "c": None}
+    assert asked == [["b", "c"]]
+
+
+def test_listener_dispatch_isolates_failing_callbacks():
+    listener, seen = InvalidationListener("unused"), []
+
+    def broken(payload):
+        raise RuntimeError("handler bug")
+
+    listener.subscribe("licenses", broken)
+    listener.subscribe("licenses", seen.append)
+    listener.subscribe("versions", seen.append)
+    listener._dispatch("licenses", "default:d1")
+    listener._dispatch_all()
+    assert seen == ["default:d1", None, None]
+
+
+@pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="needs DATABASE_URL (Postgres)")
+def test_listener_delivers_committed_notifications():
+    import psycopg2
+    from Teal_Cache import notify
+
+    listener, seen = InvalidationListener(os.environ["DATABASE_URL"], poll_interval=0.1), []
+    listener.subscribe("teal_test_invalidation", seen.append)
+    listener.ensure_started()
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    try:
+        # LISTEN happens on the listener's own thread; keep notifying until it is up.
+        deadline = time.monotonic() + 5
+        while "default:d1" not in seen and time.monotonic() < deadline:
+            with conn.cursor() as cur:
+                notify(cur, "teal_test_invalidation", "rolled-back")
+            conn.rollback()
+            with conn.cursor() as cur:
+                notify(cur, "teal_test_invalidation", "default:d1")
+            conn.commit()
+            time.sleep(0.1)
+    finally:
+        conn.close()
+    assert "default:d1" in seen and "rolled-back" not in seen
@@ -0,0 +1,70 @@
+"""
+Batched /check_licenses for fleet agents, on the SQLite backend.
+"""
+import pytest
+
+import Teal_Backend
+from Teal_Cache import LRUTTLCache
+
+
+def check(client, device_ids, **extra):
+    return client.post("/check_licenses", json={"device_ids": device_ids, **extra})
+
+
+@pytest.fixture
+def fleet(sqlite_backend, monkeypatch):
+    """(client, repository, heartbeats) with d0 active, d1 deactivated; heartbeats collects record_heartbeats calls."""
+    client, repository = sqlite_backend
+    repository.activate("default", "d0", "u", "h")
+    repository.activate("default", "d1", "u", "h")
+    repository.set_device_status("default", "d1", "inactive")
+    heartbeats = []
+    monkeypatch.setattr(Teal_Backend, "record_heartbeats",
+                        lambda tenant_id, device_ids: heartbeats.append((tenant_id, sorted(device_ids))))
+    return client, repository, heartbeats
+
+
+def test_statuses_for_a_batch(fleet):
+    client, _, heartbeats = fleet
+    response = check(client, ["d0", "d1", "ghost", "d0"])
+    assert response.status_code == 200
+    assert response.get_json() == {"success": True,
+                                   "statuses": {"d0": "active", "d1": "deactivated", "ghost": "not_found"}}
+    # Only devices the server knows about count as seen.
+    assert heartbeats == [("default", ["d0", "d1"])]
+
+
+def test_batches_are_per_tenant(fleet):
+    client, repository, _ = fleet
+    repository.create_tenant("acme", "Acme", "acme-key", 1)
+    assert check(client, ["d0"], tenant_id="acme").get_json()["statuses"] == {"d0": "not_found"}
+
+
+def test_cached_batches_only_load_the_misses(fleet, monkeypatch):
+    client, repository, _ = fleet
+    repository.cache_reads = True
+    monkeypatch.setattr(Teal_Backend, "CACHE_LISTEN_ENABLED", False)
+    monkeypatch.setattr(Teal_Backend, "license_status_cache", LRUTTLCache(100, 60, 60))
+    asked = []
+    license_statuses = repository.license_statuses
+    monkeypatch.setattr(repository, "license_statuses",
+                        lambda tenant_id, device_ids: asked.append(sorted(device_ids)) or license_statuses(tenant_id, device_ids))
+
+    check(client, ["d0", "ghost"])
+    second = check(client, ["d0", "d1", "ghost"]).get_json()["statuses"]
+    assert second == {"d0": "active", "d1": "deactivated", "ghost": "not_found"}
+    assert asked == [["d0", "ghost"], ["d1"]]
+
+
+@pytest.mark.parametrize("payload", [{"device_ids": []}, {"device_ids": "d0"}, {"device_ids": ["d0", 7]},
+                                     {"device_ids": ["d0", ""]}, {}, {"device_ids": ["d0"], "tenant_id": "Bad/Tenant"}])
+def test_malformed_batches_are_a_400(fleet, payload):
+    client, _, _ = fleet
+    response = client.post("/check_licenses", json=payload)
+    assert response.status_code == 400 and response.get_json()["success"] is False
+
+
+def test_batch_size_is_capped(fleet, monkeypatch):
+    client, _, _ = fleet
+    monkeypatch.setattr(Teal_Backend, "CHECK_LICENSE_BATCH_MAX", 2)
+    assert check(client, ["d0", "d1", "d2"]).status_code == 400
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from Teal_DB_Pool import ManagedConnectionPool
+
+
+class FakeConnection:
+    closed = False
+    autocommit = False
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_connect(monkeypatch):
+    monkeypatch.setattr(psycopg2, "connect", lambda dsn, connection_factory=None: FakeConnection())
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_prefill_opens_min_size_connections():
+    pool = ManagedConnectionPool("fake", min_size=3, max_size=5)
+    pool.prefill()
+    stats = pool.stats()
+    assert (stats["idle"], stats["connections_opened"]) == (3, 3)
+    pool.prefill()
+    assert pool.stats()["connections_opened"] == 3
+
+
+def test_pool_is_refilled_after_fork_reset():
+    pool = ManagedConnectionPool("fake", min_size=3, max_size=5)
+    pool.prefill()
+    pool._pid = -1  # as seen from a forked child
+    conn = pool.getconn()
+    wait_for(lambda: pool.stats()["idle"] == 2)
+    assert pool.stats()["in_use"] == 1
+    pool.putconn(conn)
+
+
+def test_stats_count_every_checkout_across_threads():
+    pool = ManagedConnectionPool("fake", min_size=0, max_size=4)
+
+    def worker():
+        for _ in range(200):
+            pool.putconn(pool.getconn())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = pool.stats()
+    assert stats["checkouts"] == 1600
+    assert stats["connections_opened"] - stats["connections_closed"] == stats["idle"] <= 4
@@ -0,0 +1,106 @@
+"""
+Delta sync (/admin/license_changes): cursor parsing, paging, and the xmin horizon that keeps a change committed
+late by a long transaction from being skipped. The sync itself needs Postgres (transaction ids).
+"""
+import os
+import uuid
+
+import pytest
+
+import Teal_Backend
+from Teal_Storage import CREATED, PostgresLicenseRepository
+
+needs_postgres = pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="needs DATABASE_URL (Postgres)")
+
+
+def changes(client, tenant_id, since, **args):
+    response = client.get("/admin/license_changes", query_string={
+        "admin_key": Teal_Backend.ADMIN_SECRET_KEY, "tenant_id": tenant_id, "since": since, **args})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def sync(client, tenant_id, since, limit=1000):
+    """Pulls pages until has_more is false; returns ([device_id per change], next_since)."""
+    seen = []
+    while True:
+        page = changes(client, tenant_id, since, limit=limit)
+        seen.extend(change["device_id"] for change in page["changes"])
+        since = page["next_since"]
+        if not page["has_more"]:
+            return seen, since
+
+
+def test_parse_change_cursor():
+    assert Teal_Backend.parse_change_cursor("0") == (0, "")
+    assert Teal_Backend.parse_change_cursor("1234:d7") == (1234, "d7")
+    assert Teal_Backend.parse_change_cursor("1234:with:colons") == (1234, "with:colons")
+    assert Teal_Backend.parse_change_cursor(None) == (0, "")
+    for bad in ("now-ish", "-5", "12a:d1", ":d1"):
+        with pytest.raises(ValueError):
+            Teal_Backend.parse_change_cursor(bad)
+
+
+def test_delta_sync_needs_postgres(sqlite_backend):
+    client, _ = sqlite_backend
+    response = client.get("/admin/license_changes", query_string={"admin_key": Teal_Backend.ADMIN_SECRET_KEY})
+    assert response.status_code == 501
+
+
+@pytest.fixture
+def tenant():
+    if not isinstance(Teal_Backend.get_repository(), PostgresLicenseRepository):
+        pytest.skip("needs the postgres storage backend")
+    Teal_Backend.setup_database()
+    tenant_id = f"changes-{uuid.uuid4().hex[:12]}"
+    assert Teal_Backend.get_repository().create_tenant(tenant_id, "Changes", f"{tenant_id}-key", 20) == CREATED
+    yield tenant_id
+    conn = Teal_Backend.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            for table in ("license_revocations", "licenses_archive", "licenses", "tenants"):
+                cur.execute(f"DELETE FROM {table} WHERE tenant_id = %s;", (tenant_id,))
+        conn.commit()
+    finally:
+        Teal_Backend.release_db_connection(conn)
+
+
+@needs_postgres
+def test_pages_return_each_changed_device_once(tenant):
+    client, repository = Teal_Backend.app.test_client(), Teal_Backend.get_repository()
+    start = changes(client, tenant, "now")
+    assert start["changes"] == [] and not start["has_more"]
+
+    for i in range(5):
+        repository.activate(tenant, f"d{i}", "u", "h")
+    repository.set_device_status(tenant, "d0", "inactive")
+    seen, since = sync(client, tenant, start["next_since"], limit=2)
+    assert sorted(seen) == [f"d{i}" for i in range(5)]
+    assert sync(client, tenant, since) == ([], since)
+
+    # A full sync from 0 only sees this tenant's devices, each with its current state.
+    page = changes(client, tenant, "0")
+    assert {c["device_id"]: c["status"] for c in page["changes"]}["d0"] == "inactive"
+    assert len(page["changes"]) == 5
+
+
+@needs_postgres
+def test_a_long_transaction_is_not_skipped(tenant):
+    import psycopg2
+    client, repository = Teal_Backend.app.test_client(), Teal_Backend.get_repository()
+    repository.activate(tenant, "slow", "u", "h")
+    since = sync(client, tenant, "0")[1]
+
+    slow = psycopg2.connect(os.environ["DATABASE_URL"])
+    try:
+        with slow.cursor() as cur:
+            # Takes a transaction id (its revision) now, but commits only after a later change has.
+            cur.execute("UPDATE licenses SET hostname = 'late' WHERE tenant_id = %s AND device_id = 'slow';", (tenant,))
+        repository.activate(tenant, "fast", "u", "h")
+        # "fast" committed with a higher revision; returning it now would move the cursor past "slow".
+        seen, since = sync(client, tenant, since)
+        assert seen == []
+        slow.commit()
+    finally:
+        slow.close()
+    assert sorted(sync(client, tenant, since)[0]) == ["fast", "slow"]
@@ -0,0 +1,79 @@
+"""
+Offline license tokens and the signed revocation list: the reference verifier, and the endpoints on the SQLite backend.
+"""
+import json
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+import Teal_Backend
+import Teal_License_Tokens
+from Teal_License_Tokens import (LICENSE_TOKEN_TTL, TokenSigner, _b64url, _b64url_decode, issue_license_token,
+                                 sign_revocation_list, verify_token)
+
+
+@pytest.fixture
+def signer(monkeypatch):
+    signer = TokenSigner(Ed25519PrivateKey.generate())
+    monkeypatch.setattr(Teal_License_Tokens, "_signer", signer)
+    monkeypatch.setattr(Teal_License_Tokens, "_signer_loaded", True)
+    return signer
+
+
+def test_issued_tokens_verify(signer):
+    issued = issue_license_token("d1", tenant_id="acme")
+    claims = verify_token(issued["license_token"], signer.public_key_pem())
+    assert claims["sub"] == "d1" and claims["tid"] == "acme" and claims["status"] == "active"
+    assert claims["exp"] == issued["license_token_expires_at"] == int(claims["iat"]) + LICENSE_TOKEN_TTL
+
+
+def test_expired_tokens_are_rejected(signer):
+    issued = issue_license_token("d1")
+    verify_token(issued["license_token"], signer.public_key_pem(), now=issued["license_token_expires_at"])
+    with pytest.raises(ValueError, match="expired"):
+        verify_token(issued["license_token"], signer.public_key_pem(), now=issued["license_token_expires_at"] + 1)
+
+
+def test_tampered_tokens_are_rejected(signer):
+    header, payload, signature = issue_license_token("d1")["license_token"].split(".")
+    claims = json.loads(_b64url_decode(payload))
+    forged = _b64url(json.dumps(dict(claims, sub="d2"), separators=(",", ":"), sort_keys=True).encode("utf-8"))
+    with pytest.raises(ValueError, match="signature"):
+        verify_token(f"{header}.{forged}.{signature}", signer.public_key_pem())
+
+    unsigned = _b64url(json.dumps({"alg": "none", "typ": "JWT"}).encode("utf-8"))
+    with pytest.raises(ValueError):
+        verify_token(f"{unsigned}.{payload}.", signer.public_key_pem())
+    with pytest.raises(ValueError):
+        verify_token("not-a-token", signer.public_key_pem())
+
+
+def test_tokens_from_another_key_are_rejected(signer):
+    token = TokenSigner(Ed25519PrivateKey.generate()).sign({"sub": "d1", "exp": 2 ** 40})
+    with pytest.raises(ValueError, match="signature"):
+        verify_token(token, signer.public_key_pem())
+
+
+def test_tokens_are_disabled_without_a_key(monkeypatch):
+    monkeypatch.setattr(Teal_License_Tokens, "_signer", None)
+    monkeypatch.setattr(Teal_License_Tokens, "_signer_loaded", True)
+    assert issue_license_token("d1") == {}
+    assert sign_revocation_list([]) is None
+
+
+def test_deactivated_devices_show_up_on_the_signed_revocation_list(sqlite_backend, signer):
+    client, _ = sqlite_backend
+    public_key = client.get("/license_token_public_key").get_json()["public_key"]
+    activated = client.post("/activate_license", json={
+        "license_key": Teal_Backend.DEFAULT_MASTER_KEY, "device_id": "d1", "username": "u", "hostname": "h"}).get_json()
+    token = verify_token(activated["license_token"], public_key)
+    assert client.get("/revoked_licenses").get_json()["revoked"] == []
+
+    client.post("/admin/deactivate_device", json={"admin_key": Teal_Backend.ADMIN_SECRET_KEY, "device_id": "d1"})
+    listing = client.get("/revoked_licenses").get_json()
+    assert [entry["device_id"] for entry in listing["revoked"]] == ["d1"]
+    # The client drops its token: it was issued before the revocation.
+    assert listing["revoked"][0]["revoked_at"] >= int(token["iat"])
+    signed = verify_token(listing["revocation_token"], public_key)
+    assert signed["typ"] == "revocations" and signed["revoked"] == listing["revoked"]
+    assert signed["tid"] == "default"
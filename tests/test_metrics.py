@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import Teal_Metrics as metrics
+
+WORKER = f'worker="{os.getpid()}"'
+
+
+def samples(metric):
+    """{sample line without the value: value} for a metric's rendered lines."""
+    return {line.rsplit(" ", 1)[0]: line.rsplit(" ", 1)[1] for line in metric.render() if not line.startswith("#")}
+
+
+def test_counter_renders_one_sample_per_label_set():
+    counter = metrics.Counter("teal_test_total", "Test counter.", ("route",))
+    counter.inc(route="/a")
+    counter.inc(2, route="/a")
+    counter.inc(route='say "hi"\n')
+    lines = list(counter.render())
+    assert lines[:2] == ["# HELP teal_test_total Test counter.", "# TYPE teal_test_total counter"]
+    assert samples(counter) == {f'teal_test_total{{route="/a",{WORKER}}}': "3",
+                                f'teal_test_total{{route="say \\"hi\\"\\n",{WORKER}}}': "1"}
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("teal_test_seconds", "Test histogram.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, route="/a")
+    assert samples(histogram) == {
+        f'teal_test_seconds_bucket{{le="0.1",route="/a",{WORKER}}}': "1",
+        f'teal_test_seconds_bucket{{le="1.0",route="/a",{WORKER}}}': "3",
+        f'teal_test_seconds_bucket{{le="+Inf",route="/a",{WORKER}}}': "4",
+        f'teal_test_seconds_sum{{route="/a",{WORKER}}}': "6.05",
+        f'teal_test_seconds_count{{route="/a",{WORKER}}}': "4",
+    }
+
+
+def test_a_failing_gauge_callback_does_not_break_the_scrape():
+    def broken():
+        raise RuntimeError("pool is gone")
+
+    registry = metrics.Registry()
+    registry.register(metrics.CallbackGauge("teal_broken", "Broken gauge.", ("stat",), broken))
+    registry.register(metrics.CallbackGauge("teal_fine", "Fine gauge.", ("stat",), lambda: {("size",): 3}))
+    assert f'teal_fine{{stat="size",{WORKER}}} 3' in registry.render().splitlines()
+
+
+def test_queries_are_attributed_to_the_current_request_only():
+    metrics.record_query(0.5, 10)  # outside any request
+    metrics.begin_request()
+    metrics.record_acquire(0.25)
+    metrics.record_query(0.5, 2)
+    metrics.record_query(0.25, 0)
+    assert metrics.end_request() == {"queries": 2, "query_time": 0.75, "rows": 2, "acquire_time": 0.25}
+    assert metrics.end_request() is None
+
+
+def test_metrics_endpoint_reports_request_latency_by_route(sqlite_backend):
+    import Teal_Backend
+    client, _ = sqlite_backend
+    assert client.get("/metrics").status_code == 403
+    client.get("/health")
+    body = client.get("/metrics", query_string={"admin_key": Teal_Backend.ADMIN_SECRET_KEY}).get_data(as_text=True)
+    assert f'teal_http_request_duration_seconds_count{{method="GET",route="/health",status="200",{WORKER}}}' in body
+    assert f'teal_request_db_queries_count{{route="/health",{WORKER}}}' in body
+
+
+@pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="needs DATABASE_URL (Postgres)")
+def test_instrumented_connection_times_every_cursor_type():
+    import psycopg2
+    import psycopg2.extras
+    conn = psycopg2.connect(os.environ["DATABASE_URL"], connection_factory=metrics.InstrumentedConnection)
+    try:
+        metrics.begin_request()
+        with conn.cursor() as cur:
+            cur.execute("SELECT generate_series(1, 3);")
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT 1 AS one;")
+            assert cur.fetchone() == {"one": 1}
+        stats = metrics.end_request()
+    finally:
+        conn.close()
+    assert stats["queries"] == 2 and stats["rows"] == 4
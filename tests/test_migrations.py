@@ -0,0 +1,94 @@
+"""
+Migration runner: no-transaction files recover from a CREATE INDEX CONCURRENTLY that failed partway and left an
+INVALID index behind. The Postgres tests create and drop their own scratch table.
+"""
+import os
+import uuid
+
+import pytest
+
+from Teal_Migrations import NO_TRANSACTION_MARKER, _run_file, concurrent_index_name, invalid_indexes
+
+needs_postgres = pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="needs DATABASE_URL (Postgres)")
+
+
+def test_concurrent_index_name():
+    assert concurrent_index_name(
+        "-- Active devices only.\nCREATE INDEX CONCURRENTLY IF NOT EXISTS licenses_active_idx ON licenses (device_id);"
+    ) == "licenses_active_idx"
+    assert concurrent_index_name("create unique index concurrently if not exists u_idx on t (a);") == "u_idx"
+    assert concurrent_index_name("CREATE INDEX CONCURRENTLY plain_idx ON t (a);") is None
+    assert concurrent_index_name("DROP INDEX CONCURRENTLY IF EXISTS licenses_active_idx;") is None
+    assert concurrent_index_name("-- CREATE INDEX CONCURRENTLY IF NOT EXISTS commented_idx ON t (a);\nSELECT 1;") is None
+
+
+@pytest.fixture
+def scratch():
+    """(connection, table, index) with a table holding a duplicate value, so a UNIQUE concurrent build fails."""
+    import psycopg2
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    conn.autocommit = True
+    suffix = uuid.uuid4().hex[:12]
+    table, index = f"migration_test_{suffix}", f"migration_test_{suffix}_idx"
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE TABLE {table} (value INTEGER);")
+        cur.execute(f"INSERT INTO {table} VALUES (1), (1);")
+    yield conn, table, index
+    conn.rollback()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {table};")
+    conn.close()
+
+
+def index_is_valid(conn, index):
+    with conn.cursor() as cur:
+        cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);", (index,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def write_migration(tmp_path, *statements):
+    path = tmp_path / "0001_scratch.up.sql"
+    path.write_text("\n".join((NO_TRANSACTION_MARKER,) + statements) + "\n", encoding="utf-8")
+    return str(path)
+
+
+@needs_postgres
+def test_rerun_rebuilds_an_index_left_invalid_by_a_failed_build(scratch, tmp_path):
+    conn, table, index = scratch
+    failing = write_migration(tmp_path, f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} (value);")
+    with pytest.raises(Exception):
+        _run_file(conn, failing, "SELECT %s;", (1,), log=lambda message: None)
+    assert conn.autocommit is False
+    assert index_is_valid(conn, index) is False
+    assert index in invalid_indexes(conn)
+
+    # The fix for the bad data ships with the rerun; IF NOT EXISTS alone would keep the broken index.
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"DELETE FROM {table} WHERE ctid = (SELECT MAX(ctid) FROM {table});")
+    conn.autocommit = False
+    logged = []
+    _run_file(conn, failing, "SELECT %s;", (1,), log=logged.append)
+    assert index_is_valid(conn, index) is True
+    assert index not in invalid_indexes(conn)
+    assert len(logged) == 1 and index in logged[0]
+
+
+@needs_postgres
+def test_a_valid_index_is_left_alone(scratch, tmp_path):
+    conn, table, index = scratch
+    migration = write_migration(tmp_path, f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} (value);")
+    _run_file(conn, migration, "SELECT %s;", (1,))
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)::oid;", (index,))
+        oid = cur.fetchone()[0]
+    conn.commit()
+    logged = []
+    _run_file(conn, migration, "SELECT %s;", (1,), log=logged.append)
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)::oid;", (index,))
+        assert cur.fetchone()[0] == oid
+    conn.commit()
+    assert logged == []
@@ -0,0 +1,101 @@
+import pytest
+
+import Teal_Rate_Limit
+from Teal_Rate_Limit import MemoryRateLimitBackend, RateLimiter, client_ip
+
+BURST = Teal_Rate_Limit.RATE_LIMIT_DEVICE_BURST
+
+
+def limiter():
+    return RateLimiter(MemoryRateLimitBackend(), enabled=True)
+
+
+def test_device_bucket_is_per_tenant():
+    rl = limiter()
+    for _ in range(BURST):
+        assert rl.check(None, "default", "d0") is None
+    scope, retry_after = rl.check(None, "default", "d0")
+    assert scope == "device" and retry_after > 0
+    # The same device id in another tenant is a different device.
+    assert rl.check(None, "acme", "d0") is None
+    assert "device:acme:d0" in rl.backend._buckets
+
+
+def test_device_bucket_needs_a_tenant():
+    rl = limiter()
+    for _ in range(BURST + 5):
+        assert rl.check("10.0.0.1", None, "d0") is None
+    assert rl.backend.stats()["buckets"] == 1
+
+
+def test_ip_over_limit_does_not_charge_device():
+    rl = limiter()
+    rl.ip_rate = 0.001
+    for _ in range(Teal_Rate_Limit.RATE_LIMIT_IP_BURST):
+        rl.check("10.0.0.1")
+    assert rl.check("10.0.0.1", "default", "d0")[0] == "ip"
+    assert "device:default:d0" not in rl.backend._buckets
+
+
+def test_disabled_limiter_allows_everything():
+    rl = RateLimiter(MemoryRateLimitBackend(), enabled=False)
+    assert all(rl.check("10.0.0.1", "default", "d0") is None for _ in range(BURST * 3))
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies():
+    assert client_ip("10.0.0.9", "1.2.3.4", trusted_proxies=0) == "10.0.0.9"
+
+
+def test_spoofed_forwarded_for_hops_are_ignored():
+    # The client sent "X-Forwarded-For: 6.6.6.6" (e.g. a victim's address); one proxy appended the real one.
+    assert client_ip("10.0.0.9", "6.6.6.6, 203.0.113.7", trusted_proxies=1) == "203.0.113.7"
+    assert client_ip("10.0.0.9", "6.6.6.6, 7.7.7.7, 203.0.113.7, 10.0.0.2", trusted_proxies=2) == "203.0.113.7"
+
+
+def test_rotating_a_spoofed_hop_does_not_escape_the_ip_bucket():
+    rl = limiter()
+    limited = [rl.check(client_ip("10.0.0.9", f"198.51.100.{i}, 203.0.113.7", trusted_proxies=1))
+               for i in range(Teal_Rate_Limit.RATE_LIMIT_IP_BURST + 1)]
+    assert limited[-1][0] == "ip"
+
+
+def test_header_shorter_than_the_proxy_chain_falls_back_to_the_peer():
+    assert client_ip("10.0.0.9", "203.0.113.7", trusted_proxies=2) == "10.0.0.9"
+    assert client_ip("10.0.0.9", "", trusted_proxies=1) == "10.0.0.9"
+
+
+def exhausted_ip_limiter():
+    rl = limiter()
+    rl.ip_rate = 0.001
+    for _ in range(Teal_Rate_Limit.RATE_LIMIT_IP_BURST):
+        rl.check("127.0.0.1")
+    return rl
+
+
+def test_activation_over_ip_limit_never_looks_up_the_tenant(monkeypatch):
+    import Teal_Backend
+
+    def resolve_tenant(license_key):
+        raise AssertionError("the key lookup ran for a rate limited client")
+
+    monkeypatch.setattr(Teal_Backend, "rate_limiter", exhausted_ip_limiter())
+    monkeypatch.setattr(Teal_Backend, "resolve_tenant", resolve_tenant)
+    response = Teal_Backend.app.test_client().post("/activate_license", json={
+        "license_key": "k", "device_id": "d0", "username": "u", "hostname": "h"})
+    assert response.status_code == 429 and "Retry-After" in response.headers
+
+
+def test_async_activation_over_ip_limit_never_looks_up_the_tenant(monkeypatch):
+    pytest.importorskip("starlette")
+    from starlette.testclient import TestClient
+    import Teal_Backend_Async
+
+    async def aget(load):
+        raise AssertionError("the key lookup ran for a rate limited client")
+
+    monkeypatch.setattr(Teal_Backend_Async, "rate_limiter", exhausted_ip_limiter())
+    monkeypatch.setattr(Teal_Backend_Async.tenant_key_cache, "aget", aget)
+    # Without `with`, TestClient skips the lifespan (no database pool is opened).
+    response = TestClient(Teal_Backend_Async.app, client=("127.0.0.1", 50000)).post("/activate_license", json={
+        "license_key": "k", "device_id": "d0", "username": "u", "hostname": "h"})
+    assert response.status_code == 429 and "retry-after" in response.headers
@@ -0,0 +1,151 @@
+"""
+Idle seat reclamation: the last_seen write-behind buffer, its flusher, and the idle sweeper (deactivate, then
+archive) on SQLite and, with DATABASE_URL, Postgres.
+"""
+import os
+import time
+import uuid
+import threading
+
+import pytest
+
+import Teal_Backend
+from Teal_Reclaim import BackgroundTask, LastSeenBuffer
+from Teal_Storage import CREATED, PostgresLicenseRepository, sqlite_timestamp
+
+DAY = 86400
+
+
+def test_repeat_heartbeats_coalesce_into_one_entry():
+    buffer = LastSeenBuffer(10)
+    buffer.record("acme", "d2", 100.0)
+    buffer.record("default", "d1", 101.0)
+    buffer.record("acme", "d2", 105.0)
+    assert buffer.drain() == [("acme", "d2", 105.0), ("default", "d1", 101.0)]
+    assert buffer.drain() == []
+    assert buffer.stats() == {"pending": 0, "max_entries": 10, "recorded": 3, "dropped": 0, "flushed": 0}
+
+
+def test_a_full_buffer_drops_new_devices_but_updates_pending_ones():
+    buffer = LastSeenBuffer(2)
+    assert buffer.record("t", "d1", 1.0) is False
+    assert buffer.record("t", "d2", 1.0) is True  # full: flush early
+    assert buffer.record("t", "d3", 2.0) is True
+    buffer.record("t", "d1", 3.0)
+    assert buffer.drain() == [("t", "d1", 3.0), ("t", "d2", 1.0)]
+    assert buffer.stats()["dropped"] == 1
+
+
+def test_restore_keeps_heartbeats_newer_than_the_failed_batch():
+    buffer = LastSeenBuffer(10)
+    buffer.record("t", "d1", 1.0)
+    buffer.record("t", "d2", 1.0)
+    batch = buffer.drain()
+    buffer.record("t", "d1", 9.0)  # arrived while the failed write was in flight
+    buffer.restore(batch)
+    assert buffer.drain() == [("t", "d1", 9.0), ("t", "d2", 1.0)]
+
+
+def test_a_failed_flush_puts_the_batch_back(sqlite_backend, monkeypatch):
+    _, repository = sqlite_backend
+    buffer = LastSeenBuffer(10)
+    monkeypatch.setattr(Teal_Backend, "last_seen_buffer", buffer)
+    buffer.record("default", "d1", 50.0)
+
+    def touch_devices(entries, min_interval=0):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(repository, "touch_devices", touch_devices)
+    with pytest.raises(RuntimeError):
+        Teal_Backend.flush_last_seen()
+    assert buffer.stats()["pending"] == 1 and buffer.stats()["flushed"] == 0
+
+
+def test_background_task_survives_errors_and_wakes_early():
+    calls, ran_twice = [], threading.Event()
+
+    def task():
+        calls.append(1)
+        if len(calls) >= 2:
+            ran_twice.set()
+        raise RuntimeError("flush failed")
+
+    background = BackgroundTask("test-task", task, interval=60)
+    background.ensure_started()
+    background.ensure_started()  # one thread per process
+    for _ in range(2):
+        background.wake()
+        time.sleep(0.05)
+    assert ran_twice.wait(2) and len(calls) == 2
+
+
+def backdate(repository, device_id, days):
+    with repository._write() as conn:
+        conn.execute("UPDATE licenses SET activated_at = ?, last_seen = NULL WHERE device_id = ?;",
+                     (sqlite_timestamp(time.time() - days * DAY), device_id))
+
+
+def test_heartbeat_writes_respect_the_resolution(sqlite_backend):
+    _, repository = sqlite_backend
+    repository.activate("default", "d1", "u", "h")
+    backdate(repository, "d1", 3)
+    now = time.time()
+    assert repository.touch_devices([("default", "d1", now)], 3600) == 1
+    assert repository.touch_devices([("default", "d1", now + 60)], 3600) == 0  # written less than an hour ago
+    assert repository.touch_devices([("default", "ghost", now)], 3600) == 0
+
+
+def test_sweeper_deactivates_then_archives_idle_devices(sqlite_backend, monkeypatch):
+    _, repository = sqlite_backend
+    monkeypatch.setattr(Teal_Backend, "IDLE_DEACTIVATE_DAYS", 7)
+    monkeypatch.setattr(Teal_Backend, "IDLE_ARCHIVE_DAYS", 30)
+    for device_id in ("idle", "gone", "fresh"):
+        repository.activate("default", device_id, "u", "h")
+        if device_id == "gone":
+            repository.set_device_status("default", "gone", "inactive")
+    backdate(repository, "idle", 10)
+    backdate(repository, "gone", 40)
+    # "fresh" is as old, but its heartbeat was flushed since.
+    backdate(repository, "fresh", 40)
+    repository.touch_devices([("default", "fresh", time.time())])
+
+    assert Teal_Backend.sweep_idle_devices() == (1, 1)
+    assert repository.license_statuses("default", ["idle", "gone", "fresh"]) == {"idle": "inactive", "fresh": "active"}
+    assert repository.seat_summary("default") == (2, 1)
+    assert "idle" in [device_id for device_id, _ in repository.revocations("default")]
+    assert repository._query("SELECT device_id FROM licenses_archive;")[0]["device_id"] == "gone"
+    assert Teal_Backend.sweep_idle_devices() == (0, 0)
+
+
+@pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="needs DATABASE_URL (Postgres)")
+def test_postgres_sweep_frees_seats_and_archives():
+    repository = Teal_Backend.get_repository()
+    if not isinstance(repository, PostgresLicenseRepository):
+        pytest.skip("needs the postgres storage backend")
+    Teal_Backend.setup_database()
+    tenant_id = f"reclaim-{uuid.uuid4().hex[:12]}"
+    assert repository.create_tenant(tenant_id, "Reclaim", f"{tenant_id}-key", 5) == CREATED
+    conn = Teal_Backend.get_db_connection()
+    try:
+        for device_id in ("idle", "fresh"):
+            repository.activate(tenant_id, device_id, "u", "h")
+        with conn.cursor() as cur:
+            cur.execute("UPDATE licenses SET activated_at = NOW() - interval '10 days', last_seen = NULL "
+                        "WHERE tenant_id = %s;", (tenant_id,))
+        conn.commit()
+        assert repository.touch_devices([(tenant_id, "fresh", time.time())], 3600) == 1
+
+        swept = repository.deactivate_idle(7 * DAY, 10000)
+        assert [device for tenant, device in swept if tenant == tenant_id] == ["idle"]
+        assert repository.seat_summary(tenant_id) == (5, 1)
+        assert [device_id for device_id, _ in repository.revocations(tenant_id)] == ["idle"]
+
+        archived = repository.archive_idle(7 * DAY, 10000)
+        assert [device for tenant, device in archived if tenant == tenant_id] == ["idle"]
+        assert repository.license_statuses(tenant_id, ["idle", "fresh"]) == {"fresh": "active"}
+    finally:
+        with conn.cursor() as cur:
+            for table in ("license_revocations", "licenses_archive", "licenses", "tenants"):
+                cur.execute(f"DELETE FROM {table} WHERE tenant_id = %s;", (tenant_id,))
+        conn.commit()
+        Teal_Backend.release_db_connection(conn)
@@ -0,0 +1,43 @@
+import datetime
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from Teal_Responses import FastJSONProvider, StaticJSON, join_json_lines
+
+PAYLOADS = [
+    {"success": False, "message": "License not found for this device."},
+    {"username": "ü", "hostname": "h/ö", "note": "snow ☃, emoji 😀, del \x7f, nul \x00, tab \t, \"quoted\" \\"},
+    {"activated_devices": {"b": {"n": 1, "ok": True}, "a": {"n": None, "x": [1.5, -2, "é"]}}},
+    {"activated_at": datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)},
+]
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_jsonify_bytes_unchanged(app, payload):
+    with app.test_request_context():
+        app.json = DefaultJSONProvider(app)
+        expected = app.json.response(payload).get_data()
+        app.json = FastJSONProvider(app)
+        assert app.json.response(payload).get_data() == expected
+        assert app.json.loads(expected) == app.json.loads(DefaultJSONProvider(app).dumps(payload))
+
+
+def test_static_json_matches_jsonify(app):
+    body = {"success": False, "message": "Invalid license key"}
+    with app.test_request_context():
+        response = StaticJSON(body, 403)()
+        assert response.status_code == 403
+        assert response.get_data() == DefaultJSONProvider(app).response(body).get_data()
+
+
+def test_join_json_lines_escapes_characters_split_across_chunks():
+    rows = '{"a":"ü",\n"b":"😀"}\n'.encode()
+    chunks = [rows[i:i + 3] for i in range(0, len(rows), 3)]
+    assert b"".join(join_json_lines(chunks)) == b'{"a":"\\u00fc","b":"\\ud83d\\ude00"}\n'
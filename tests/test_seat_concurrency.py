@@ -0,0 +1,118 @@
+"""
+Concurrent activations must never oversell a tenant's seats (teal_activate_device() and the tenants.active_count
+counter). Needs a Postgres database: set DATABASE_URL to a throwaway one; the tests create and remove their own tenant.
+"""
+import os
+import uuid
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="needs DATABASE_URL (Postgres)")
+
+SEATS = 5
+CLIENTS = 40
+
+
+@pytest.fixture(scope="module")
+def backend():
+    import Teal_Backend
+    from Teal_Storage import PostgresLicenseRepository
+    if not isinstance(Teal_Backend.get_repository(), PostgresLicenseRepository):
+        pytest.skip("needs the postgres storage backend")
+    Teal_Backend.setup_database()
+    return Teal_Backend
+
+
+@pytest.fixture
+def tenant(backend):
+    tenant_id = f"seats-{uuid.uuid4().hex[:12]}"
+    backend.get_repository().create_tenant(tenant_id, "Seat race", f"{tenant_id}-key", SEATS)
+    yield tenant_id
+    conn = backend.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM licenses WHERE tenant_id = %s;", (tenant_id,))
+            cur.execute("DELETE FROM tenants WHERE tenant_id = %s;", (tenant_id,))
+        conn.commit()
+    finally:
+        backend.release_db_connection(conn)
+
+
+def race(calls):
+    """Runs every call at once (released together by a barrier); returns their results in order."""
+    barrier = threading.Barrier(len(calls))
+
+    def run(call):
+        barrier.wait()
+        return call()
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        return list(pool.map(run, calls))
+
+
+def seat_counts(backend, tenant_id):
+    """(tenants.active_count, active licenses actually in the table)."""
+    conn = backend.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""SELECT active_count, (SELECT COUNT(*) FROM licenses WHERE tenant_id = t.tenant_id
+                                                 AND status = 'active') FROM tenants t WHERE tenant_id = %s;""",
+                        (tenant_id,))
+            return tuple(cur.fetchone())
+    finally:
+        backend.release_db_connection(conn)
+
+
+def test_new_devices_never_oversell(backend, tenant):
+    repository = backend.get_repository()
+    results = race([lambda i=i: repository.activate(tenant, f"d{i}", "u", "h") for i in range(CLIENTS)])
+    outcomes = Counter(result for result, _ in results)
+    assert outcomes == {"activated": SEATS, "no_seats": CLIENTS - SEATS}
+    assert seat_counts(backend, tenant) == (SEATS, SEATS)
+
+
+def test_reactivations_never_oversell(backend, tenant):
+    repository = backend.get_repository()
+    for i in range(CLIENTS):
+        assert repository.activate(tenant, f"d{i}", "u", "h")[0] == "activated"
+        repository.set_device_status(tenant, f"d{i}", "inactive")
+    assert seat_counts(backend, tenant) == (0, 0)
+
+    # Every device is known and inactive, so they all race through the reactivation path.
+    results = race([lambda i=i: repository.activate(tenant, f"d{i}", "u", "h") for i in range(CLIENTS)])
+    outcomes = Counter(result for result, _ in results)
+    assert outcomes == {"reactivated": SEATS, "no_seats": CLIENTS - SEATS}
+    assert seat_counts(backend, tenant) == (SEATS, SEATS)
+
+
+def test_one_device_racing_itself_takes_one_seat(backend, tenant):
+    repository = backend.get_repository()
+    results = race([lambda: repository.activate(tenant, "same", "u", "h") for _ in range(CLIENTS)])
+    outcomes = Counter(result for result, _ in results)
+    assert outcomes == {"activated": 1, "already_active": CLIENTS - 1}
+    assert seat_counts(backend, tenant) == (1, 1)
+
+
+def test_status_changes_keep_the_counter_and_reconcile_repairs_drift(backend, tenant):
+    repository = backend.get_repository()
+    for i in range(4):
+        assert repository.activate(tenant, f"d{i}", "u", "h")[0] == "activated"
+    outcomes, remaining = repository.set_devices_status(tenant, ["d0", "d1", "ghost"], "inactive")
+    assert outcomes == {"d0": "updated", "d1": "updated", "ghost": "not_found"} and remaining == SEATS - 2
+    assert repository.set_device_status(tenant, "d2", "inactive") == "updated"
+    assert seat_counts(backend, tenant) == (1, 1)
+    outcomes, remaining = repository.set_devices_status(tenant, ["d0", "d1", "d2", "d3"], "active")
+    assert remaining == SEATS - 4 and seat_counts(backend, tenant) == (4, 4)
+
+    conn = backend.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE tenants SET active_count = 0 WHERE tenant_id = %s;", (tenant,))
+        conn.commit()
+    finally:
+        backend.release_db_connection(conn)
+    assert (tenant, 0, 4) in repository.reconcile_active_counts()
+    assert repository.seat_summary(tenant) == (SEATS, 4)
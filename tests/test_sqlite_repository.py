@@ -0,0 +1,166 @@
+"""
+SQLiteLicenseRepository: seat accounting, concurrent activations against one database file, device paging,
+and the same result codes as the Postgres repository for the same sequence of calls.
+"""
+import os
+import uuid
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from Teal_Storage import (CREATED, NO_SEATS, NOT_FOUND, UNCHANGED, UPDATED, PostgresLicenseRepository,
+                          SQLiteLicenseRepository, parse_device_query)
+
+SEATS = 5
+CLIENTS = 40
+
+
+def open_repository(path):
+    repository = SQLiteLicenseRepository(path, 3600)
+    repository.setup("master-key", 2, "3.0.1", "https://example.invalid/download")
+    return repository
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "teal.db")
+
+
+@pytest.fixture
+def repository(db_path):
+    return open_repository(db_path)
+
+
+def scenario(repository, tenant_id):
+    """Every activation and status change outcome, in order, on a tenant with 2 seats."""
+    steps = [repository.activate(tenant_id, "d1", "u1", "h1"),
+             repository.activate(tenant_id, "d1", "u1", "h1"),
+             repository.activate(tenant_id, "d2", "u2", "h2"),
+             repository.activate(tenant_id, "d3", "u3", "h3"),
+             repository.set_device_status(tenant_id, "d1", "inactive"),
+             repository.set_device_status(tenant_id, "d1", "inactive"),
+             repository.set_device_status(tenant_id, "ghost", "inactive"),
+             repository.activate(tenant_id, "d3", "u3", "h3"),
+             repository.activate(tenant_id, "d1", "u1", "h1"),
+             repository.set_device_status(tenant_id, "d2", "inactive"),
+             repository.activate(tenant_id, "d1", "u1", "h1"),
+             repository.set_devices_status(tenant_id, ["d2", "d3", "ghost"], "active"),
+             repository.activate("no-such-tenant", "d1", "u1", "h1")]
+    # licenses_remaining isn't defined when no seat was looked at.
+    results = [step[0] if isinstance(step, tuple) and step[0] in ("already_active", "unknown_tenant") else step
+               for step in steps]
+    return results, repository.seat_summary(tenant_id), repository.license_statuses(tenant_id, ["d1", "d2", "d3"])
+
+
+EXPECTED_SCENARIO = (
+    [("activated", 1), "already_active", ("activated", 0), ("no_seats", 0),
+     UPDATED, UNCHANGED, NOT_FOUND,
+     ("activated", 0), ("no_seats", 0),
+     UPDATED, ("reactivated", 0),
+     ({"d2": NO_SEATS, "d3": UNCHANGED, "ghost": NOT_FOUND}, 0),
+     "unknown_tenant"],
+    (2, 2),
+    {"d1": "active", "d2": "inactive", "d3": "active"},
+)
+
+
+def test_activation_and_status_changes(repository):
+    assert scenario(repository, "default") == EXPECTED_SCENARIO
+
+
+def test_raising_the_seat_limit_frees_seats(repository):
+    assert [repository.activate("default", f"d{i}", "u", "h")[0] for i in range(3)] == \
+        ["activated", "activated", "no_seats"]
+    assert repository.set_total_licenses("default", 3)
+    assert repository.activate("default", "d2", "u", "h") == ("activated", 0)
+    assert repository.reconcile_active_counts() == [("default", 3, 3)]
+
+
+def test_tenants_have_separate_seats(repository):
+    assert repository.create_tenant("acme", "Acme", "acme-key", 1) == CREATED
+    assert repository.activate("acme", "d1", "u", "h") == ("activated", 0)
+    assert repository.activate("default", "d1", "u", "h") == ("activated", 1)
+    assert repository.activate("acme", "d2", "u", "h") == ("no_seats", 0)
+    assert repository.tenant_for_key("acme-key") == "acme"
+
+
+def test_concurrent_activations_never_oversell(repository):
+    assert repository.set_total_licenses("default", SEATS)
+    barrier = threading.Barrier(CLIENTS)
+
+    def activate(i):
+        # Each thread gets its own connection to the file.
+        barrier.wait()
+        return repository.activate("default", f"d{i}", "u", "h")[0]
+
+    with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+        outcomes = Counter(pool.map(activate, range(CLIENTS)))
+    assert outcomes == {"activated": SEATS, "no_seats": CLIENTS - SEATS}
+    assert repository.seat_summary("default") == (SEATS, SEATS)
+    assert repository.reconcile_active_counts() == [("default", SEATS, SEATS)]
+
+
+def _activate_in_process(path, device_ids, start, results):
+    repository = SQLiteLicenseRepository(path, 3600)
+    start.wait()
+    for device_id in device_ids:
+        results.put(repository.activate("default", device_id, "u", "h")[0])
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_concurrent_activations_from_several_processes(db_path, repository):
+    assert repository.set_total_licenses("default", SEATS)
+    context = multiprocessing.get_context("fork")
+    start, results = context.Event(), context.Queue()
+    processes = [context.Process(target=_activate_in_process,
+                                 args=(db_path, [f"p{p}-d{i}" for i in range(5)], start, results)) for p in range(8)]
+    for process in processes:
+        process.start()
+    start.set()
+    outcomes = Counter(results.get(timeout=30) for _ in range(40))
+    for process in processes:
+        process.join(timeout=30)
+    assert outcomes == {"activated": SEATS, "no_seats": 40 - SEATS}
+    assert repository.seat_summary("default") == (SEATS, SEATS)
+
+
+def test_device_pages_follow_the_cursor(repository):
+    assert repository.set_total_licenses("default", 10)
+    for i in range(7):
+        repository.activate("default", f"d{i}", f"user{i % 2}", "h")
+    seen, args = [], {"order": "device_id", "username": "user1"}
+    while True:
+        devices, cursor = repository.device_page("default", parse_device_query(args), 2)
+        seen.extend(d["device_id"] for d in devices)
+        if cursor is None:
+            break
+        args["cursor"] = cursor
+    assert seen == ["d1", "d3", "d5"]
+
+    descending, _ = repository.device_page("default", parse_device_query({"direction": "desc"}), 3)
+    assert [d["device_id"] for d in descending] == ["d6", "d5", "d4"]
+
+
+@pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="needs DATABASE_URL (Postgres)")
+def test_result_codes_match_postgres(repository):
+    import Teal_Backend
+    postgres = Teal_Backend.get_repository()
+    if not isinstance(postgres, PostgresLicenseRepository):
+        pytest.skip("needs the postgres storage backend")
+    Teal_Backend.setup_database()
+    tenant_id = f"parity-{uuid.uuid4().hex[:12]}"
+    assert postgres.create_tenant(tenant_id, "Parity", f"{tenant_id}-key", 2) == CREATED
+    try:
+        assert scenario(postgres, tenant_id) == scenario(repository, "default") == EXPECTED_SCENARIO
+    finally:
+        conn = Teal_Backend.get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                for table in ("license_revocations", "licenses", "tenants"):
+                    cur.execute(f"DELETE FROM {table} WHERE tenant_id = %s;", (tenant_id,))
+            conn.commit()
+        finally:
+            Teal_Backend.release_db_connection(conn)
@@ -0,0 +1,84 @@
+"""
+Tenant resolution and isolation: license keys pick the tenant, device calls are scoped to ?tenant_id=, and key
+rotation takes effect immediately. On the SQLite backend.
+"""
+import pytest
+
+import Teal_Backend
+from Teal_Cache import VersionedValueCache
+
+
+def activate(client, license_key, device_id):
+    return client.post("/activate_license", json={
+        "license_key": license_key, "device_id": device_id, "username": "u", "hostname": "h"})
+
+
+def admin_post(client, path, **payload):
+    return client.post(path, json={"admin_key": Teal_Backend.ADMIN_SECRET_KEY, **payload})
+
+
+@pytest.fixture
+def tenants(sqlite_backend):
+    client, repository = sqlite_backend
+    assert admin_post(client, "/admin/create_tenant", tenant_id="acme", name="Acme", license_key="acme-key",
+                      total_licenses=1).status_code == 201
+    return client, repository
+
+
+@pytest.mark.parametrize("data, tenant_id", [
+    ({}, "default"), ({"tenant_id": ""}, "default"), ({"tenant_id": "acme-2"}, "acme-2"),
+    ({"tenant_id": "Acme"}, None), ({"tenant_id": "a/b"}, None), ({"tenant_id": "-acme"}, None),
+    ({"tenant_id": "a" * 64}, None), ({"tenant_id": 7}, None),
+])
+def test_requested_tenant(data, tenant_id):
+    assert Teal_Backend.requested_tenant(data) == tenant_id
+
+
+def test_the_license_key_picks_the_tenant(tenants):
+    client, repository = tenants
+    response = activate(client, "acme-key", "d1")
+    assert response.get_json()["tenant_id"] == "acme" and response.get_json()["licenses_remaining"] == 0
+    assert activate(client, "acme-key", "d2").status_code == 403  # acme's one seat is taken
+    assert activate(client, Teal_Backend.DEFAULT_MASTER_KEY, "d2").get_json()["tenant_id"] == "default"
+    assert activate(client, "no-such-key", "d3").status_code == 403
+    assert repository.seat_summary("acme") == (1, 1) and repository.seat_summary("default") == (2, 1)
+
+
+def test_device_calls_are_scoped_to_the_tenant(tenants):
+    client, _ = tenants
+    activate(client, "acme-key", "d1")
+    assert client.post("/check_license", json={"device_id": "d1", "tenant_id": "acme"}).status_code == 200
+    assert client.post("/check_license", json={"device_id": "d1"}).status_code == 403
+    assert client.post("/check_license", json={"device_id": "d1", "tenant_id": "Not Valid"}).status_code == 400
+    assert admin_post(client, "/admin/deactivate_device", device_id="d1").status_code == 404
+    assert admin_post(client, "/admin/deactivate_device", device_id="d1", tenant_id="acme").status_code == 200
+
+
+def test_rotated_keys_take_effect_at_once(tenants, monkeypatch):
+    client, repository = tenants
+    repository.cache_reads = True  # resolve keys through tenant_key_cache, as on Postgres
+    monkeypatch.setattr(Teal_Backend, "CACHE_LISTEN_ENABLED", False)
+    monkeypatch.setattr(Teal_Backend, "tenant_key_cache", VersionedValueCache(300))
+    assert Teal_Backend.resolve_tenant("acme-key") == "acme"
+
+    assert admin_post(client, "/admin/update_tenant", tenant_id="acme", license_key="acme-key-2").status_code == 200
+    assert Teal_Backend.resolve_tenant("acme-key") is None
+    assert Teal_Backend.resolve_tenant("acme-key-2") == "acme"
+    assert Teal_Backend.resolve_tenant(["acme-key-2"]) is None
+
+
+def test_tenant_admin_conflicts(tenants):
+    client, _ = tenants
+    assert admin_post(client, "/admin/create_tenant", tenant_id="acme", license_key="other").status_code == 409
+    assert admin_post(client, "/admin/create_tenant", tenant_id="beta", license_key="acme-key").status_code == 409
+    assert admin_post(client, "/admin/create_tenant", tenant_id="Beta!", license_key="k").status_code == 400
+    assert admin_post(client, "/admin/update_tenant", tenant_id="acme",
+                      license_key=Teal_Backend.DEFAULT_MASTER_KEY).status_code == 409
+    assert admin_post(client, "/admin/update_tenant", tenant_id="ghost", name="Ghost").status_code == 404
+
+
+def test_tenant_listing_never_includes_keys(tenants):
+    client, _ = tenants
+    listing = client.get("/admin/tenants", query_string={"admin_key": Teal_Backend.ADMIN_SECRET_KEY}).get_json()
+    assert [t["tenant_id"] for t in listing["tenants"]] == ["acme", "default"]
+    assert "acme-key" not in str(listing) and all("license_key" not in t for t in listing["tenants"])
@@ -0,0 +1,31 @@
+import pytest
+
+import Teal_Backend
+from Teal_DB_Pool import PoolTimeout
+from Teal_Storage import PostgresLicenseRepository
+
+
+class SeatsOnlyRepository(PostgresLicenseRepository):
+    """Answers the tenant check; everything else would need the database."""
+
+    def __init__(self):
+        pass
+
+    def seat_summary(self, tenant_id):
+        return 5, 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Teal_Backend, "_repository", SeatsOnlyRepository())
+    return Teal_Backend.app.test_client()
+
+
+def test_legacy_view_status_pool_timeout_is_a_500(client, monkeypatch):
+    def get_db_connection():
+        raise PoolTimeout("Timed out after 10.0s waiting for a database connection.")
+
+    monkeypatch.setattr(Teal_Backend, "get_db_connection", get_db_connection)
+    response = client.get(f"/admin/view_status?admin_key={Teal_Backend.ADMIN_SECRET_KEY}")
+    assert response.status_code == 500
+    assert response.get_data() == Teal_Backend.INTERNAL_ERROR.body